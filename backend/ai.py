@@ -1,12 +1,9 @@
-import google.generativeai as genai
-import os
 from dotenv import load_dotenv
+from llm_pool import get_llm_pool
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-model = genai.GenerativeModel('gemini-pro')
+model = get_llm_pool().get_model('gemini-pro')
 
 def generate_narration(poi):
     response = model.generate_content(
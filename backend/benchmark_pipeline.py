@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Offline, reproducible benchmark of the /generate-route pipeline
+
+Runs the real FastAPI app in-process against local stand-ins: Overpass and
+OSRM are local HTTP servers (synthetic city, ideal street grid router) and
+Gemini is an offline model, so results depend only on our code and the seed.
+
+For each candidate-set size it records end-to-end and per-stage latency (from
+the request trace), peak Python memory, and TSP quality as the gap to the
+best known path over the same stops. The report is JSON, so runs can be
+compared across commits:
+
+    python benchmark_pipeline.py --sizes 10 50 200 1000 --output bench_new.json
+    python benchmark_pipeline.py --compare bench_old.json bench_new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fake_upstreams import (
+    FakeGemini,
+    ManhattanBackend,
+    OverpassStandIn,
+    install_fake_gemini,
+)
+from osrm_standin import OSRMStandIn
+from routing_backends import LocalGraphBackend
+from tsp_reference import best_known_path
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = (10, 50, 200, 1000)
+CENTER = (43.6532, -79.3832)  # "toronto", resolved without Nominatim
+# "monuments" maps to three Overpass tags; serve enough raw POIs per tag to
+# leave `size` candidates after dedup
+TAGS_PER_REQUEST = 3
+OVERSUPPLY = 1.3
+
+
+class PipelineBenchmark:
+    """Drives the app through a TestClient with every upstream replaced"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+        if args.router == "graph":
+            backend = LocalGraphBackend.grid(*CENTER, rows=80, cols=80)
+        else:
+            backend = ManhattanBackend()
+        self.osrm = OSRMStandIn(backend).start()
+        self.overpass = OverpassStandIn(seed=args.seed).start()
+        self.gemini = FakeGemini(
+            {"max_distance_km": args.max_distance_km},
+            latency_s=args.llm_latency_ms / 1000,
+        )
+
+        # The app reads its configuration at import time
+        os.environ.update(
+            {
+                "ROUTING_BACKEND": "osrm",
+                "OSRM_BASE_URL": self.osrm.url,
+                "OSRM_DURATION_SCALE": "1",
+                "OVERPASS_URL": self.overpass.url,
+                "SCRIPT_STORE_PATH": os.path.join(self.workdir, "scripts.sqlite3"),
+                "LEG_CACHE_PATH": os.path.join(self.workdir, "legs.sqlite3"),
+                "MONGO_URI": "",
+                "GEMINI_API_KEY": "offline",
+            }
+        )
+        import main
+        from fastapi.testclient import TestClient
+
+        install_fake_gemini(self.gemini)
+        main.MAX_CANDIDATES_LIMIT = max(main.MAX_CANDIDATES_LIMIT, max(args.sizes))
+        # Client-side Gemini quota pacing is not our latency; opt back in with
+        # --script-interval to see its effect
+        main.script_generator.min_request_interval = args.script_interval
+        if args.tsp_time_limit is not None:
+            main.tsp_solver.DEFAULT_TIME_LIMIT_S = args.tsp_time_limit
+            main.tsp_solver.LARGE_N_TIME_LIMIT_S = args.tsp_time_limit
+        self.main = main
+        self.client = TestClient(main.app)
+
+    def close(self) -> None:
+        self.client.close()
+        self.osrm.stop()
+        self.overpass.stop()
+
+    def run(self) -> Dict[str, Any]:
+        results = []
+        for size in self.args.sizes:
+            print(f"📏 {size} candidates")
+            runs = [
+                self.run_once(size, self.args.seed + repeat)
+                for repeat in range(self.args.repeat)
+            ]
+            # A separate run for memory: tracemalloc slows Python down a lot
+            tracemalloc.start()
+            self.run_once(size, self.args.seed + self.args.repeat)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append(summarize(size, runs, peak))
+        return {
+            "benchmark": "pipeline",
+            "version": REPORT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "sizes": list(self.args.sizes),
+                "repeat": self.args.repeat,
+                "seed": self.args.seed,
+                "router": self.args.router,
+                "max_distance_km": self.args.max_distance_km,
+                "llm_latency_ms": self.args.llm_latency_ms,
+                "script_interval_s": self.args.script_interval,
+                "tsp_time_limit_s": self.args.tsp_time_limit,
+            },
+            "results": results,
+        }
+
+    def run_once(self, size: int, seed: int) -> Dict[str, Any]:
+        """One cold /generate-route call (fresh POIs, so no cache is warm)"""
+        self.overpass.seed = seed
+        self.overpass.per_tag = int(size * OVERSUPPLY / TAGS_PER_REQUEST) + 1
+        upstream_before = self.osrm.requests + self.overpass.requests
+        llm_before = self.gemini.calls
+
+        started = time.perf_counter()
+        response = self.client.post(
+            "/generate-route",
+            json={
+                "input_text": f"A walk through toronto, run {seed}",
+                "max_candidates": size,
+                "reuse": False,
+            },
+            headers={"X-Debug-Trace": "1"},
+        )
+        e2e_ms = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        body = response.json()
+
+        stages: Dict[str, float] = {}
+        for span in body["debug"]["trace"]["root"].get("children", []):
+            stages[span["name"]] = stages.get(span["name"], 0.0) + span["duration_ms"]
+
+        route = self.main.route_registry.get(body["route"]["id"])
+        distances = route["matrix"].distances
+        order = route["order"]
+        cost = self.main.tsp_solver.get_route_distance(order, route["matrix"])
+        best, _, method = best_known_path(distances, order)
+        best = min(best, cost)
+        print(
+            f"   seed {seed}: {e2e_ms:8.1f} ms, {len(order)} stops, "
+            f"{cost:.3f} km (best known {best:.3f} km, {method})"
+        )
+        return {
+            "seed": seed,
+            "e2e_ms": e2e_ms,
+            "stages_ms": stages,
+            "candidates": len(route["points"]) - 1,
+            "stops": len(order),
+            "cost_km": cost,
+            "best_known_km": best,
+            "best_known_method": method,
+            "gap_pct": 100 * (cost - best) / best if best > 0 else 0.0,
+            "upstream_requests": self.osrm.requests
+            + self.overpass.requests
+            - upstream_before,
+            "llm_calls": self.gemini.calls - llm_before,
+        }
+
+
+def summarize(size: int, runs: List[Dict[str, Any]], peak_bytes: int) -> Dict[str, Any]:
+    """Medians over the timed runs for one size"""
+    e2e = [run["e2e_ms"] for run in runs]
+    stage_names = sorted({name for run in runs for name in run["stages_ms"]})
+    return {
+        "size": size,
+        "runs": runs,
+        "summary": {
+            "e2e_ms": {
+                "min": min(e2e),
+                "median": statistics.median(e2e),
+                "max": max(e2e),
+            },
+            "stages_ms": {
+                name: statistics.median(run["stages_ms"].get(name, 0.0) for run in runs)
+                for name in stage_names
+            },
+            "peak_memory_mb": peak_bytes / 2**20,
+            "gap_pct": {
+                "median": statistics.median(run["gap_pct"] for run in runs),
+                "max": max(run["gap_pct"] for run in runs),
+            },
+            "stops": statistics.median(run["stops"] for run in runs),
+        },
+    }
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.2,
+    gap_tolerance_pct: float = 1.0,
+) -> List[str]:
+    """
+    Print a size-by-size comparison
+
+    Returns:
+        Regressions: median latency up by more than ``tolerance`` (relative)
+        or median gap up by more than ``gap_tolerance_pct`` points
+    """
+    regressions = []
+    before = {result["size"]: result["summary"] for result in baseline["results"]}
+    print(
+        f"{'size':>6} {'median ms':>22} {'change':>8} " f"{'gap %':>16} {'peak MB':>16}"
+    )
+    for result in current["results"]:
+        size, now = result["size"], result["summary"]
+        old = before.get(size)
+        if old is None:
+            print(f"{size:>6} (no baseline)")
+            continue
+        old_ms, new_ms = old["e2e_ms"]["median"], now["e2e_ms"]["median"]
+        change = (new_ms - old_ms) / old_ms if old_ms else 0.0
+        old_gap, new_gap = old["gap_pct"]["median"], now["gap_pct"]["median"]
+        print(
+            f"{size:>6} {old_ms:>10.1f} -> {new_ms:>8.1f} {change:>+8.1%} "
+            f"{old_gap:>6.2f} -> {new_gap:>6.2f} "
+            f"{old['peak_memory_mb']:>6.1f} -> {now['peak_memory_mb']:>6.1f}"
+        )
+        if change > tolerance:
+            regressions.append(f"size {size}: median latency {change:+.1%}")
+        if new_gap - old_gap > gap_tolerance_pct:
+            regressions.append(
+                f"size {size}: median gap {old_gap:.2f}% -> {new_gap:.2f}%"
+            )
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--router",
+        choices=("manhattan", "graph"),
+        default="manhattan",
+        help="analytic street grid, or Dijkstra on a synthetic grid graph (slow)",
+    )
+    parser.add_argument("--max-distance-km", type=float, default=5.0)
+    parser.add_argument(
+        "--tsp-time-limit",
+        type=float,
+        default=None,
+        help="override the solver time limits (seconds); default: production",
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--script-interval", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="compare two saved reports and exit",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.compare:
+        baseline, current = (json.load(open(path)) for path in args.compare)
+        regressions = compare_reports(baseline, current, args.tolerance)
+    else:
+        benchmark = PipelineBenchmark(args)
+        try:
+            report = benchmark.run()
+        finally:
+            benchmark.close()
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"📝 Report written to {args.output}")
+        regressions = []
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_reports(json.load(f), report, args.tolerance)
+    for regression in regressions:
+        print(f"❌ Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+TSP solver microbenchmark and quality-regression suite
+
+Runs every solver strategy over a fixed set of instances and records, per
+solve, wall time, time to the best solution (from the tsp.search span), path
+cost, stops visited, the gap to the best path over the same stops (exact for
+small N, 2-opt otherwise; see tsp_reference.py) and distance-cap violations.
+
+Instance families:
+- uniform: stops spread evenly over a square, street-grid (L1) distances
+- clustered: stops in a few dense neighbourhoods, like POIs in a city
+- osrm: matrices captured from a real OSRM server (``capture`` below)
+- every family also comes in a capped variant, where the walk limit is half
+  the length of visiting everything, so strategies have to choose stops
+
+    python benchmark_tsp.py --sizes 8 12 20 50 100 --output tsp_new.json
+    python benchmark_tsp.py --baseline tsp_old.json
+    python benchmark_tsp.py capture --center 43.6532,-79.3832 --size 20 \\
+        --output tsp_instances/toronto_20.json   # ROUTING_BACKEND
+
+Strategies are registered in STRATEGIES; a new heuristic is one entry there.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import tracing
+from benchmark_pipeline import git_commit
+from tsp_reference import (
+    best_known_path,
+    nearest_neighbor_path,
+    path_cost,
+    two_opt_path,
+)
+from tsp_solver import TSPSolver
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = (8, 12, 20, 50, 100)
+DEFAULT_INSTANCE_DIR = os.path.join(os.path.dirname(__file__), "tsp_instances")
+# Uncapped instances get a limit nobody reaches; capped ones half the
+# nearest-neighbour length of the full instance
+UNCAPPED_KM = 1e6
+CAP_FRACTION = 0.5
+CAP_TOLERANCE_KM = 1e-6
+
+
+def uniform_instance(size: int, seed: int, extent_km: float = 4.0) -> np.ndarray:
+    """Street-grid distances between ``size`` stops spread over a square"""
+    points = np.random.default_rng(seed).uniform(0, extent_km, (size, 2))
+    return np.abs(points[:, None] - points[None]).sum(axis=2)
+
+
+def clustered_instance(
+    size: int, seed: int, extent_km: float = 4.0, clusters: int = 4
+) -> np.ndarray:
+    """Street-grid distances between stops around a few neighbourhood centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, extent_km, (clusters, 2))
+    points = centres[rng.integers(0, clusters, size)] + rng.normal(0, 0.2, (size, 2))
+    points[0] = rng.uniform(0, extent_km, 2)  # the start is anywhere
+    return np.abs(points[:, None] - points[None]).sum(axis=2)
+
+
+def load_instances(directory: str) -> List[Dict[str, Any]]:
+    """Captured matrices (JSON files written by ``capture``)"""
+    instances = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path) as f:
+            data = json.load(f)
+        instances.append(
+            {
+                "family": "osrm",
+                "name": os.path.splitext(os.path.basename(path))[0],
+                "distances": np.asarray(data["distances"], dtype=np.float64),
+            }
+        )
+    return instances
+
+
+def build_instances(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Every instance of the run, each uncapped and capped"""
+    base = []
+    for size in args.sizes:
+        for i in range(args.instances):
+            seed = args.seed + 1000 * size + i
+            base.append(
+                {
+                    "family": "uniform",
+                    "name": f"uniform_{size}_{i}",
+                    "distances": uniform_instance(size, seed),
+                }
+            )
+            base.append(
+                {
+                    "family": "clustered",
+                    "name": f"clustered_{size}_{i}",
+                    "distances": clustered_instance(size, seed),
+                }
+            )
+    base.extend(load_instances(args.instance_dir))
+
+    instances = []
+    for instance in base:
+        distances = instance["distances"]
+        full_length = path_cost(distances, nearest_neighbor_path(distances))
+        instances.append({**instance, "capped": False, "cap_km": UNCAPPED_KM})
+        instances.append(
+            {
+                **instance,
+                "name": f"{instance['name']}_capped",
+                "capped": True,
+                "cap_km": round(full_length * CAP_FRACTION, 3),
+            }
+        )
+    return instances
+
+
+def ortools_strategy(first_solution: str, metaheuristic: str) -> Callable:
+    """TSPSolver with the given search settings on both the small and large path"""
+
+    def solve(distances: np.ndarray, cap_km: float, time_limit_s: float):
+        solver = TSPSolver()
+        solver.FIRST_SOLUTION_STRATEGY = first_solution
+        solver.LARGE_N_FIRST_SOLUTION_STRATEGY = first_solution
+        solver.LOCAL_SEARCH_METAHEURISTIC = metaheuristic
+        return solver.solve_tsp(distances, cap_km, time_limit_s)
+
+    return solve
+
+
+def production(distances: np.ndarray, cap_km: float, time_limit_s: float):
+    return TSPSolver().solve_tsp(distances, cap_km, time_limit_s)
+
+
+def nearest_neighbor(distances: np.ndarray, cap_km: float, time_limit_s: float):
+    """The solver's fallback when OR-Tools finds nothing (ignores the cap)"""
+    return TSPSolver()._nearest_neighbor(distances)
+
+
+def nearest_neighbor_capped(distances: np.ndarray, cap_km: float, time_limit_s: float):
+    return TSPSolver()._nearest_neighbor_capped(distances, cap_km)
+
+
+def nearest_neighbor_two_opt(distances: np.ndarray, cap_km: float, time_limit_s: float):
+    """Capped nearest neighbour, reordered with 2-opt (never longer, so still capped)"""
+    order = TSPSolver()._nearest_neighbor_capped(distances, cap_km)
+    sub = distances[np.ix_(order, order)]
+    _, path = two_opt_path(sub, list(range(len(order))))
+    return [order[i] for i in path]
+
+
+STRATEGIES: Dict[str, Callable] = {
+    "production": production,
+    "ortools:cheapest_arc+greedy": ortools_strategy(
+        "PATH_CHEAPEST_ARC", "GREEDY_DESCENT"
+    ),
+    "ortools:cheapest_arc+tabu": ortools_strategy("PATH_CHEAPEST_ARC", "TABU_SEARCH"),
+    "ortools:savings+annealing": ortools_strategy("SAVINGS", "SIMULATED_ANNEALING"),
+    "ortools:insertion+guided": ortools_strategy(
+        "PARALLEL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"
+    ),
+    "nearest_neighbor": nearest_neighbor,
+    "nearest_neighbor_capped": nearest_neighbor_capped,
+    "nearest_neighbor_2opt": nearest_neighbor_two_opt,
+}
+
+
+def evaluate(
+    strategy: Callable, instance: Dict[str, Any], time_limit_s: float
+) -> Dict[str, Any]:
+    """Solve one instance and grade the result"""
+    distances = instance["distances"]
+    with tracing.start_trace("tsp benchmark") as trace:
+        started = time.perf_counter()
+        order = [
+            int(node) for node in strategy(distances, instance["cap_km"], time_limit_s)
+        ]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+    searches = [
+        span["attributes"]
+        for span in trace.to_dict()["root"].get("children", [])
+        if span["name"] == "tsp.search"
+    ]
+    time_to_best = searches[-1].get("time_to_best_ms") if searches else None
+
+    cost = path_cost(distances, order)
+    best, _, method = best_known_path(distances, order)
+    best = min(best, cost)
+    n = len(distances)
+    return {
+        "time_ms": elapsed_ms,
+        "time_to_best_ms": time_to_best if time_to_best is not None else elapsed_ms,
+        "cost_km": cost,
+        "stops": len(order),
+        "coverage": len(set(order)) / n,
+        "valid": order[:1] == [0] and len(set(order)) == len(order),
+        "gap_pct": 100 * (cost - best) / best if best > 0 else 0.0,
+        "reference": method,
+        "cap_violation_km": (
+            max(cost - instance["cap_km"], 0.0)
+            if cost > instance["cap_km"] + CAP_TOLERANCE_KM
+            else 0.0
+        ),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    instances = build_instances(args)
+    strategies = {name: STRATEGIES[name] for name in (args.strategies or STRATEGIES)}
+    results = []
+    for instance in instances:
+        n = len(instance["distances"])
+        for name, strategy in strategies.items():
+            result = evaluate(strategy, instance, args.time_limit)
+            results.append(
+                {
+                    "instance": instance["name"],
+                    "family": instance["family"],
+                    "size": n,
+                    "capped": instance["capped"],
+                    "cap_km": instance["cap_km"] if instance["capped"] else None,
+                    "strategy": name,
+                    **result,
+                }
+            )
+        print(f"🧭 {instance['name']} ({n} nodes) done")
+    return {
+        "benchmark": "tsp",
+        "version": REPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "sizes": list(args.sizes),
+            "instances": args.instances,
+            "seed": args.seed,
+            "time_limit_s": args.time_limit,
+            "strategies": list(strategies),
+        },
+        "results": results,
+        "summary": summarize(results),
+    }
+
+
+def summarize(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per (family, size, capped, strategy): medians and violation counts"""
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for result in results:
+        key = (result["family"], result["size"], result["capped"], result["strategy"])
+        groups.setdefault(key, []).append(result)
+    summary = []
+    for (family, size, capped, strategy), runs in sorted(groups.items()):
+        summary.append(
+            {
+                "family": family,
+                "size": size,
+                "capped": capped,
+                "strategy": strategy,
+                "instances": len(runs),
+                "time_ms": statistics.median(r["time_ms"] for r in runs),
+                "time_to_best_ms": statistics.median(
+                    r["time_to_best_ms"] for r in runs
+                ),
+                "cost_km": statistics.median(r["cost_km"] for r in runs),
+                "coverage": statistics.mean(r["coverage"] for r in runs),
+                "gap_pct": statistics.median(r["gap_pct"] for r in runs),
+                "max_gap_pct": max(r["gap_pct"] for r in runs),
+                "cap_violations": sum(r["cap_violation_km"] > 0 for r in runs),
+                "invalid": sum(not r["valid"] for r in runs),
+            }
+        )
+    return summary
+
+
+def print_summary(summary: List[Dict[str, Any]]) -> None:
+    print(
+        f"{'instances':<22} {'strategy':<28} {'ms':>8} {'best ms':>8} "
+        f"{'km':>7} {'cover':>6} {'gap %':>6} {'max %':>6} {'viol':>4}"
+    )
+    for row in summary:
+        label = f"{row['family']}/{row['size']}" + ("/capped" if row["capped"] else "")
+        print(
+            f"{label:<22} {row['strategy']:<28} {row['time_ms']:>8.1f} "
+            f"{row['time_to_best_ms']:>8.1f} {row['cost_km']:>7.2f} "
+            f"{row['coverage']:>6.0%} {row['gap_pct']:>6.2f} "
+            f"{row['max_gap_pct']:>6.2f} {row['cap_violations']:>4}"
+        )
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    gap_tolerance_pct: float = 1.0,
+    coverage_tolerance: float = 0.02,
+) -> List[str]:
+    """
+    Quality regressions of ``current`` against ``baseline``
+
+    Returns:
+        Groups whose median gap rose by more than ``gap_tolerance_pct``
+        points, whose coverage fell by more than ``coverage_tolerance``, or
+        that gained cap violations or invalid routes
+    """
+
+    def key(row):
+        return row["family"], row["size"], row["capped"], row["strategy"]
+
+    before = {key(row): row for row in baseline["summary"]}
+    regressions = []
+    for row in current["summary"]:
+        old = before.get(key(row))
+        if old is None:
+            continue
+        label = "/".join(str(part) for part in key(row))
+        if row["gap_pct"] - old["gap_pct"] > gap_tolerance_pct:
+            regressions.append(
+                f"{label}: median gap {old['gap_pct']:.2f}% -> {row['gap_pct']:.2f}%"
+            )
+        if old["coverage"] - row["coverage"] > coverage_tolerance:
+            regressions.append(
+                f"{label}: coverage {old['coverage']:.0%} -> {row['coverage']:.0%}"
+            )
+        if row["cap_violations"] > old["cap_violations"]:
+            regressions.append(
+                f"{label}: cap violations {old['cap_violations']} -> "
+                f"{row['cap_violations']}"
+            )
+        if row["invalid"] > old["invalid"]:
+            regressions.append(
+                f"{label}: invalid routes {old['invalid']} -> {row['invalid']}"
+            )
+    return regressions
+
+
+def capture(args: argparse.Namespace) -> None:
+    """Save a table from the routing backend (ROUTING_BACKEND) as an instance"""
+    from route_matrix import RouteMatrix
+    from routing_backends import get_routing_backend
+
+    lat, lng = (float(part) for part in args.center.split(","))
+    rng = np.random.default_rng(args.seed)
+    # Random stops within the radius (a degree of latitude is ~111 km)
+    offsets = rng.uniform(-1, 1, (args.size, 2)) * args.radius_km / 111.32
+    offsets[:, 1] /= np.cos(np.radians(lat))
+    offsets[0] = 0.0
+    points = [(lat + dlat, lng + dlng) for dlat, dlng in offsets.tolist()]
+
+    # Straight from the backend: OSRMClient would quietly fill gaps with
+    # haversine, which is not a captured matrix
+    backend = get_routing_backend()
+    data = backend.table(points)
+    if data.get("code") != "Ok":
+        raise SystemExit(f"Routing backend error: {data.get('message', data)}")
+    distances = RouteMatrix.from_osrm(data).distances
+    if np.isnan(distances).any():
+        raise SystemExit("The table has unroutable pairs; try a smaller radius")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "points": points,
+                "distances": np.round(distances.astype(np.float64), 4).tolist(),
+                "backend": backend.name,
+                "captured_at": datetime.now(timezone.utc).isoformat(),
+            },
+            f,
+        )
+    print(
+        f"📝 {args.size}x{args.size} matrix ({backend.name}) written to {args.output}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "capture"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--instances", type=int, default=3, help="per family and size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--time-limit", type=float, default=1.0, help="solver budget per solve (s)"
+    )
+    parser.add_argument(
+        "--strategies", nargs="+", choices=sorted(STRATEGIES), default=None
+    )
+    parser.add_argument("--instance-dir", default=DEFAULT_INSTANCE_DIR)
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="report to compare against")
+    parser.add_argument("--gap-tolerance", type=float, default=1.0)
+    # capture
+    parser.add_argument("--center", default="43.6532,-79.3832", help="lat,lng")
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--radius-km", type=float, default=1.5)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.command == "capture":
+        if not args.output:
+            raise SystemExit("capture needs --output")
+        capture(args)
+        return 0
+
+    report = run(args)
+    print_summary(report["summary"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_reports(json.load(f), report, args.gap_tolerance)
+    for regression in regressions:
+        print(f"❌ Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
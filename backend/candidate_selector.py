@@ -0,0 +1,211 @@
+"""
+Candidate selection for Overpass POIs: spatial dedup, filtering and ranking
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Tags that indicate a well-documented, tour-worthy place
+INFORMATIVE_TAGS = (
+    "wikipedia",
+    "wikidata",
+    "description",
+    "heritage",
+    "website",
+    "image",
+    "opening_hours",
+    "start_date",
+    "architect",
+    "artist_name",
+    "historic",
+    "tourism",
+)
+
+UNNAMED = "Unnamed Location"
+
+METERS_PER_DEG_LAT = 111_320.0
+
+
+class CandidateSelector:
+    """
+    Reduce raw Overpass results to the best ``top_k`` candidates
+
+    1. drop elements without a real name
+    2. merge near-duplicates with a grid-based spatial clustering (the node and
+       the way of the same building, the same name mapped twice)
+    3. score by tag richness and distance from the start, then pick greedily
+       with a penalty for categories that are already represented
+    """
+
+    def __init__(
+        self,
+        merge_radius_m: float = 75.0,
+        same_spot_radius_m: float = 15.0,
+        richness_weight: float = 1.0,
+        distance_weight: float = 1.0,
+        diversity_penalty: float = 0.5,
+    ):
+        self.merge_radius_m = merge_radius_m
+        self.same_spot_radius_m = same_spot_radius_m
+        self.richness_weight = richness_weight
+        self.distance_weight = distance_weight
+        self.diversity_penalty = diversity_penalty
+
+    def select(
+        self,
+        pois: List[Dict[str, Any]],
+        lat: float,
+        lng: float,
+        radius_km: float,
+        top_k: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """
+        Select the best candidates
+
+        Args:
+            pois: Raw POI dictionaries from Overpass
+            lat: Start latitude
+            lng: Start longitude
+            radius_km: Search radius used for the query (normalises distance)
+            top_k: Maximum number of candidates to return
+
+        Returns:
+            Up to top_k POI dictionaries, best first
+        """
+        named = [poi for poi in pois if self._normalize_name(poi.get("name"))]
+        clustered = self._cluster(named, lat)
+        return self._rank(clustered, lat, lng, radius_km, top_k)
+
+    def _cluster(
+        self, pois: List[Dict[str, Any]], ref_lat: float
+    ) -> List[Dict[str, Any]]:
+        """Merge near-duplicates using a uniform grid with merge_radius_m cells"""
+        cell_lat = self.merge_radius_m / METERS_PER_DEG_LAT
+        cell_lng = self.merge_radius_m / (
+            METERS_PER_DEG_LAT * max(math.cos(math.radians(ref_lat)), 0.01)
+        )
+
+        grid: Dict[Tuple[int, int], List[int]] = {}
+        clusters: List[Dict[str, Any]] = []
+
+        for poi in pois:
+            cell = (int(poi["lat"] // cell_lat), int(poi["lng"] // cell_lng))
+            match = self._find_duplicate(poi, cell, grid, clusters)
+            if match is None:
+                grid.setdefault(cell, []).append(len(clusters))
+                clusters.append({**poi, "tags": dict(poi.get("tags") or {})})
+            else:
+                clusters[match] = self._merge(clusters[match], poi)
+
+        return clusters
+
+    def _find_duplicate(
+        self,
+        poi: Dict[str, Any],
+        cell: Tuple[int, int],
+        grid: Dict[Tuple[int, int], List[int]],
+        clusters: List[Dict[str, Any]],
+    ) -> Optional[int]:
+        """Index of an existing cluster in the 3x3 neighbourhood that poi duplicates"""
+        name = self._normalize_name(poi["name"])
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for idx in grid.get((cell[0] + dx, cell[1] + dy), ()):
+                    other = clusters[idx]
+                    distance = self._distance_m(
+                        poi["lat"], poi["lng"], other["lat"], other["lng"]
+                    )
+                    if distance <= self.same_spot_radius_m:
+                        return idx
+                    same_name = name == self._normalize_name(other["name"])
+                    if same_name and distance <= self.merge_radius_m:
+                        return idx
+        return None
+
+    def _merge(self, kept: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the better-documented element and union the tags"""
+        other_tags = other.get("tags") or {}
+        if len(other_tags) > len(kept["tags"]):
+            merged = {**other, "tags": {**kept["tags"], **other_tags}}
+        else:
+            merged = {**kept, "tags": {**other_tags, **kept["tags"]}}
+        return merged
+
+    def _rank(
+        self,
+        pois: List[Dict[str, Any]],
+        lat: float,
+        lng: float,
+        radius_km: float,
+        top_k: int,
+    ) -> List[Dict[str, Any]]:
+        radius_m = max(radius_km * 1000, 1.0)
+        base_scores = []
+        for poi in pois:
+            tags = poi.get("tags") or {}
+            richness = sum(1 for tag in INFORMATIVE_TAGS if tag in tags) / len(
+                INFORMATIVE_TAGS
+            )
+            distance = self._distance_m(lat, lng, poi["lat"], poi["lng"])
+            closeness = max(0.0, 1.0 - distance / radius_m)
+            base_scores.append(
+                self.richness_weight * richness + self.distance_weight * closeness
+            )
+
+        # Greedy pick with a penalty for categories already chosen. The penalty
+        # only depends on the category, so each step just compares the head of
+        # every per-category queue: O(top_k * categories), not O(top_k * N).
+        queues: Dict[str, List[int]] = {}
+        for idx in sorted(range(len(pois)), key=lambda i: -base_scores[i]):
+            queues.setdefault(self._kind(pois[idx]), []).append(idx)
+        heads = {kind: 0 for kind in queues}
+        counts = {kind: 0 for kind in queues}
+
+        selected_names = set()
+        selected: List[Dict[str, Any]] = []
+        while len(selected) < top_k:
+            best_kind = None
+            best_score = -math.inf
+            for kind, queue in queues.items():
+                if heads[kind] < len(queue):
+                    score = (
+                        base_scores[queue[heads[kind]]]
+                        - self.diversity_penalty * counts[kind]
+                    )
+                    if score > best_score:
+                        best_kind, best_score = kind, score
+            if best_kind is None:
+                break
+
+            poi = pois[queues[best_kind][heads[best_kind]]]
+            heads[best_kind] += 1
+            name = self._normalize_name(poi["name"])
+            if name in selected_names:
+                # Same name elsewhere in the city (chains): one is enough
+                continue
+            selected_names.add(name)
+            counts[best_kind] += 1
+            selected.append(poi)
+
+        return selected
+
+    @staticmethod
+    def _kind(poi: Dict[str, Any]) -> str:
+        """Fine-grained category, e.g. "tourism=museum" rather than "tourism" """
+        category = poi.get("category", "")
+        value = (poi.get("tags") or {}).get(category)
+        return f"{category}={value}" if value else category
+
+    @staticmethod
+    def _normalize_name(name: Optional[str]) -> str:
+        if not name or name == UNNAMED:
+            return ""
+        return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+    @staticmethod
+    def _distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+        """Equirectangular distance, accurate to well under 1% at city scale"""
+        x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+        y = math.radians(lat2 - lat1)
+        return 6_371_000 * math.hypot(x, y)
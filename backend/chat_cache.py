@@ -0,0 +1,180 @@
+"""
+Near-duplicate cache for free-form chat replies (MinHash over word shingles)
+"""
+
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared_state import MemorySharedState, SharedState
+
+# Words that carry no meaning for "is this the same question?"
+STOPWORDS = set(
+    """
+    a about an and any are around at can could do does for here i in is it its
+    me my of on please s some tell that the there this to us we what whats
+    which would you your
+    """.split()
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class ChatResponseCache:
+    """
+    Similarity cache for chat prompts, scoped per location cell
+
+    Prompts are reduced to content-word unigrams and bigrams and summarised by
+    a MinHash signature; a lookup returns the cached reply of the most similar
+    prompt in the same cell if its estimated Jaccard similarity reaches
+    ``threshold``. A cell keeps its ``max_entries_per_cell`` newest entries,
+    and entries expire after ``ttl_seconds``.
+
+    Cells are JSON documents in a SharedState, so a reply cached by one worker
+    serves the others. Without one, the cache keeps up to ``max_cells`` cells
+    (LRU) in this process.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_perm: int = 64,
+        max_cells: int = 512,
+        max_entries_per_cell: int = 64,
+        ttl_seconds: int = 24 * 3600,
+        min_shingles: int = 2,
+        cell_size_deg: float = 0.01,
+        state: Optional[SharedState] = None,
+    ):
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else float(os.getenv("CHAT_CACHE_THRESHOLD", "0.7"))
+        )
+        self.num_perm = num_perm
+        self.max_cells = max_cells
+        self.max_entries_per_cell = max_entries_per_cell
+        self.ttl_seconds = ttl_seconds
+        self.min_shingles = min_shingles
+        self.cell_size_deg = cell_size_deg
+
+        rng = random.Random(42)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self.state = state or MemorySharedState(max_entries=max_cells)
+        # Serializes read-modify-write of a cell within this process
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cell_key(self, lat: float, lng: float, context: str = "") -> str:
+        """
+        Scope for cached replies: the grid cell (~1 km at the default size)
+
+        A reply given with conversation context answers that conversation (its
+        tour, what was said before), so it is scoped to a hash of the context
+        as well and only serves requests with the same context.
+        """
+        key = f"{int(lat // self.cell_size_deg)}:{int(lng // self.cell_size_deg)}"
+        if context:
+            key += f":{zlib.crc32(context.encode('utf-8')):08x}"
+        return key
+
+    def get(self, scope: str, prompt: str) -> Optional[str]:
+        """
+        Find a cached reply for a sufficiently similar prompt
+
+        Args:
+            scope: Location cell key (or any other scope string)
+            prompt: User chat prompt
+
+        Returns:
+            Cached reply or None
+        """
+        signature = self._signature(prompt)
+        if signature is None:
+            return None
+
+        now = time.time()
+        cell = self.state.get(f"chat:{scope}") or []
+        best: Tuple[float, Optional[str]] = (0.0, None)
+        for entry_sig, reply, created_at in cell:
+            if now - created_at > self.ttl_seconds:
+                continue
+            similarity = self._similarity(signature, entry_sig)
+            if similarity >= self.threshold and similarity > best[0]:
+                best = (similarity, reply)
+
+        with self._lock:
+            if best[1] is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best[1]
+
+    def put(self, scope: str, prompt: str, reply: str) -> None:
+        """
+        Cache a reply for a prompt
+
+        Args:
+            scope: Location cell key (or any other scope string)
+            prompt: User chat prompt
+            reply: Assistant reply
+        """
+        signature = self._signature(prompt)
+        if signature is None or not reply:
+            return
+
+        now = time.time()
+        key = f"chat:{scope}"
+        with self._lock:
+            cell = [
+                entry
+                for entry in self.state.get(key) or []
+                if now - entry[2] <= self.ttl_seconds and entry[0] != list(signature)
+            ]
+            cell.append((signature, reply, now))
+            del cell[: -self.max_entries_per_cell]
+            self.state.set(key, cell, ttl_s=self.ttl_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        keys = self.state.keys("chat:")
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {"hits": self.hits, "misses": self.misses}
+        return {
+            "cells": len(keys),
+            "entries": sum(len(self.state.get(key) or []) for key in keys),
+            **stats,
+            "hit_ratio": stats["hits"] / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+            "backend": self.state.name,
+        }
+
+    def _shingles(self, prompt: str) -> List[str]:
+        words = re.findall(r"[a-z0-9]+", prompt.lower().replace("'", ""))
+        words = [w for w in words if w not in STOPWORDS]
+        shingles = set(words)
+        shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return sorted(shingles)
+
+    def _signature(self, prompt: str) -> Optional[tuple]:
+        shingles = self._shingles(prompt)
+        # Very short prompts ("tell me more") depend on the conversation, not
+        # on the words, so they are never answered from cache
+        if len(shingles) < self.min_shingles:
+            return None
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms
+        )
+
+    def _similarity(self, sig_a: tuple, sig_b: tuple) -> float:
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / self.num_perm
@@ -0,0 +1,196 @@
+"""
+Circuit breakers for the upstream services
+
+Without them, every request made while Overpass, OSRM or Gemini is degraded
+waits for the upstream to time out before falling back to mock POIs,
+haversine distances or template scripts. A breaker watches the outcome and
+latency of recent calls to one upstream and, once too many of them fail or
+are slow, opens: calls are then rejected at once (``CircuitOpenError``) and
+callers take their fallback in milliseconds.
+
+    closed --(failure or slow-call rate over the window)--> open
+    open --(open_s elapsed)--> half-open: up to ``half_open_probes`` calls
+    half-open --(probes all succeed)--> closed; --(a probe fails)--> open
+
+State is exported as ``earsight_circuit_state{upstream}`` along with
+transition and rejection counters.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+
+import metrics
+from request_policy import DeadlineExceeded
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Per-upstream breaker over a rolling time window of call outcomes
+
+    Exceptions count as failures, except DeadlineExceeded: a call cut short by
+    the caller's own deadline says nothing about the upstream. Calls that
+    return but take longer than ``slow_call_s`` count as slow. The breaker
+    opens when at least ``min_calls`` calls in the last ``window_s`` seconds
+    reached either ``failure_rate`` or ``slow_call_rate``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_s: float = 60.0,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_s: float = 10.0,
+        slow_call_rate: float = 0.8,
+        open_s: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.slow_call_rate = slow_call_rate
+        self.open_s = open_s
+        self.half_open_probes = half_open_probes
+
+        self.state = "closed"
+        self.rejected = 0
+        # (finished_at, failed, slow) per call in the window
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self._lock = threading.Lock()
+        metrics.CIRCUIT_STATE.set(STATE_VALUES["closed"], upstream=name)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call ``fn(*args, **kwargs)`` through the breaker
+
+        Returns:
+            What ``fn`` returns
+
+        Raises:
+            CircuitOpenError: The circuit is open; ``fn`` was not called
+        """
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except DeadlineExceeded:
+            self._release(probe)
+            raise
+        except Exception:
+            self._record(probe, failed=True, latency_s=time.monotonic() - started)
+            raise
+        except BaseException:
+            # Interrupted: no verdict on the upstream, but free the probe slot
+            self._release(probe)
+            raise
+        self._record(probe, failed=False, latency_s=time.monotonic() - started)
+        return result
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected (without taking a probe slot)"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self.state == "open" or (
+                self.state == "half_open"
+                and self._probes_started >= self.half_open_probes
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            self._prune(now)
+            return {
+                "state": self.state,
+                "calls": len(self._window),
+                "failures": sum(1 for _, failed, _ in self._window if failed),
+                "slow": sum(1 for _, _, slow in self._window if slow),
+                "rejected": self.rejected,
+            }
+
+    def _acquire(self) -> bool:
+        """Admit a call; True when it is a half-open probe"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self.state == "closed":
+                return False
+            if (
+                self.state == "half_open"
+                and self._probes_started < self.half_open_probes
+            ):
+                self._probes_started += 1
+                return True
+            self.rejected += 1
+        metrics.CIRCUIT_REJECTED.inc(upstream=self.name)
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def _release(self, probe: bool) -> None:
+        """Give back a probe slot without a verdict"""
+        if probe:
+            with self._lock:
+                if self.state == "half_open":
+                    self._probes_started -= 1
+
+    def _record(self, probe: bool, failed: bool, latency_s: float) -> None:
+        slow = latency_s > self.slow_call_s
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                if self.state != "half_open":
+                    return
+                if failed or slow:
+                    self._transition("open", now)
+                else:
+                    self._probes_passed += 1
+                    if self._probes_passed >= self.half_open_probes:
+                        self._transition("closed", now)
+                return
+            # Calls admitted before the circuit opened do not count any more
+            if self.state != "closed":
+                return
+            self._window.append((now, failed, slow))
+            self._prune(now)
+            calls = len(self._window)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._window if f)
+            slows = sum(1 for _, _, s in self._window if s)
+            if (
+                failures / calls >= self.failure_rate
+                or slows / calls >= self.slow_call_rate
+            ):
+                self._transition("open", now)
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self.state == "open" and now - self._opened_at >= self.open_s:
+            self._transition("half_open", now)
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_s:
+            self._window.popleft()
+
+    def _transition(self, state: str, now: float) -> None:
+        """Change state (caller holds the lock)"""
+        self.state = state
+        if state == "open":
+            self._opened_at = now
+            print(f"⚡ Circuit for {self.name} opened for {self.open_s:.0f}s")
+        elif state == "closed":
+            self._window.clear()
+            print(f"✅ Circuit for {self.name} closed")
+        self._probes_started = self._probes_passed = 0
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[state], upstream=self.name)
+        metrics.CIRCUIT_TRANSITIONS.inc(upstream=self.name, state=state)
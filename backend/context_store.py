@@ -0,0 +1,211 @@
+"""
+Server-side conversation context store with bounded prompt windows
+"""
+
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Union
+
+from shared_state import MemorySharedState, SharedState
+
+# Rough heuristic used across the backend: ~4 characters per Gemini token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for prompt budgeting (no tokenizer round trip)"""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def format_context(context: Union[str, List[dict], None]) -> str:
+    """
+    Format chat history as a prompt transcript
+
+    Args:
+        context: Either a preformatted context string (from the store) or a
+            list of {"role", "content"} messages
+
+    Returns:
+        Transcript string ending with a newline, or "" when there is no context
+    """
+    if not context:
+        return ""
+    if isinstance(context, str):
+        return context if context.endswith("\n") else context + "\n"
+
+    context_str = ""
+    for msg in context:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        context_str += f"{role.capitalize()}: {content}\n"
+    return context_str
+
+
+class ConversationContextStore:
+    """
+    Keeps per-session chat history with a token-budgeted window
+
+    Recent turns are kept verbatim until they exceed ``window_tokens``; older
+    turns are folded into a rolling extractive summary capped at
+    ``summary_tokens``. The formatted prompt context is cached per session and
+    only rebuilt when the session changes, so every call gets a prompt prefix
+    of bounded size no matter how long the conversation runs.
+
+    Sessions are JSON documents in a SharedState, so every worker sees the
+    same conversation. Without one, the store keeps up to ``max_sessions``
+    sessions in this process.
+    """
+
+    def __init__(
+        self,
+        window_tokens: int = 1024,
+        summary_tokens: int = 256,
+        max_sessions: int = 1000,
+        ttl_seconds: int = 3600,
+        state: Optional[SharedState] = None,
+    ):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.ttl_seconds = ttl_seconds
+        self.state = state or MemorySharedState(max_entries=max_sessions)
+        # Serializes read-modify-write of a session within this process
+        self._lock = threading.Lock()
+
+    def new_session_id(self) -> str:
+        """Create a fresh, unguessable session id"""
+        return uuid.uuid4().hex
+
+    def sync(self, session_id: str, messages: List[dict]) -> None:
+        """
+        Ingest client-supplied chat history into a session
+
+        The frontend resends its whole history on every call, so only messages
+        beyond the ones already ingested are added. If the client history got
+        shorter (the user cleared the chat) the session is rebuilt.
+
+        Args:
+            session_id: Session identifier
+            messages: Full client chat history
+        """
+        with self._lock:
+            session = self._load(session_id) or self._new_session()
+            if len(messages) < session["seen"]:
+                session = self._new_session()
+            for msg in messages[session["seen"]:]:
+                self._add_turn(
+                    session, msg.get("role", "user"), msg.get("content", "")
+                )
+            session["seen"] = len(messages)
+            self._save(session_id, session)
+
+    def record_turn(self, session_id: str, role: str, content: str) -> None:
+        """
+        Record a turn produced server-side (for clients that only send a session id)
+
+        Args:
+            session_id: Session identifier
+            role: "user" or "assistant"
+            content: Message text
+        """
+        with self._lock:
+            session = self._load(session_id) or self._new_session()
+            self._add_turn(session, role, content)
+            self._save(session_id, session)
+
+    def get_context(self, session_id: Optional[str]) -> str:
+        """
+        Get the bounded, preformatted prompt context for a session
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            Transcript string (summary + recent turns), "" for unknown sessions
+        """
+        if not session_id:
+            return ""
+        with self._lock:
+            session = self._load(session_id)
+            if session is None:
+                return ""
+            if session["formatted"] is None:
+                session["formatted"] = self._format(session)
+                self._save(session_id, session)
+            return session["formatted"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics"""
+        return {
+            "sessions": len(self.state.keys("session:")),
+            "backend": self.state.name,
+            "window_tokens": self.window_tokens,
+            "summary_tokens": self.summary_tokens,
+        }
+
+    def _new_session(self) -> Dict[str, Any]:
+        return {
+            "turns": [],
+            "turn_tokens": 0,
+            "summary": [],
+            "summary_tokens": 0,
+            "seen": 0,
+            "formatted": None,
+        }
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self.state.get(f"session:{session_id}")
+
+    def _save(self, session_id: str, session: Dict[str, Any]) -> None:
+        # Every write refreshes the TTL
+        self.state.set(f"session:{session_id}", session, ttl_s=self.ttl_seconds)
+
+    def _add_turn(self, session: Dict[str, Any], role: str, content: str) -> None:
+        content = content.strip()
+        if not content:
+            return
+
+        # A single oversized message must not blow the window on its own
+        max_chars = self.window_tokens * CHARS_PER_TOKEN
+        if len(content) > max_chars:
+            content = content[:max_chars].rstrip() + "..."
+
+        tokens = estimate_tokens(content)
+        session["turns"].append((role, content, tokens))
+        session["turn_tokens"] += tokens
+
+        while session["turn_tokens"] > self.window_tokens and len(session["turns"]) > 1:
+            old_role, old_content, old_tokens = session["turns"].pop(0)
+            session["turn_tokens"] -= old_tokens
+            self._fold_into_summary(session, old_role, old_content)
+
+        session["formatted"] = None
+
+    def _fold_into_summary(
+        self, session: Dict[str, Any], role: str, content: str
+    ) -> None:
+        """Compress an evicted turn to its first sentence and append it to the summary"""
+        sentence = content.split("\n", 1)[0]
+        for terminator in (". ", "? ", "! "):
+            if terminator in sentence:
+                sentence = sentence.split(terminator, 1)[0] + terminator.strip()
+                break
+        if len(sentence) > 200:
+            sentence = sentence[:200].rstrip() + "..."
+
+        piece = f"{role.capitalize()}: {sentence}"
+        tokens = estimate_tokens(piece)
+        session["summary"].append((piece, tokens))
+        session["summary_tokens"] += tokens
+
+        while session["summary_tokens"] > self.summary_tokens and session["summary"]:
+            _, dropped = session["summary"].pop(0)
+            session["summary_tokens"] -= dropped
+
+    def _format(self, session: Dict[str, Any]) -> str:
+        context_str = ""
+        if session["summary"]:
+            summary = " ".join(piece for piece, _ in session["summary"])
+            context_str += f"Summary of earlier conversation: {summary}\n"
+        for role, content, _ in session["turns"]:
+            context_str += f"{role.capitalize()}: {content}\n"
+        return context_str
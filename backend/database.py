@@ -1,6 +1,16 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 import os
 
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client['tourguide']
-tours_collection = db['tours']
\ No newline at end of file
+# Created on first use: a client starts connecting as soon as it exists
+_async_client = None
+
+
+def get_async_database():
+    """Async (asyncio) handle on the tourguide database, None if MONGO_URI is unset"""
+    global _async_client
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        return None
+    if _async_client is None:
+        _async_client = AsyncMongoClient(uri)
+    return _async_client['tourguide']
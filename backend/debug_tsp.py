@@ -67,8 +67,9 @@ def debug_tsp():
         
         # Step 5: Get distance matrix
         print("Step 5: Getting distance matrix...")
-        distance_matrix = osrm_client.get_distance_matrix(all_points)
-        print(f"Distance matrix shape: {len(distance_matrix)}x{len(distance_matrix[0]) if distance_matrix else 0}")
+        matrix = osrm_client.get_distance_matrix(all_points)
+        distance_matrix = matrix.distances.tolist()
+        print(f"Distance matrix shape: {matrix.distances.shape[0]}x{matrix.distances.shape[1]}")
         
         # Print first few rows of distance matrix
         print("Distance matrix (first 3 rows):")
@@ -0,0 +1,451 @@
+"""
+Offline stand-ins for the upstream services, for benchmarks and load tests
+
+- OverpassStandIn: local HTTP server answering Overpass queries with a
+  deterministic synthetic city (point it at the app with OVERPASS_URL)
+- ManhattanBackend: routing backend for an ideal street grid, where the walking
+  distance is the L1 distance; serve it with OSRMStandIn
+- FlakyBackend: wraps a routing backend with latency and error injection
+- FakeGemini: offline model installed in the LLM pool with register_model
+- FakeRedis: in-process stand-in for the redis-py client (RedisSharedState)
+
+Everything is seeded, so the same configuration always produces the same POIs,
+matrices and narrations.
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from llm_pool import get_llm_pool
+from routing_backends import RoutingBackend
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEG_LAT = 111_320.0
+WALKING_SPEED_MPS = 5 / 3.6
+
+# node["historic"="monument"](around:5000,43.6532,-79.3832);
+AROUND_QUERY = re.compile(
+    r'\["(?P<key>[^"]+)"(?:="(?P<value>[^"]+)")?\]'
+    r"\(around:(?P<radius>[\d.]+),(?P<lat>-?[\d.]+),(?P<lng>-?[\d.]+)\)"
+)
+
+GEMINI_MODELS = ("gemini-2.0-flash", "gemini-1.5-flash")
+
+
+def synthetic_pois(
+    lat: float,
+    lng: float,
+    radius_m: float,
+    tag: str,
+    count: int,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Overpass ``elements`` for one tag: ``count`` named nodes spread uniformly
+    over the disc, a third of them with wiki tags so ranking has work to do
+    """
+    key, _, value = tag.partition("=")
+    rng = random.Random(f"{seed}:{tag}:{lat:.4f}:{lng:.4f}")
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    elements = []
+    for i in range(count):
+        distance = radius_m * math.sqrt(rng.random())
+        bearing = rng.random() * 2 * math.pi
+        tags = {key: value if value and value != "*" else "yes"}
+        tags["name"] = f"{(value or key).replace('_', ' ').title()} {seed}-{i}"
+        if i % 3 == 0:
+            tags["wikidata"] = f"Q{rng.randrange(10**6, 10**7)}"
+        elements.append(
+            {
+                "type": "node",
+                "id": rng.randrange(10**9),
+                "lat": lat + distance * math.cos(bearing) / METERS_PER_DEG_LAT,
+                "lon": lng
+                + distance * math.sin(bearing) / (METERS_PER_DEG_LAT * cos_lat),
+                "tags": tags,
+            }
+        )
+    return elements
+
+
+class _StandInServer:
+    """Threaded HTTP server with latency and error injection"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_s: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def handle(self, path: str, query: Dict[str, str]) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def _inject(self) -> Optional[Tuple[int, Any]]:
+        """Sleep for the configured latency; maybe return an injected error"""
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.errors += 1
+                return 503, {"error": "injected failure"}
+        return None
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+            disable_nagle_algorithm = True  # see OSRMStandIn
+
+            def _respond(self, query: Dict[str, str]):
+                try:
+                    status, body = standin._inject() or standin.handle(
+                        urlsplit(self.path).path, query
+                    )
+                except Exception as e:
+                    status, body = 400, {"error": str(e)}
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                self._respond({k: v[0] for k, v in query.items()})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                query = parse_qs(self.rfile.read(length).decode("utf-8"))
+                self._respond({k: v[0] for k, v in query.items()})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class OverpassStandIn(_StandInServer):
+    """
+    Overpass API stand-in: every ``around`` clause of a query is answered with
+    ``per_tag`` synthetic POIs (change ``per_tag`` / ``seed`` between runs)
+    """
+
+    def __init__(self, per_tag: int = 40, seed: int = 0, **kwargs):
+        super().__init__(seed=seed, **kwargs)
+        self.per_tag = per_tag
+        self.seed = seed
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/api/interpreter"
+
+    def handle(self, path: str, query: Dict[str, str]) -> Tuple[int, Any]:
+        if path != "/api/interpreter" or "data" not in query:
+            return 400, {"error": "expected /api/interpreter?data=..."}
+        match = AROUND_QUERY.search(query["data"])
+        if match is None:
+            return 400, {"error": "only around: queries are supported"}
+        tag = match["key"] + (f"={match['value']}" if match["value"] else "")
+        elements = synthetic_pois(
+            float(match["lat"]),
+            float(match["lng"]),
+            float(match["radius"]),
+            tag,
+            self.per_tag,
+            self.seed,
+        )
+        return 200, {"version": 0.6, "elements": elements}
+
+
+class ManhattanBackend(RoutingBackend):
+    """
+    Router for an ideal north-south / east-west street grid
+
+    On a complete grid the shortest walk between two points is their L1
+    distance, so this gives road-like (non-Euclidean) matrices for any number
+    of points without a graph search. Routes are L-shaped legs.
+    """
+
+    name = "manhattan"
+    duration_scale = 1.0
+
+    def __init__(self, speed_mps: float = WALKING_SPEED_MPS):
+        self.speed_mps = speed_mps
+
+    def table(self, points, sources=None, destinations=None):
+        sources = list(range(len(points))) if sources is None else sources
+        destinations = (
+            list(range(len(points))) if destinations is None else destinations
+        )
+        coords = np.radians(np.asarray(points, dtype=np.float64))
+        src, dst = coords[sources], coords[destinations]
+        cos_lat = np.cos((src[:, None, 0] + dst[None, :, 0]) / 2)
+        dy = np.abs(src[:, None, 0] - dst[None, :, 0])
+        dx = np.abs(src[:, None, 1] - dst[None, :, 1]) * cos_lat
+        distances = (dx + dy) * EARTH_RADIUS_M
+        return {
+            "code": "Ok",
+            "distances": distances.tolist(),
+            "durations": (distances / self.speed_mps).tolist(),
+        }
+
+    def route(self, points, steps=False):
+        legs = []
+        geometry = [[points[0][1], points[0][0]]]
+        for a, b in zip(points, points[1:]):
+            corner = [b[1], a[0]]  # walk east-west first, then north-south
+            leg_geometry = [[a[1], a[0]], corner, [b[1], b[0]]]
+            distance = self._distance_m(a, b)
+            legs.append(
+                {
+                    "distance": distance,
+                    "duration": distance / self.speed_mps,
+                    "steps": (
+                        [{"geometry": {"coordinates": leg_geometry}}] if steps else []
+                    ),
+                }
+            )
+            geometry.extend(leg_geometry[1:])
+        route = {
+            "distance": sum(leg["distance"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "legs": legs,
+        }
+        if not steps:
+            route["geometry"] = {"type": "LineString", "coordinates": geometry}
+        return {"code": "Ok", "routes": [route]}
+
+    @staticmethod
+    def _distance_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+        cos_lat = math.cos(math.radians((a[0] + b[0]) / 2))
+        dy = math.radians(abs(a[0] - b[0]))
+        dx = math.radians(abs(a[1] - b[1])) * cos_lat
+        return (dx + dy) * EARTH_RADIUS_M
+
+
+class FlakyBackend(RoutingBackend):
+    """Routing backend wrapper adding latency and failing a share of calls"""
+
+    def __init__(
+        self,
+        backend: RoutingBackend,
+        latency_s: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.backend = backend
+        self.name = backend.name
+        self.duration_scale = backend.duration_scale
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def table(self, points, sources=None, destinations=None):
+        return self._call(self.backend.table, points, sources, destinations)
+
+    def route(self, points, steps=False):
+        return self._call(self.backend.route, points, steps)
+
+    def _call(self, method, *args):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        with self._lock:
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        if failed:
+            return {"code": "InvalidQuery", "message": "injected failure"}
+        return method(*args)
+
+
+class FakeGemini:
+    """
+    Offline ``generate_content`` stand-in
+
+    Route-parsing prompts get a JSON answer built from ``route_params``;
+    everything else gets a short narration. ``latency_s`` (plus uniform
+    ``jitter_s``) is slept per call and ``error_rate`` of calls raise, like
+    quota errors from the real API.
+    """
+
+    def __init__(
+        self,
+        route_params: Optional[Dict[str, Any]] = None,
+        latency_s: float = 0.0,
+        jitter_s: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.route_params = {
+            "max_distance_km": 5,
+            "start_location": "toronto",
+            "preferences": ["monuments"],
+            "min_distance_km": 0.5,
+            "is_route_request": True,
+            **(route_params or {}),
+        }
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: Any, stream: bool = False, **kwargs) -> Any:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_s + self._rng.random() * self.jitter_s
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise RuntimeError("429 Resource has been exhausted (injected)")
+
+        prompt = str(prompt)
+        if "extract route planning parameters" in prompt:
+            text = json.dumps(self.route_params)
+        else:
+            text = (
+                "Welcome to one of the most storied corners of the city. "
+                "Look up at the facade and imagine the streets a century ago."
+            )
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+        )
+        if stream:
+            words = text.split(" ")
+            return iter(
+                SimpleNamespace(text=word + (" " if i < len(words) - 1 else ""))
+                for i, word in enumerate(words)
+            )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def install_fake_gemini(
+    fake: FakeGemini, model_names: Iterable[str] = GEMINI_MODELS
+) -> None:
+    """Serve every Gemini model the app uses from ``fake``"""
+    pool = get_llm_pool()
+    for model_name in model_names:
+        pool.register_model(model_name, fake)
+
+
+class FakeRedis:
+    """
+    The subset of the redis-py client RedisSharedState uses, in memory
+
+    Values come back as bytes and expiry is in milliseconds, like the real
+    client. One lock makes every command atomic, as on a Redis server.
+    """
+
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: Any, px: Optional[int] = None) -> bool:
+        expires_at = time.time() + px / 1000 if px else None
+        with self._lock:
+            self._data[self._key(key)] = (self._value(value), expires_at)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(self._key(key), None) is not None for key in keys)
+
+    def incrby(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + amount if entry else amount
+            expires_at = entry[1] if entry else None
+            self._data[self._key(key)] = (str(value).encode(), expires_at)
+            return value
+
+    def pexpire(self, key: str, milliseconds: int) -> bool:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._data[self._key(key)] = (entry[0], time.time() + milliseconds / 1000)
+            return True
+
+    def scan_iter(self, match: str = "*") -> Iterable[bytes]:
+        prefix = match.rstrip("*").encode()
+        with self._lock:
+            keys = [key for key in list(self._data) if self._live(key.decode())]
+        return iter([key for key in keys if key.startswith(prefix)])
+
+    def _live(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(self._key(key))
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._data[self._key(key)]
+            return None
+        return entry
+
+    @staticmethod
+    def _key(key: Any) -> bytes:
+        return key if isinstance(key, bytes) else str(key).encode()
+
+    @staticmethod
+    def _value(value: Any) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile (q in [0, 100]) of a non-empty sequence"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
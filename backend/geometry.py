@@ -0,0 +1,325 @@
+"""
+Route geometry helpers: simplification, Google encoded polylines and a cache
+"""
+
+import heapq
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from cachetools import LRUCache
+
+EARTH_RADIUS_M = 6_371_000.0
+
+# Web Mercator ground resolution at zoom 0 on the equator (256 px tiles)
+METERS_PER_PIXEL_Z0 = 156_543.03392
+
+# Street-level zoom: walkers zoom in well past the map's initial zoom of 13
+DEFAULT_SIMPLIFY_ZOOM = 16
+MAX_ZOOM = 22
+
+
+def _encode_value(value: int) -> str:
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode_polyline(coordinates: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """
+    Encode a line as a Google polyline string
+
+    Args:
+        coordinates: [lng, lat] pairs (GeoJSON order, as returned by OSRM)
+        precision: Decimal places kept (5 is the Google/Leaflet default)
+
+    Returns:
+        Encoded polyline (lat/lng order, per the format)
+    """
+    factor = 10**precision
+    encoded = []
+    prev_lat = prev_lng = 0
+    for lng, lat in coordinates:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        encoded.append(_encode_value(lat_i - prev_lat))
+        encoded.append(_encode_value(lng_i - prev_lng))
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(encoded)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[List[float]]:
+    """
+    Decode a Google polyline string
+
+    Args:
+        encoded: Encoded polyline
+        precision: Decimal places used when encoding
+
+    Returns:
+        [lng, lat] pairs (GeoJSON order)
+    """
+    factor = 10**precision
+    coordinates = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append([lng / factor, lat / factor])
+    return coordinates
+
+
+def tolerance_for_zoom(zoom: float, lat: float, pixels: float = 0.5) -> float:
+    """
+    Largest deviation (meters) that stays invisible at a map zoom level
+
+    Args:
+        zoom: Leaflet/Web Mercator zoom level
+        lat: Latitude the route is drawn at (resolution shrinks with cos(lat))
+        pixels: Allowed deviation on screen
+
+    Returns:
+        Tolerance in meters
+    """
+    meters_per_pixel = METERS_PER_PIXEL_Z0 * np.cos(np.radians(lat)) / 2**zoom
+    return float(pixels * meters_per_pixel)
+
+
+def _project(coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+    """[lng, lat] pairs to local planar meters (equirectangular around the mean)"""
+    coords = np.asarray(coordinates, dtype=float)[:, :2]
+    lat0 = np.radians(coords[:, 1].mean())
+    x = np.radians(coords[:, 0]) * np.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(coords[:, 1]) * EARTH_RADIUS_M
+    return np.column_stack((x, y))
+
+
+def simplify_douglas_peucker(
+    coordinates: Sequence[Sequence[float]], tolerance_m: float
+) -> List[List[float]]:
+    """
+    Douglas-Peucker line simplification
+
+    Args:
+        coordinates: [lng, lat] pairs
+        tolerance_m: Maximum distance (meters) a dropped vertex may be from the line
+
+    Returns:
+        Subset of the input vertices, endpoints always kept
+    """
+    n = len(coordinates)
+    if n < 3:
+        return [list(c) for c in coordinates]
+
+    xy = _project(coordinates)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    # Explicit stack: OSRM geometries can have thousands of vertices
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = xy[end] - xy[start]
+        rel = xy[start + 1 : end] - xy[start]
+        seg_len = np.hypot(seg[0], seg[1])
+        if seg_len == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_m:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+
+    return [list(coordinates[i]) for i in np.flatnonzero(keep)]
+
+
+def simplify_visvalingam(
+    coordinates: Sequence[Sequence[float]], tolerance_m: float
+) -> List[List[float]]:
+    """
+    Visvalingam-Whyatt line simplification
+
+    Repeatedly drops the vertex forming the smallest triangle with its
+    neighbours until every remaining triangle is at least 2 * tolerance_m² in
+    area (a triangle tolerance_m high on a base of 4 * tolerance_m). Tends to
+    keep the overall shape of gentle curves better than Douglas-Peucker.
+
+    Args:
+        coordinates: [lng, lat] pairs
+        tolerance_m: Linear tolerance in meters
+
+    Returns:
+        Subset of the input vertices, endpoints always kept
+    """
+    n = len(coordinates)
+    if n < 3:
+        return [list(c) for c in coordinates]
+
+    xy = _project(coordinates)
+    min_area = 2 * tolerance_m**2
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = [False] * n
+
+    def area(i: int) -> float:
+        a, b, c = xy[prev[i]], xy[i], xy[nxt[i]]
+        return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2
+
+    areas = [0.0] * n
+    heap = []
+    for i in range(1, n - 1):
+        areas[i] = area(i)
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+
+    while heap:
+        current, i = heapq.heappop(heap)
+        if removed[i] or current != areas[i]:
+            continue  # stale heap entry
+        if current >= min_area:
+            break
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # Effective area never drops below the area just removed
+                areas[j] = max(area(j), current)
+                heapq.heappush(heap, (areas[j], j))
+
+    return [list(coordinates[i]) for i in range(n) if not removed[i]]
+
+
+SIMPLIFIERS = {
+    "douglas-peucker": simplify_douglas_peucker,
+    "visvalingam": simplify_visvalingam,
+}
+
+
+class GeometryCache:
+    """
+    Simplified route geometries (and their encoded polylines) keyed by route
+
+    The key is the ordered waypoint list plus the zoom level, so repeated and
+    shared routes skip both the simplification and the encoding.
+    """
+
+    def __init__(
+        self,
+        max_routes: int = 256,
+        algorithm: Optional[str] = None,
+        pixels: float = 0.5,
+    ):
+        self.algorithm = algorithm or os.getenv(
+            "GEOMETRY_SIMPLIFY_ALGORITHM", "douglas-peucker"
+        )
+        if self.algorithm not in SIMPLIFIERS:
+            raise ValueError(f"Unknown simplification algorithm: {self.algorithm}")
+        self.pixels = pixels
+        self._cache = LRUCache(maxsize=max_routes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.points_in = 0
+        self.points_out = 0
+
+    @staticmethod
+    def route_key(waypoints: Sequence[Sequence[float]]) -> str:
+        """Stable key for an ordered list of (lat, lng) waypoints"""
+        return ";".join(f"{lat:.5f},{lng:.5f}" for lat, lng in waypoints)
+
+    def simplify(
+        self,
+        route_key: str,
+        coordinates: Sequence[Sequence[float]],
+        zoom: Optional[float] = None,
+    ) -> List[List[float]]:
+        """
+        Simplified [lng, lat] geometry for a route at a zoom level
+
+        Args:
+            route_key: Key from route_key()
+            coordinates: Full-resolution [lng, lat] geometry
+            zoom: Target map zoom (DEFAULT_SIMPLIFY_ZOOM when None)
+
+        Returns:
+            Simplified geometry
+        """
+        zoom = self._zoom(zoom)
+        # The vertex count tells an OSRM geometry from the straight-line fallback
+        key = ("coords", route_key, len(coordinates), zoom)
+        return self._cached(key, lambda: self._simplify(coordinates, zoom))
+
+    def polyline(
+        self,
+        route_key: str,
+        coordinates: Sequence[Sequence[float]],
+        zoom: Optional[float] = None,
+    ) -> str:
+        """Encoded polyline of the simplified geometry (see simplify())"""
+        zoom = self._zoom(zoom)
+        key = ("polyline", route_key, len(coordinates), zoom)
+        return self._cached(
+            key, lambda: encode_polyline(self.simplify(route_key, coordinates, zoom))
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache and reduction statistics"""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "algorithm": self.algorithm,
+                "points_in": self.points_in,
+                "points_out": self.points_out,
+            }
+
+    def _zoom(self, zoom: Optional[float]) -> float:
+        if zoom is None:
+            return DEFAULT_SIMPLIFY_ZOOM
+        return min(max(zoom, 0), MAX_ZOOM)
+
+    def _cached(self, key: tuple, compute):
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._cache[key] = value
+        return value
+
+    def _simplify(
+        self, coordinates: Sequence[Sequence[float]], zoom: float
+    ) -> List[List[float]]:
+        if len(coordinates) < 3:
+            return [list(c) for c in coordinates]
+        mean_lat = sum(c[1] for c in coordinates) / len(coordinates)
+        tolerance = tolerance_for_zoom(zoom, mean_lat, self.pixels)
+        simplified = SIMPLIFIERS[self.algorithm](coordinates, tolerance)
+        with self._lock:
+            self.points_in += len(coordinates)
+            self.points_out += len(simplified)
+        return simplified
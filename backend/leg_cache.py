@@ -0,0 +1,184 @@
+"""
+Persistent cache of walking route legs between consecutive waypoints
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from geometry import decode_polyline, encode_polyline
+
+DEFAULT_LEG_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "route_legs.sqlite3"
+)
+
+# Leg geometries are stored as encoded polylines at OSRM's own precision
+GEOMETRY_PRECISION = 6
+
+
+class LegCache:
+    """
+    Two-tier cache of route legs (distance, duration and geometry)
+
+    A leg is keyed by its two endpoints rounded to ~1 m, in order. Lookups hit
+    an in-memory LRU first and fall back to SQLite, so legs survive restarts
+    and are shared by every route passing between the same two POIs. Both
+    tiers are bounded: the LRU by ``max_memory_legs`` and the table by
+    ``max_stored_legs`` (least recently used rows are trimmed).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_legs: int = 2048,
+        max_stored_legs: int = 100_000,
+    ):
+        self.path = path or os.getenv("LEG_CACHE_PATH", DEFAULT_LEG_CACHE_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.max_memory_legs = max_memory_legs
+        self.max_stored_legs = max_stored_legs
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS legs (
+                    leg_key TEXT PRIMARY KEY,
+                    distance REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    polyline TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS legs_last_used ON legs (last_used)"
+            )
+            self._conn.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes_since_trim = 0
+
+    @staticmethod
+    def leg_key(start: Tuple[float, float], end: Tuple[float, float]) -> str:
+        """Key for the leg from start to end, both (lat, lng)"""
+        return f"{start[0]:.5f},{start[1]:.5f}>{end[0]:.5f},{end[1]:.5f}"
+
+    def get(
+        self, start: Tuple[float, float], end: Tuple[float, float]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up a leg
+
+        Args:
+            start: (lat, lng) of the leg start
+            end: (lat, lng) of the leg end
+
+        Returns:
+            Dict with distance (km), duration (minutes) and geometry
+            ([lng, lat] pairs), or None
+        """
+        key = self.leg_key(start, end)
+        with self._lock:
+            leg = self._memory.get(key)
+            if leg is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return leg
+
+            row = self._conn.execute(
+                "SELECT distance, duration, polyline FROM legs WHERE leg_key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE legs SET last_used = ? WHERE leg_key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            leg = {
+                "distance": row[0],
+                "duration": row[1],
+                "geometry": decode_polyline(row[2], GEOMETRY_PRECISION),
+            }
+            self._remember(key, leg)
+            self.disk_hits += 1
+            return leg
+
+    def put(
+        self,
+        start: Tuple[float, float],
+        end: Tuple[float, float],
+        leg: Dict[str, Any],
+    ) -> None:
+        """
+        Store a leg
+
+        Args:
+            start: (lat, lng) of the leg start
+            end: (lat, lng) of the leg end
+            leg: Dict with distance (km), duration (minutes) and geometry
+        """
+        key = self.leg_key(start, end)
+        polyline = encode_polyline(leg["geometry"], GEOMETRY_PRECISION)
+        with self._lock:
+            self._remember(key, leg)
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO legs
+                    (leg_key, distance, duration, polyline, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, leg["distance"], leg["duration"], polyline, time.time()),
+            )
+            self._writes_since_trim += 1
+            # Trimming needs a COUNT, so only check every few hundred writes
+            if self._writes_since_trim >= 256:
+                self._trim()
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_legs": len(self._memory),
+                "stored_legs": stored,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (
+                    (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+                ),
+                "path": self.path,
+            }
+
+    def _remember(self, key: str, leg: Dict[str, Any]) -> None:
+        self._memory[key] = leg
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_legs:
+            self._memory.popitem(last=False)
+
+    def _trim(self) -> None:
+        self._writes_since_trim = 0
+        stored = self._conn.execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+        excess = stored - self.max_stored_legs
+        if excess > 0:
+            self._conn.execute(
+                """
+                DELETE FROM legs WHERE leg_key IN (
+                    SELECT leg_key FROM legs ORDER BY last_used LIMIT ?
+                )
+                """,
+                (excess,),
+            )
@@ -0,0 +1,343 @@
+"""
+Shared Gemini client registry used by every component that talks to an LLM
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import metrics
+import tracing
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from single_flight import SingleFlight
+
+
+def _genai():
+    """
+    google.generativeai, imported on first use
+
+    It is the slowest import of the app (about half of it), so servers answer
+    /health before paying for it; see startup.py for the background warm-up.
+    """
+    import google.generativeai as genai
+
+    return genai
+
+
+class PooledModel:
+    """
+    Drop-in replacement for ``genai.GenerativeModel`` bound to the shared pool
+
+    Components keep calling ``self.model.generate_content(prompt)``; the pool
+    decides when the underlying model is built and how many calls may run at
+    once.
+    """
+
+    def __init__(self, pool: "LLMPool", model_name: str):
+        self._pool = pool
+        self.model_name = model_name
+
+    def generate_content(self, prompt: Any, **kwargs) -> Any:
+        return self._pool.generate(self.model_name, prompt, **kwargs)
+
+    def generate_content_stream(self, prompt: Any, **kwargs) -> Iterator[str]:
+        return self._pool.generate_stream(self.model_name, prompt, **kwargs)
+
+    def circuit_open(self) -> bool:
+        """True while calls fail fast because the model keeps failing"""
+        return self._pool.circuit_open(self.model_name)
+
+
+class LLMPool:
+    """
+    Process-wide registry of Gemini models
+
+    - ``genai.configure`` runs once, so every model shares the same gRPC/HTTP
+      channel managed by the google client library
+    - ``GenerativeModel`` instances are created lazily on first use and reused
+    - each model has a concurrency semaphore so bursts queue instead of
+      tripping the per-minute quota
+    - identical concurrent prompts share one call (see single_flight.py)
+    - calls time out after GEMINI_TIMEOUT_S, and a circuit breaker per model
+      fails them fast while the model keeps failing (see circuit_breaker.py)
+    - request, error, latency, queue-wait and token counters per model
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        transport: Optional[str] = None,
+    ):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("GEMINI_MAX_CONCURRENCY", "4")
+        )
+        self.transport = transport or os.getenv("GEMINI_TRANSPORT")
+        self.timeout_s = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
+
+        self._configured = False
+        self._models: Dict[str, Any] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight("gemini")
+
+    def get_model(self, model_name: str) -> PooledModel:
+        """
+        Get a pooled handle for a model (no network or client setup happens here)
+
+        Args:
+            model_name: Gemini model name, e.g. "gemini-2.0-flash"
+
+        Returns:
+            PooledModel exposing generate_content
+        """
+        with self._lock:
+            self._ensure_model_slot(model_name)
+        return PooledModel(self, model_name)
+
+    def register_model(self, model_name: str, model: Any) -> None:
+        """
+        Serve ``model_name`` from an already built model object
+
+        Benchmarks and load tests install offline stand-ins this way; calls
+        still go through the semaphore and counters like real ones.
+
+        Args:
+            model_name: Gemini model name the components ask for
+            model: Object with generate_content(prompt, stream=False, **kwargs)
+        """
+        with self._lock:
+            self._ensure_model_slot(model_name)
+            self._models[model_name] = model
+
+    def generate(self, model_name: str, prompt: Any, **kwargs) -> Any:
+        """
+        Run generate_content on a shared model, respecting the concurrency limit
+
+        A text prompt already in flight with the same model and arguments is
+        not sent again: the caller waits for that call's response.
+
+        Args:
+            model_name: Gemini model name
+            prompt: Prompt passed through to generate_content
+            **kwargs: Extra generate_content arguments
+
+        Returns:
+            The Gemini response object
+        """
+        if isinstance(prompt, str):
+            key = (model_name, prompt, repr(sorted(kwargs.items())))
+            return self._flight.do(key, self._generate, model_name, prompt, **kwargs)
+        return self._generate(model_name, prompt, **kwargs)
+
+    def _generate(self, model_name: str, prompt: Any, **kwargs) -> Any:
+        model = self._get_or_create(model_name)
+        semaphore = self._semaphores[model_name]
+        breaker = self._breakers[model_name]
+        stats = self._stats[model_name]
+        kwargs.setdefault("request_options", {"timeout": self.timeout_s})
+
+        queued_at = time.time()
+        with semaphore:
+            started_at = time.time()
+            with self._lock:
+                stats["in_flight"] += 1
+            try:
+                response = breaker.call(model.generate_content, prompt, **kwargs)
+            except CircuitOpenError:
+                with self._lock:
+                    stats["in_flight"] -= 1
+                raise
+            except Exception:
+                self._record(model_name, stats, queued_at, started_at, error=True)
+                raise
+            self._record(model_name, stats, queued_at, started_at, response=response)
+            return response
+
+    def generate_stream(self, model_name: str, prompt: Any, **kwargs) -> Iterator[str]:
+        """
+        Stream partial text chunks from a shared model as Gemini produces them
+
+        The concurrency slot is held while opening the stream and while
+        pulling each chunk from Gemini, never across a yield: a stream the
+        consumer abandons without closing it (an SSE client that went away)
+        holds no slot while it waits to be garbage-collected. Only opening the
+        stream goes through the circuit breaker.
+
+        Args:
+            model_name: Gemini model name
+            prompt: Prompt passed through to generate_content
+            **kwargs: Extra generate_content arguments
+
+        Yields:
+            Non-empty text chunks
+        """
+        model = self._get_or_create(model_name)
+        semaphore = self._semaphores[model_name]
+        breaker = self._breakers[model_name]
+        stats = self._stats[model_name]
+        kwargs.setdefault("request_options", {"timeout": self.timeout_s})
+
+        queued_at = time.time()
+        started_at = queued_at
+        response = None
+        end = object()
+        try:
+            with semaphore:
+                started_at = time.time()
+                with self._lock:
+                    stats["in_flight"] += 1
+                response = breaker.call(
+                    model.generate_content, prompt, stream=True, **kwargs
+                )
+            chunks = iter(response)
+            while True:
+                with semaphore:
+                    chunk = next(chunks, end)
+                if chunk is end:
+                    break
+                text = getattr(chunk, "text", "")
+                if text:
+                    yield text
+        except CircuitOpenError:
+            with self._lock:
+                stats["in_flight"] -= 1
+            raise
+        except Exception:
+            self._record(model_name, stats, queued_at, started_at, error=True)
+            raise
+        except GeneratorExit:
+            # Consumer went away (client disconnected)
+            self._record(model_name, stats, queued_at, started_at, response=response)
+            raise
+        self._record(model_name, stats, queued_at, started_at, response=response)
+
+    def warm(self, model_names=()) -> None:
+        """
+        Import the client library, configure it, open the shared channel and
+        build models early
+        """
+        _genai()
+        for model_name in model_names:
+            self._get_or_create(model_name)
+        if self._configured:
+            from google.generativeai.client import get_default_generative_client
+
+            get_default_generative_client()
+
+    def circuit_open(self, model_name: str) -> bool:
+        """True while calls to the model are rejected by its circuit breaker"""
+        with self._lock:
+            self._ensure_model_slot(model_name)
+        return self._breakers[model_name].is_open()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get per-model counters"""
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "avg_latency_ms": (
+                        stats["latency_ms_total"] / stats["requests"]
+                        if stats["requests"]
+                        else 0.0
+                    ),
+                    "max_concurrency": self.max_concurrency,
+                    "circuit": self._breakers[name].state,
+                }
+                for name, stats in self._stats.items()
+            }
+
+    def _ensure_model_slot(self, model_name: str) -> None:
+        if model_name not in self._semaphores:
+            self._semaphores[model_name] = threading.BoundedSemaphore(
+                self.max_concurrency
+            )
+            self._breakers[model_name] = CircuitBreaker(
+                f"gemini:{model_name}", slow_call_s=self.timeout_s / 2
+            )
+            self._stats[model_name] = {
+                "requests": 0,
+                "errors": 0,
+                "in_flight": 0,
+                "latency_ms_total": 0.0,
+                "latency_ms_max": 0.0,
+                "queue_wait_ms_total": 0.0,
+                "prompt_tokens": 0,
+                "output_tokens": 0,
+            }
+
+    def _get_or_create(self, model_name: str) -> Any:
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is not None:
+                return model
+
+            genai = _genai()
+            if not self._configured:
+                options = {"api_key": self.api_key}
+                if self.transport:
+                    options["transport"] = self.transport
+                genai.configure(**options)
+                self._configured = True
+
+            self._ensure_model_slot(model_name)
+            model = genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+            return model
+
+    def _record(
+        self,
+        model_name: str,
+        stats: Dict[str, float],
+        queued_at: float,
+        started_at: float,
+        response: Any = None,
+        error: bool = False,
+    ) -> None:
+        finished_at = time.time()
+        latency_ms = (finished_at - started_at) * 1000
+        usage = getattr(response, "usage_metadata", None)
+        metrics.LLM_QUEUE_WAIT_SECONDS.observe(started_at - queued_at, model=model_name)
+        metrics.LLM_REQUEST_SECONDS.observe(finished_at - started_at, model=model_name)
+        metrics.LLM_REQUESTS.inc(model=model_name, status="error" if error else "ok")
+        tracing.add_span(
+            "gemini",
+            queued_at,
+            finished_at,
+            model=model_name,
+            queue_wait_ms=round((started_at - queued_at) * 1000, 3),
+            error=error,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+        )
+        with self._lock:
+            stats["in_flight"] -= 1
+            stats["requests"] += 1
+            stats["errors"] += int(error)
+            stats["latency_ms_total"] += latency_ms
+            stats["latency_ms_max"] = max(stats["latency_ms_max"], latency_ms)
+            stats["queue_wait_ms_total"] += (started_at - queued_at) * 1000
+            if usage is not None:
+                stats["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+                stats["output_tokens"] += (
+                    getattr(usage, "candidates_token_count", 0) or 0
+                )
+
+
+_pool: Optional[LLMPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMPool:
+    """Get the process-wide LLM pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = LLMPool()
+    return _pool
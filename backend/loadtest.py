@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Load test for the API with local upstream stand-ins
+
+Starts the stand-ins (Overpass, OSRM) and one uvicorn worker of the app in
+separate processes, with Gemini replaced by an offline model, then drives
+open-loop traffic against it:
+
+- roaming users that replay the frontend: POST /roam every --roam-interval
+  seconds (setInterval, so a slow response does not delay the next poll), the
+  position drifting at walking pace and the chat history growing with each
+  summary
+- route requests arriving as a Poisson process at --route-rate per second
+
+Each step of --roamers is run for --duration seconds and reports throughput,
+p50/p95/p99 latency and error rate per endpoint, plus the event-loop lag the
+app measured (from /metrics). The largest step that meets --slo-p95-ms and
+--max-error-rate is the capacity of one worker:
+
+    python loadtest.py --roamers 25 50 100 200 --roam-interval 60 --duration 120
+    python loadtest.py --roamers 100 --roam-interval 6 --duration 30 \\
+        --llm-latency-ms 800 --upstream-error-rate 0.05
+    python loadtest.py --target http://127.0.0.1:8000 --roamers 50  # running app
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from fake_upstreams import percentile
+
+CENTER = (43.6532, -79.3832)
+WALKING_DEG_PER_S = 1.4 / 111_320  # ~5 km/h
+LAG_METRIC = "earsight_event_loop_lag_seconds"
+
+
+class EndpointStats:
+    """Latencies and outcomes of one endpoint during a step"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def record(self, latency_ms: float, error: Optional[str] = None) -> None:
+        if error is None:
+            self.latencies_ms.append(latency_ms)
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, duration_s: float) -> Dict[str, Any]:
+        ok = len(self.latencies_ms)
+        failed = sum(self.errors.values())
+        total = ok + failed
+        latencies = self.latencies_ms or [0.0]
+        return {
+            "requests": total,
+            "ok": ok,
+            "errors": self.errors,
+            "error_rate": failed / total if total else 0.0,
+            "throughput_rps": ok / duration_s if duration_s else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": max(latencies),
+        }
+
+
+class LoadTest:
+    """One step: N roaming users plus Poisson route traffic for a fixed time"""
+
+    def __init__(self, base_url: str, args: argparse.Namespace, seed: int):
+        self.base_url = base_url
+        self.args = args
+        self.rng = random.Random(seed)
+        self.stats = {"roam": EndpointStats(), "route": EndpointStats()}
+        self._tasks: List[asyncio.Task] = []
+
+    async def run(self, roamers: int) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(
+            base_url=self.base_url, limits=limits, timeout=timeout
+        ) as client:
+            lag_before = await scrape_lag(client)
+            started = time.perf_counter()
+            deadline = started + self.args.duration
+            drivers = [self.roamer(client, deadline, i) for i in range(roamers)] + [
+                self.route_arrivals(client, deadline)
+            ]
+            await asyncio.gather(*drivers)
+            # Requests still in flight at the deadline count if they finish
+            # within the timeout; that is where an overloaded worker shows
+            if self._tasks:
+                await asyncio.wait(self._tasks)
+            elapsed = time.perf_counter() - started
+            lag_after = await scrape_lag(client)
+
+        lag = lag_delta(lag_before, lag_after)
+        return {
+            "roamers": roamers,
+            "route_rate": self.args.route_rate,
+            "duration_s": elapsed,
+            "endpoints": {
+                name: stats.summary(elapsed) for name, stats in self.stats.items()
+            },
+            "event_loop": {
+                **lag,
+                "blocked_share": lag["lag_total_s"] / elapsed if elapsed else 0.0,
+            },
+        }
+
+    async def roamer(self, client: httpx.AsyncClient, deadline: float, i: int):
+        """A frontend with roaming enabled: poll /roam on a fixed interval"""
+        interval = self.args.roam_interval
+        lat = CENTER[0] + self.rng.uniform(-0.02, 0.02)
+        lng = CENTER[1] + self.rng.uniform(-0.02, 0.02)
+        heading = self.rng.uniform(0, 2 * math.pi)
+        session = {"history": [], "session_id": None}
+        # Users do not switch roaming on in the same second
+        next_poll = time.perf_counter() + self.rng.uniform(0, interval)
+        while next_poll < deadline:
+            await asyncio.sleep(max(next_poll - time.perf_counter(), 0))
+            heading += self.rng.gauss(0, 0.3)
+            step = WALKING_DEG_PER_S * interval
+            lat += step * math.cos(heading)
+            lng += step * math.sin(heading) / math.cos(math.radians(lat))
+            body: Dict[str, Any] = {"coordinates": f"{lat:.6f}, {lng:.6f}"}
+            if self.args.session_mode == "context":
+                body["context"] = list(session["history"])
+            elif session["session_id"]:
+                body["session_id"] = session["session_id"]
+            self._spawn(self.roam_once(client, body, session))
+            next_poll += interval
+
+    async def roam_once(self, client, body, session) -> None:
+        response = await self.call(client, "roam", "/roam", body)
+        if response is None:
+            return
+        data = response.json()
+        session["session_id"] = data.get("session_id") or session["session_id"]
+        if data.get("summary"):
+            session["history"].append({"role": "assistant", "content": data["summary"]})
+            # The frontend keeps the whole history; cap it like a long walk would
+            del session["history"][: -self.args.max_history]
+
+    async def route_arrivals(self, client: httpx.AsyncClient, deadline: float):
+        """Poisson arrivals of /generate-route"""
+        rate = self.args.route_rate
+        if rate <= 0:
+            return
+        next_arrival = time.perf_counter() + self.rng.expovariate(rate)
+        while next_arrival < deadline:
+            await asyncio.sleep(max(next_arrival - time.perf_counter(), 0))
+            text = self.rng.choice(
+                [
+                    "I want a 3 km walk from toronto visiting monuments",
+                    "Plan a walk around toronto with museums and parks",
+                    "Show me historical places near toronto, about 5 km",
+                ]
+            )
+            body = {
+                "input_text": text,
+                "context": [{"role": "user", "content": text}],
+                "max_candidates": self.args.max_candidates,
+            }
+            self._spawn(self.call(client, "route", "/generate-route", body))
+            next_arrival += self.rng.expovariate(rate)
+
+    async def call(self, client, name: str, path: str, body: dict):
+        started = time.perf_counter()
+        try:
+            response = await client.post(path, json=body)
+        except httpx.TimeoutException:
+            self.stats[name].record(0.0, "timeout")
+            return None
+        except httpx.HTTPError as e:
+            self.stats[name].record(0.0, type(e).__name__)
+            return None
+        latency_ms = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            self.stats[name].record(latency_ms, f"http_{response.status_code}")
+            return None
+        self.stats[name].record(latency_ms)
+        return response
+
+    def _spawn(self, coroutine) -> None:
+        self._tasks.append(asyncio.ensure_future(coroutine))
+
+
+async def scrape_lag(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """Event-loop lag histogram from the app's /metrics (None if unavailable)"""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    return parse_histogram(response.text, LAG_METRIC)
+
+
+def parse_histogram(text: str, name: str) -> Dict[str, Any]:
+    """Buckets, sum and count of an unlabelled histogram in Prometheus text"""
+    histogram: Dict[str, Any] = {"buckets": {}, "sum": 0.0, "count": 0.0}
+    bucket = re.compile(rf'^{name}_bucket{{le="([^"]+)"}} (\S+)$')
+    for line in text.splitlines():
+        match = bucket.match(line)
+        if match:
+            histogram["buckets"][match[1]] = float(match[2])
+        elif line.startswith(f"{name}_sum "):
+            histogram["sum"] = float(line.split()[1])
+        elif line.startswith(f"{name}_count "):
+            histogram["count"] = float(line.split()[1])
+    return histogram
+
+
+def lag_delta(before: Optional[dict], after: Optional[dict]) -> Dict[str, Any]:
+    """Lag during the step: total, mean and the upper bound of the p99 bucket"""
+    if after is None:
+        return {"lag_total_s": 0.0, "lag_mean_ms": None, "lag_p99_ms_upper": None}
+    before = before or {"buckets": {}, "sum": 0.0, "count": 0.0}
+    count = after["count"] - before["count"]
+    total = after["sum"] - before["sum"]
+    p99 = None
+    if count:
+        for le, cumulative in after["buckets"].items():
+            if cumulative - before["buckets"].get(le, 0.0) >= 0.99 * count:
+                p99 = None if le == "+Inf" else float(le) * 1000
+                break
+    return {
+        "lag_total_s": total,
+        "lag_mean_ms": total / count * 1000 if count else None,
+        "lag_p99_ms_upper": p99,
+        "probes": count,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_upstreams(args: argparse.Namespace) -> None:
+    """Child process: Overpass and OSRM stand-ins; prints their URLs"""
+    from fake_upstreams import FlakyBackend, ManhattanBackend, OverpassStandIn
+    from osrm_standin import OSRMStandIn
+
+    overpass = OverpassStandIn(
+        per_tag=args.max_candidates,
+        latency_s=args.overpass_latency_ms / 1000,
+        error_rate=args.upstream_error_rate,
+    ).start()
+    backend = FlakyBackend(
+        ManhattanBackend(),
+        latency_s=args.osrm_latency_ms / 1000,
+        error_rate=args.upstream_error_rate,
+    )
+    osrm = OSRMStandIn(backend).start()
+    print(json.dumps({"overpass": overpass.url, "osrm": osrm.url}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_app(args: argparse.Namespace) -> None:
+    """Child process: one uvicorn worker of the app with an offline Gemini"""
+    import uvicorn
+
+    from fake_upstreams import FakeGemini, install_fake_gemini
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.update(
+        {
+            "ROUTING_BACKEND": "osrm",
+            "OSRM_BASE_URL": args.osrm_url,
+            "OSRM_DURATION_SCALE": "1",
+            "OVERPASS_URL": args.overpass_url,
+            "SCRIPT_STORE_PATH": os.path.join(workdir, "scripts.sqlite3"),
+            "LEG_CACHE_PATH": os.path.join(workdir, "legs.sqlite3"),
+            "MONGO_URI": "",
+            "GEMINI_API_KEY": "offline",
+        }
+    )
+    import main
+
+    install_fake_gemini(
+        FakeGemini(
+            latency_s=args.llm_latency_ms / 1000,
+            jitter_s=args.llm_jitter_ms / 1000,
+            error_rate=args.llm_error_rate,
+        )
+    )
+    main.script_generator.min_request_interval = 0
+    if args.tsp_time_limit is not None:
+        main.tsp_solver.DEFAULT_TIME_LIMIT_S = args.tsp_time_limit
+        main.tsp_solver.LARGE_N_TIME_LIMIT_S = args.tsp_time_limit
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+class Services:
+    """Stand-in and app processes for a run (nothing to start with --target)"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.processes: List[subprocess.Popen] = []
+        self.base_url = args.target
+
+    def __enter__(self) -> "Services":
+        if self.base_url:
+            return self
+        script = os.path.abspath(__file__)
+        shared = [
+            f"--max-candidates={self.args.max_candidates}",
+            f"--upstream-error-rate={self.args.upstream_error_rate}",
+            f"--overpass-latency-ms={self.args.overpass_latency_ms}",
+            f"--osrm-latency-ms={self.args.osrm_latency_ms}",
+        ]
+        upstreams = self._spawn([sys.executable, script, "upstreams", *shared])
+        urls = json.loads(upstreams.stdout.readline())
+
+        port = free_port()
+        command = [
+            sys.executable,
+            script,
+            "app",
+            f"--port={port}",
+            f"--overpass-url={urls['overpass']}",
+            f"--osrm-url={urls['osrm']}",
+            f"--llm-latency-ms={self.args.llm_latency_ms}",
+            f"--llm-jitter-ms={self.args.llm_jitter_ms}",
+            f"--llm-error-rate={self.args.llm_error_rate}",
+        ]
+        if self.args.tsp_time_limit is not None:
+            command.append(f"--tsp-time-limit={self.args.tsp_time_limit}")
+        self._spawn(command, log=self.args.app_log)
+        self.base_url = f"http://127.0.0.1:{port}"
+        self._wait_until_healthy()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _spawn(self, command: List[str], log: Optional[str] = None):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        if log is None:
+            stdout = (
+                subprocess.PIPE if command[2] == "upstreams" else subprocess.DEVNULL
+            )
+        else:
+            stdout = open(log, "w")
+        process = subprocess.Popen(
+            command, cwd=cwd, stdout=stdout, stderr=subprocess.STDOUT, text=True
+        )
+        self.processes.append(process)
+        return process
+
+    def _wait_until_healthy(self, timeout_s: float = 60.0) -> None:
+        deadline = time.time() + timeout_s
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{self.base_url}/health", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"App did not become healthy at {self.base_url}")
+
+
+def print_step(step: Dict[str, Any]) -> None:
+    loop = step["event_loop"]
+    print(
+        f"👥 {step['roamers']} roamers, {step['route_rate']}/s routes, "
+        f"{step['duration_s']:.0f}s"
+    )
+    for name, s in step["endpoints"].items():
+        if not s["requests"]:
+            continue
+        print(
+            f"   {name:>5}: {s['ok']:>5}/{s['requests']:<5} ok "
+            f"{s['throughput_rps']:6.2f} rps  p50 {s['p50_ms']:7.0f}  "
+            f"p95 {s['p95_ms']:7.0f}  p99 {s['p99_ms']:7.0f} ms  "
+            f"errors {s['error_rate']:.1%}"
+        )
+    if loop.get("lag_mean_ms") is not None:
+        print(
+            f"   event loop: blocked {loop['lag_total_s']:.2f}s "
+            f"({loop['blocked_share']:.1%}), mean lag {loop['lag_mean_ms']:.1f} ms, "
+            f"p99 <= {loop['lag_p99_ms_upper'] or 'inf'} ms"
+        )
+
+
+def meets_slo(step: Dict[str, Any], args: argparse.Namespace) -> bool:
+    for s in step["endpoints"].values():
+        if not s["requests"]:
+            continue
+        if s["p95_ms"] > args.slo_p95_ms or s["error_rate"] > args.max_error_rate:
+            return False
+    return True
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    steps = []
+    capacity = None
+    with Services(args) as services:
+        print(f"🚀 Target {services.base_url}")
+        for i, roamers in enumerate(args.roamers):
+            step = asyncio.run(
+                LoadTest(services.base_url, args, args.seed + i).run(roamers)
+            )
+            step["meets_slo"] = meets_slo(step, args)
+            print_step(step)
+            steps.append(step)
+            if step["meets_slo"]:
+                capacity = roamers
+            elif args.stop_on_breach:
+                break
+    return {
+        "loadtest": "api",
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("command", "app_log")
+        },
+        "steps": steps,
+        "capacity_roamers": capacity,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "command", nargs="?", default="run", choices=("run", "upstreams", "app")
+    )
+    parser.add_argument("--target", default=None, help="drive an already running app")
+    parser.add_argument("--roamers", type=int, nargs="+", default=[10, 25, 50, 100])
+    parser.add_argument("--roam-interval", type=float, default=60.0)
+    parser.add_argument("--route-rate", type=float, default=0.05, help="per second")
+    parser.add_argument(
+        "--duration", type=float, default=120.0, help="seconds per step"
+    )
+    parser.add_argument(
+        "--session-mode",
+        choices=("context", "session"),
+        default="context",
+        help="send the chat history (as the frontend does) or a session_id",
+    )
+    parser.add_argument("--max-history", type=int, default=30)
+    parser.add_argument("--max-candidates", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--slo-p95-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--stop-on-breach", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    # Stand-in behaviour
+    parser.add_argument("--overpass-latency-ms", type=float, default=300.0)
+    parser.add_argument("--osrm-latency-ms", type=float, default=80.0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=700.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=300.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--tsp-time-limit",
+        type=float,
+        default=None,
+        help="override the solver time limits (seconds); default: production",
+    )
+    parser.add_argument("--app-log", default=None, help="write the app's output here")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    # Internal: child process wiring
+    parser.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--overpass-url", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--osrm-url", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "upstreams":
+        serve_upstreams(args)
+    elif args.command == "app":
+        serve_app(args)
+    else:
+        report = run(args)
+        print(
+            f"📈 Capacity at the SLO: {report['capacity_roamers'] or 'below'} roamers"
+        )
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"📝 Report written to {args.output}")
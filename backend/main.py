@@ -2,31 +2,77 @@
 Main FastAPI application for EarSightAI MVP backend
 """
 
+import asyncio
+import json
 import os
+import random
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import BackgroundTasks, Body, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from geojson import Feature, FeatureCollection, LineString, Point
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 # Import our modules
-from models import RoamRequest, RoamResponse, RoutePoint, RouteRequest, RouteResponse
+import metrics
+import request_policy
+import startup
+import tracing
+from chat_cache import ChatResponseCache
+from context_store import ConversationContextStore
+from geometry import GeometryCache
+from llm_pool import get_llm_pool
+from models import (
+    ReoptimizeRequest,
+    RoamRequest,
+    RoamResponse,
+    RoutePoint,
+    RouteRequest,
+    RouteResponse,
+    RouteResponseOptions,
+    ScriptRequest,
+)
 from osrm_client import OSRMClient
 from overpass_client import OverpassClient
 from roam_service import RoamService
+from route_registry import RouteRegistry
+from route_store import create_route_store
 from script_generator import ScriptGenerator
+from shared_state import RateLimiter, get_shared_state
 from text_parser import TextParser
+from tour_reuse import TourMatcher
 from tsp_solver import TSPSolver
 
 load_dotenv()
 
+startup_timer = startup.StartupTimer()
+startup_timer.mark("imports")
+loop_lag_monitor = metrics.EventLoopLagMonitor()
+warmup = startup.Warmup(startup_timer)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_lag_monitor.start()
+    startup_timer.mark("app_startup")
+    print(f"🚀 Ready in {startup_timer.uptime():.2f}s: {startup_timer.summary()}")
+    # Load what the first route request would otherwise load, after the
+    # server is already answering (STARTUP_WARMUP=0 to skip, e.g. in tests)
+    if os.getenv("STARTUP_WARMUP", "1").lower() not in ("0", "false", "no"):
+        warmup.add("gemini", lambda: get_llm_pool().warm(GEMINI_MODELS))
+        warmup.add("ortools", tsp_solver.warm)
+        warmup.add("routing_backend", lambda: osrm_client.backend)
+        warmup.start()
+    yield
+    await loop_lag_monitor.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="EarSightAI Backend",
     description="A browser-based, audio-first tour-guide web app",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Setup CORS
@@ -39,63 +85,237 @@ app.add_middleware(
 )
 
 # Initialize components
+# Sessions, chat replies and the Gemini rate limit are shared by every worker
+# (SHARED_STATE_BACKEND; SQLite by default when WEB_CONCURRENCY > 1)
+shared_state = get_shared_state()
 text_parser = TextParser()
 overpass_client = OverpassClient()
 osrm_client = OSRMClient()
 tsp_solver = TSPSolver()
-script_generator = ScriptGenerator()
+script_generator = ScriptGenerator(
+    rate_limiter=RateLimiter(shared_state, "gemini-scripts")
+)
 roam_service = RoamService()
 
+# Models the components use, built by the startup warm-up
+GEMINI_MODELS = ("gemini-2.0-flash", "gemini-1.5-flash")
+# Candidate POIs considered per route; large values switch on the large-N path
+DEFAULT_MAX_CANDIDATES = 10
+MAX_CANDIDATES_LIMIT = 500
+context_store = ConversationContextStore(state=shared_state)
+chat_cache = ChatResponseCache(state=shared_state)
+geometry_cache = GeometryCache()
+tour_matcher = TourMatcher()
+# A route replaced in place is no longer the tour that was indexed for reuse
+route_registry = RouteRegistry(on_replace=tour_matcher.remove)
+route_store = create_route_store()  # None without MONGO_URI
+trace_sink = tracing.create_trace_sink()  # None without TRACE_SINK_PATH
+trace_sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# End-to-end budget per endpoint (seconds, 0 for none): upstream stages that
+# would overrun it take their fallbacks instead. Routes need room for the
+# Gemini pacing (10 new scripts at 4 s apart is 40 s on its own).
+REQUEST_DEADLINES = {
+    "/generate-route": float(os.getenv("ROUTE_DEADLINE_S", "60")) or None,
+}
+# Kept out of the TSP budget for the route geometry and response
+ROUTE_STAGES_RESERVE_S = 3.0
+# The solver always gets at least this long, even when the deadline is near
+MIN_TSP_TIME_LIMIT_S = 0.5
+startup_timer.mark("components")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so /route/{route_id} stays one series
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            path=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+@app.middleware("http")
+async def apply_deadline(request: Request, call_next):
+    """Set the request's deadline, which the upstream clients honour"""
+    with request_policy.deadline(REQUEST_DEADLINES.get(request.url.path)):
+        return await call_next(request)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Trace requests sent with ``X-Debug-Trace: 1`` (span tree in the response)
+    and a TRACE_SAMPLE_RATE share of the rest (sink only)
+    """
+    debug = request.headers.get("x-debug-trace", "").lower() in ("1", "true", "yes")
+    if not debug and random.random() >= trace_sample_rate:
+        return await call_next(request)
+    name = f"{request.method} {request.url.path}"
+    with tracing.start_trace(name, debug=debug) as trace:
+        response = await call_next(request)
+        trace.root.set(status=response.status_code)
+    response.headers["X-Trace-Id"] = trace.trace_id
+    response.headers["Server-Timing"] = trace.server_timing()
+    if trace_sink is not None:
+        trace_sink.write(trace)
+    return response
+
+def _with_trace(content: dict) -> dict:
+    """Add the span tree so far as ``debug.trace`` when the client asked for it"""
+    trace = tracing.current_trace()
+    if trace is not None and trace.debug:
+        content["debug"] = {"trace": trace.to_dict()}
+    return content
+
+
+def _session_context(session_id: str, context: list) -> tuple:
+    """
+    Resolve the conversation session for a request
+
+    Returns the (possibly new) session id and its bounded, preformatted context
+    so prompt size stays flat regardless of how much history the client sends.
+    """
+    session_id = session_id or context_store.new_session_id()
+    if context:
+        context_store.sync(session_id, context)
+    return session_id, context_store.get_context(session_id)
+
+
+def _tsp_time_limit(pois: list) -> float:
+    """
+    TSP search budget that leaves the rest of the deadline to later stages
+
+    Guided local search runs until its time limit, so without a deadline-aware
+    limit a feasible route used the whole deadline and the scripts and route
+    geometry fell back. None (the solver's default) without a deadline.
+    """
+    left = request_policy.remaining()
+    if left is None:
+        return None
+    if len(pois) + 1 > tsp_solver.LARGE_N_THRESHOLD:
+        default = tsp_solver.LARGE_N_TIME_LIMIT_S
+    else:
+        default = tsp_solver.DEFAULT_TIME_LIMIT_S
+    budget = left - script_generator.expected_time_s(pois) - ROUTE_STAGES_RESERVE_S
+    return min(default, max(MIN_TSP_TIME_LIMIT_S, budget))
+
+def _chat_scope(coordinates: str = None, context: str = "") -> str:
+    """
+    Scope for the chat cache: the user's grid cell and conversation context
+
+    None (don't cache) without usable coordinates: a place name alone is too
+    coarse to tell apart users on different tours.
+    """
+    if not coordinates:
+        return None
+    try:
+        lat, lng = (float(part) for part in coordinates.split(","))
+    except ValueError:
+        return None
+    return chat_cache.cell_key(lat, lng, context)
+
 @app.get("/")
 def read_root():
     return {
         "message": "EarSightAI Backend running!",
         "version": "1.0.0",
-        "endpoints": {"generate_route": "POST /generate-route", "roam": "POST /roam"},
+        "endpoints": {
+            "generate_route": "POST /generate-route",
+            "reoptimize_route": "POST /route/{route_id}/reoptimize",
+            "get_route": "GET /route/{route_id}",
+            "roam": "POST /roam",
+            "chat_stream": "POST /chat/stream",
+            "script_stream": "POST /script/stream",
+            "metrics": "GET /metrics",
+        },
     }
 
 @app.post("/generate-route")
-async def generate_route(request: RouteRequest = Body(...)):
+async def generate_route(
+    background_tasks: BackgroundTasks, request: RouteRequest = Body(...)
+):
     try:
         print(f"Processing request: {request.input_text}")
-        context = request.context
+        session_id, context = _session_context(request.session_id, request.context)
 
+        # Upstream and solver stages block, so they run in worker threads: the
+        # event loop keeps serving, and identical upstream calls from
+        # concurrent requests are coalesced (see single_flight.py)
         # Step 1: Parse input text with Gemini
         print("Step 1: Parsing input text...")
-        params = text_parser.parse_input(request.input_text, context=context)
+        with metrics.time_stage("parse"):
+            params = await asyncio.to_thread(
+                text_parser.parse_input, request.input_text, context=context
+            )
         print(f"Parsed parameters: {params}")
 
         if not params.get("is_route_request", True):
             print("Input is not a route request. Acting as chatbot.")
-            context_str = ""
-            if context:
-                for msg in context:
-                    role = msg.get("role", "user")
-                    content = msg.get("content", "")
-                    context_str += f"{role.capitalize()}: {content}\n"
-            chat_prompt = f"{context_str}User: {request.input_text}\nAssistant:"
-            chat_response = script_generator.model.generate_content(chat_prompt)
+            scope = _chat_scope(request.coordinates, context)
+            chat_text = None
+            if scope is not None:
+                chat_text = chat_cache.get(scope, request.input_text)
+            if chat_text is None:
+                chat_prompt = f"{context}User: {request.input_text}\nAssistant:"
+                with metrics.time_stage("chat"):
+                    chat_response = await asyncio.to_thread(
+                        script_generator.model.generate_content, chat_prompt
+                    )
+                chat_text = chat_response.text.strip()
+                if scope is not None:
+                    chat_cache.put(scope, request.input_text, chat_text)
+            if not request.context:
+                # Session-only clients: the server keeps the transcript
+                context_store.record_turn(session_id, "user", request.input_text)
+                context_store.record_turn(session_id, "assistant", chat_text)
             return JSONResponse(
-                content={
-                    "is_route_response": False,
-                    "chat_response": chat_response.text.strip(),
-                    "success": True,
-                    "message": "Chat response generated.",
-                }
+                content=_with_trace(
+                    {
+                        "is_route_response": False,
+                        "chat_response": chat_text,
+                        "session_id": session_id,
+                        "success": True,
+                        "message": "Chat response generated.",
+                    }
+                )
             )
 
         print("Step 2: Geocoding starting location...")
-        start_coords = overpass_client.geocode_location(params["start_location"])
+        with metrics.time_stage("geocode"):
+            start_coords = await asyncio.to_thread(
+                overpass_client.geocode_location, params["start_location"]
+            )
         print(f"Starting coordinates: {start_coords}")
 
+        if request.reuse and not context:
+            reused = await _reuse_nearby_tour(
+                start_coords, params, request, session_id, background_tasks
+            )
+            if reused is not None:
+                reused = project_fields(reused, request.fields)
+                return JSONResponse(content=_with_trace(reused))
+
         print("Step 3: Fetching POIs...")
         search_radius = min(params["max_distance_km"], 10)
-        pois = overpass_client.get_pois(
-            start_coords["lat"],
-            start_coords["lng"],
-            search_radius,
-            params["preferences"],
+        max_candidates = min(
+            max(request.max_candidates or DEFAULT_MAX_CANDIDATES, 1),
+            MAX_CANDIDATES_LIMIT,
         )
+        with metrics.time_stage("overpass"):
+            pois = await asyncio.to_thread(
+                overpass_client.get_pois,
+                start_coords["lat"],
+                start_coords["lng"],
+                search_radius,
+                params["preferences"],
+                top_k=max_candidates,
+            )
         print(f"Found {len(pois)} POIs")
 
         if not pois:
@@ -110,105 +330,399 @@ async def generate_route(request: RouteRequest = Body(...)):
         all_points.extend(poi_points)
 
         print("Step 5: Getting distance and duration matrices...")
-        matrices = osrm_client.get_distance_matrix(all_points)
-        distance_matrix = matrices["distance_matrix"]
-        duration_matrix = matrices["duration_matrix"]
+        with metrics.time_stage("matrix"):
+            matrix = await asyncio.to_thread(osrm_client.get_distance_matrix, all_points)
 
         print("Step 6: Solving TSP...")
-        route_indices = tsp_solver.solve_tsp(distance_matrix, params["max_distance_km"])
+        with metrics.time_stage("tsp"):
+            route_indices = await asyncio.to_thread(
+                tsp_solver.solve_tsp,
+                matrix,
+                params["max_distance_km"],
+                _tsp_time_limit(pois),
+            )
         print(f"Route indices: {route_indices}")
 
-        optimized_pois = []
-        route_points = []
-        for i, idx in enumerate(route_indices):
-            distance_from_prev = None
-            duration_from_prev = None
-            if i > 0:
-                from_idx = route_indices[i - 1]
-                distance_from_prev = distance_matrix[from_idx][idx]
-                duration_from_prev = duration_matrix[from_idx][idx]
-            if idx == 0:
-                point = RoutePoint(
-                    name=params["start_location"],
-                    lat=start_coords["lat"],
-                    lng=start_coords["lng"],
-                    script=f"Welcome to {params['start_location']}! This is where your journey begins.",
-                    category="start",
-                    distance_from_prev=distance_from_prev,
-                    duration_from_prev=duration_from_prev,
-                )
-            else:
-                poi = pois[idx - 1]
-                try:
-                    script = script_generator.generate_script(poi, context=context)
-                except Exception as e:
-                    print(f"AI script generation failed for {poi['name']}: {e}")
-                    script = "[AI script unavailable]"
-
-                point = RoutePoint(
-                    name=poi["name"],
-                    lat=poi["lat"],
-                    lng=poi["lng"],
-                    script=script,
-                    category=poi["category"],
-                    distance_from_prev=distance_from_prev,
-                    duration_from_prev=duration_from_prev,
-                )
-            optimized_pois.append(poi if idx > 0 else {
+        nodes = [
+            {
                 "name": params["start_location"],
                 "lat": start_coords["lat"],
                 "lng": start_coords["lng"],
-            })
-            route_points.append(point)
+                "category": "start",
+                "script": f"Welcome to {params['start_location']}! This is where your journey begins.",
+            }
+        ] + [dict(poi) for poi in pois]
 
-        print("Step 8: Getting detailed route...")
-        route_coords = [(point.lat, point.lng) for point in route_points]
-        route_details = osrm_client.get_route(route_coords)
+        print("Step 7: Generating scripts...")
+        with metrics.time_stage("scripts"):
+            route_points = await asyncio.to_thread(
+                build_route_points, route_indices, nodes, matrix, context
+            )
 
-        print("Step 9: Creating GeoJSON...")
-        geojson = create_geojson(route_points, route_details)
-
-        total_distance = tsp_solver.get_route_distance(route_indices, distance_matrix)
-        print(f"Route generation complete! Total distance: {total_distance:.2f}km")
-
-        return JSONResponse(
-            content={
-                "is_route_response": True,
-                "route": {
-                    "id": datetime.now().isoformat(),
-                    "total_distance_km": total_distance,
-                    "estimated_duration_minutes": route_details.get("duration", total_distance * 12),
-                    "waypoints": len(route_points),
-                    "created_at": datetime.now().isoformat(),
-                },
-                "points": [point.dict() for point in route_points],
-                "geojson": geojson,
-                "total_distance_km": total_distance,
-                "distance_matrix": distance_matrix,
-                "duration_matrix": duration_matrix,
-                "success": True,
-                "message": f"Generated route with {len(route_points)} waypoints covering {total_distance:.1f}km",
-            }
+        route_id = datetime.now().isoformat()
+        # Kept so the walk can be re-planned without re-running the pipeline
+        route = route_registry.put(
+            route_id, all_points, nodes, matrix, route_indices, params["max_distance_km"]
+        )
+        content = await asyncio.to_thread(
+            build_route_content,
+            route_id,
+            route_indices,
+            route_points,
+            matrix,
+            request,
+            session_id,
         )
+        # Tours shaped by a conversation are not served to other users
+        reusable = not context
+        if reusable:
+            tour_matcher.add(
+                route_id,
+                start_coords["lat"],
+                start_coords["lng"],
+                params["preferences"],
+                params["max_distance_km"],
+                content["total_distance_km"],
+            )
+        if route_store is not None:
+            # Persisted after the response is sent
+            metadata = {
+                "start_location": params["start_location"],
+                "preferences": [p.lower() for p in params["preferences"]],
+                "max_distance_km": params["max_distance_km"],
+                "reusable": reusable,
+            }
+            background_tasks.add_task(route_store.save, route, content, metadata)
+        print(f"Route generation complete! Total distance: {content['total_distance_km']:.2f}km")
+
+        content = project_fields(content, request.fields)
+        return JSONResponse(content=_with_trace(content))
 
     except Exception as e:
         print(f"Error generating route: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating route: {str(e)}")
 
-def create_geojson(points: list[RoutePoint], route_details: dict) -> dict:
+@app.post("/route/{route_id}/reoptimize")
+async def reoptimize_route(
+    route_id: str,
+    background_tasks: BackgroundTasks,
+    request: ReoptimizeRequest = Body(...),
+):
+    """
+    Re-plan a generated route from the user's current position
+
+    Reuses the stored matrix (only a row and column for the current position
+    are fetched) and warm-starts the solver from the previous order, so a
+    detour or a skipped stop is fixed in well under a second. The new plan
+    gets its own route id (in the response, and ``reoptimized_from`` names
+    the original); the original route is left as it was.
+    """
+    route = await _load_route(route_id)
+    if route is None:
+        raise HTTPException(status_code=404, detail="Route not found or expired")
+
+    try:
+        lat, lng = (float(part) for part in request.coordinates.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="coordinates must be 'lat, lng'")
+
+    order = route["order"]
+    skipped = set(request.skipped or [])
+    positions = request.remaining
+    if positions is None:
+        positions = range(1, len(order))
+    if any(not 0 <= p < len(order) for p in list(positions) + list(skipped)):
+        raise HTTPException(status_code=400, detail="Waypoint position out of range")
+    remaining_nodes = [order[p] for p in positions if p not in skipped and p != 0]
+
+    try:
+        print(f"Re-optimizing route {route_id}: {len(remaining_nodes)} stops left")
+        current = len(route["points"])
+        with metrics.time_stage("matrix_extend"):
+            matrix = await asyncio.to_thread(
+                osrm_client.extend_matrix, route["points"], route["matrix"], (lat, lng)
+            )
+        # The re-planned walk is a new route: the original may be a shared tour
+        # (served to other users by tour reuse and GET /route/{id})
+        new_id = datetime.now().isoformat()
+        nodes = [dict(node) for node in route["nodes"]] + [
+            {
+                "name": "Current location",
+                "lat": lat,
+                "lng": lng,
+                "category": "current",
+                "script": "Picking up your walk from here.",
+            }
+        ]
+
+        # Solve over [current position] + remaining stops, in their old order
+        subset = [current] + remaining_nodes
+        max_distance = request.max_distance_km or route["max_distance_km"]
+        with metrics.time_stage("reoptimize"):
+            sub_order = await asyncio.to_thread(
+                tsp_solver.reoptimize,
+                matrix.submatrix(subset),
+                list(range(len(subset))),
+                max_distance,
+            )
+        new_order = [subset[i] for i in sub_order]
+
+        route = route_registry.put(
+            new_id, route["points"] + [(lat, lng)], nodes, matrix, new_order, max_distance
+        )
+        route_points = await asyncio.to_thread(
+            build_route_points, new_order, nodes, matrix
+        )
+        content = await asyncio.to_thread(
+            build_route_content, new_id, new_order, route_points, matrix, request
+        )
+        content["reoptimized_from"] = route_id
+        content["message"] = (
+            f"Re-optimized route with {len(route_points) - 1} stops left "
+            f"covering {content['total_distance_km']:.1f}km"
+        )
+        if route_store is not None:
+            # A walk in progress is never offered to other users
+            metadata = {"reusable": False, "reoptimized_from": route_id}
+            background_tasks.add_task(route_store.save, route, content, metadata)
+        return JSONResponse(content=project_fields(content, request.fields))
+
+    except Exception as e:
+        print(f"Error re-optimizing route: {e}")
+        raise HTTPException(status_code=500, detail=f"Error re-optimizing route: {str(e)}")
+
+@app.get("/route/{route_id}")
+async def get_saved_route(route_id: str):
+    """Serve a generated (or shared) tour again without recomputing it"""
+    if route_store is not None:
+        stored = await route_store.get(route_id)
+        if stored is not None:
+            route_registry.restore(**stored["route"])
+            return JSONResponse(content=stored["response"])
+
+    route = route_registry.get(route_id)
+    if route is None:
+        raise HTTPException(status_code=404, detail="Route not found or expired")
+    # Scripts are on the nodes and legs are cached, but a leg missing from the
+    # cache still means an OSRM call
+    route_points = await asyncio.to_thread(
+        build_route_points, route["order"], route["nodes"], route["matrix"]
+    )
+    content = await asyncio.to_thread(
+        build_route_content,
+        route_id,
+        route["order"],
+        route_points,
+        route["matrix"],
+        RouteResponseOptions(),
+    )
+    return JSONResponse(content=content)
+
+async def _reuse_nearby_tour(
+    start_coords: dict,
+    params: dict,
+    request: RouteRequest,
+    session_id: str,
+    background_tasks: BackgroundTasks,
+) -> dict:
+    """
+    Response built from a similar existing tour, or None to run the pipeline
+
+    Candidates come from the in-memory index and, when configured, from the
+    route store's geospatial index. The match is copied under a new route id
+    (re-optimizing it must not change the shared tour) with the start renamed
+    for this request; scripts and legs are reused, so no upstream is called.
+    """
+    lat, lng = start_coords["lat"], start_coords["lng"]
+    candidates = tour_matcher.candidates(lat, lng)
+    if route_store is not None:
+        candidates += await route_store.find_nearby(
+            lat, lng, tour_matcher.radius_m, params["preferences"]
+        )
+    match = tour_matcher.best_match(
+        candidates, lat, lng, params["preferences"], params["max_distance_km"]
+    )
+    if match is None:
+        return None
+
+    entry, similarity = match
+    source = await _load_route(entry["route_id"])
+    if source is None:
+        tour_matcher.remove(entry["route_id"])
+        return None
+    print(f"♻️ Reusing tour {entry['route_id']} (similarity {similarity:.2f})")
+
+    nodes = list(source["nodes"])
+    start = source["order"][0]
+    nodes[start] = {
+        **nodes[start],
+        "name": params["start_location"],
+        "script": f"Welcome to {params['start_location']}! This is where your journey begins.",
+    }
+    route_id = datetime.now().isoformat()
+    route = route_registry.put(
+        route_id,
+        source["points"],
+        nodes,
+        source["matrix"],
+        source["order"],
+        params["max_distance_km"],
+    )
+    route_points = await asyncio.to_thread(
+        build_route_points, route["order"], nodes, route["matrix"]
+    )
+    content = await asyncio.to_thread(
+        build_route_content,
+        route_id,
+        route["order"],
+        route_points,
+        route["matrix"],
+        request,
+        session_id,
+    )
+    content["reused_from"] = {
+        "route_id": entry["route_id"],
+        "similarity": round(similarity, 3),
+    }
+    content["message"] = (
+        f"Reused a nearby tour with {len(route_points)} waypoints "
+        f"covering {content['total_distance_km']:.1f}km"
+    )
+    if route_store is not None:
+        metadata = {"reusable": False, "reused_from": entry["route_id"]}
+        background_tasks.add_task(route_store.save, route, content, metadata)
+    return content
+
+async def _load_route(route_id: str) -> dict:
+    """Route record from the in-memory registry, else from the persistent store"""
+    route = route_registry.get(route_id)
+    if route is None and route_store is not None:
+        stored = await route_store.get(route_id)
+        if stored is not None:
+            route = route_registry.restore(**stored["route"])
+    return route
+
+def build_route_points(order: list, nodes: list, matrix, context: str = None) -> list:
+    """
+    RoutePoints for a visiting order
+
+    Scripts are generated only for stops that do not have one yet and are kept
+    on the node, so re-optimized routes reuse them.
+    """
+    route_points = []
+    for i, idx in enumerate(order):
+        node = nodes[idx]
+        distance_from_prev = None
+        duration_from_prev = None
+        if i > 0:
+            from_idx = order[i - 1]
+            distance_from_prev = matrix.distance(from_idx, idx)
+            duration_from_prev = matrix.duration(from_idx, idx)
+
+        script = node.get("script")
+        if script is None:
+            try:
+                script = script_generator.generate_script(node, context=context)
+                node["script"] = script
+            except Exception as e:
+                print(f"AI script generation failed for {node['name']}: {e}")
+                script = "[AI script unavailable]"
+
+        route_points.append(
+            RoutePoint(
+                name=node["name"],
+                lat=node["lat"],
+                lng=node["lng"],
+                script=script,
+                category=node.get("category"),
+                distance_from_prev=distance_from_prev,
+                duration_from_prev=duration_from_prev,
+            )
+        )
+    return route_points
+
+def build_route_content(
+    route_id: str,
+    order: list,
+    route_points: list,
+    matrix,
+    options,
+    session_id: str = None,
+) -> dict:
+    """Route geometry, GeoJSON and the response body for an ordered route"""
+    print("Step 8: Getting detailed route...")
+    route_coords = [(point.lat, point.lng) for point in route_points]
+    with metrics.time_stage("route"):
+        route_details = osrm_client.get_route(route_coords)
+    # OSRM's full overview has thousands of vertices for a few km; keep only
+    # what is visible at the client's zoom
+    raw_geometry = route_details.get("geometry") or []
+    route_key = GeometryCache.route_key(route_coords)
+    route_details["geometry"] = geometry_cache.simplify(
+        route_key, raw_geometry, options.map_zoom
+    )
+    print(f"Route geometry: {len(raw_geometry)} -> {len(route_details['geometry'])} points")
+
+    print("Step 9: Creating GeoJSON...")
+    slim = options.view == "slim"
+    use_polyline = options.geometry_format == "polyline"
+    with metrics.time_stage("geojson"):
+        geojson = create_geojson(
+            route_points,
+            route_details,
+            include_scripts=not slim,
+            include_route_line=not use_polyline,
+        )
+
+    total_distance = tsp_solver.get_route_distance(order, matrix)
+    content = {
+        "is_route_response": True,
+        "route": {
+            "id": route_id,
+            "total_distance_km": total_distance,
+            "estimated_duration_minutes": route_details.get("duration", total_distance * 12),
+            "waypoints": len(route_points),
+            "created_at": datetime.now().isoformat(),
+        },
+        "points": [point.dict(exclude_none=slim) for point in route_points],
+        "geojson": geojson,
+        "total_distance_km": total_distance,
+        "session_id": session_id,
+        "success": True,
+        "message": f"Generated route with {len(route_points)} waypoints covering {total_distance:.1f}km",
+    }
+    if not slim:
+        content.update(matrix.to_dict())
+    if use_polyline:
+        content["route_polyline"] = geometry_cache.polyline(
+            route_key, raw_geometry, options.map_zoom
+        )
+    return content
+
+def project_fields(content: dict, fields: list = None) -> dict:
+    """Keep only the requested top-level keys (plus the status flags clients branch on)"""
+    if not fields:
+        return content
+    keep = set(fields) | {"is_route_response", "success", "message"}
+    return {key: value for key, value in content.items() if key in keep}
+
+def create_geojson(
+    points: list[RoutePoint],
+    route_details: dict,
+    include_scripts: bool = True,
+    include_route_line: bool = True,
+) -> dict:
+    from geojson import Feature, FeatureCollection, LineString, Point
+
     features = []
     for i, point in enumerate(points):
-        feature = Feature(
-            geometry=Point((point.lng, point.lat)),
-            properties={
-                "name": point.name,
-                "category": point.category,
-                "script": point.script,
-                "order": i,
-            },
-        )
+        properties = {"name": point.name, "category": point.category, "order": i}
+        if include_scripts:
+            # Scripts are also in "points"; slim responses send them only once
+            properties["script"] = point.script
+        feature = Feature(geometry=Point((point.lng, point.lat)), properties=properties)
         features.append(feature)
-    if route_details.get("geometry"):
+    if include_route_line and route_details.get("geometry"):
         coordinates = [coord for coord in route_details["geometry"]]
         route_feature = Feature(
             geometry=LineString(coordinates),
@@ -221,11 +735,91 @@ def create_geojson(points: list[RoutePoint], route_details: dict) -> dict:
         features.append(route_feature)
     return FeatureCollection(features)
 
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/chat/stream")
+async def chat_stream(request: RouteRequest = Body(...)):
+    """Stream a chatbot reply as SSE so text-to-speech can start on the first chunk"""
+    session_id, context = _session_context(request.session_id, request.context)
+    chat_prompt = f"{context}User: {request.input_text}\nAssistant:"
+    scope = _chat_scope(request.coordinates, context)
+
+    def events():
+        chat_text = None
+        if scope is not None:
+            chat_text = chat_cache.get(scope, request.input_text)
+        if chat_text is not None:
+            yield _sse_event({"text": chat_text})
+        else:
+            chunks = []
+            try:
+                for chunk in script_generator.model.generate_content_stream(
+                    chat_prompt
+                ):
+                    chunks.append(chunk)
+                    yield _sse_event({"text": chunk})
+            except Exception as e:
+                print(f"Error streaming chat response: {e}")
+                yield _sse_event({"detail": str(e)}, event="error")
+                return
+            chat_text = "".join(chunks).strip()
+            if scope is not None:
+                chat_cache.put(scope, request.input_text, chat_text)
+        if not request.context:
+            context_store.record_turn(session_id, "user", request.input_text)
+            context_store.record_turn(session_id, "assistant", chat_text)
+        yield _sse_event(
+            {"session_id": session_id, "chat_response": chat_text}, event="done"
+        )
+
+    return _sse_response(events())
+
+@app.post("/script/stream")
+async def script_stream(request: ScriptRequest = Body(...)):
+    """Stream the narration script for one POI as SSE"""
+    session_id, context = _session_context(request.session_id, request.context)
+    poi = {
+        "name": request.name,
+        "lat": request.lat,
+        "lng": request.lng,
+        "category": request.category or "attraction",
+        "tags": request.tags or {},
+    }
+
+    def events():
+        chunks = []
+        for chunk in script_generator.generate_script_stream(poi, context=context):
+            chunks.append(chunk)
+            yield _sse_event({"text": chunk})
+        yield _sse_event(
+            {"session_id": session_id, "script": "".join(chunks).strip()},
+            event="done",
+        )
+
+    return _sse_response(events())
+
 @app.post("/roam", response_model=RoamResponse)
 async def roam(request: RoamRequest = Body(...)):
     try:
         print(f"Roam request: coordinates={request.coordinates}, context={request.context}")
-        response = await roam_service.get_roam_with_fallback(request)
+        request.session_id, context = _session_context(
+            request.session_id, request.context
+        )
+        response = await roam_service.get_roam_with_fallback(request, context=context)
+        trace = tracing.current_trace()
+        if trace is not None and trace.debug:
+            # Not part of RoamResponse: only sent when the client asked for it
+            return JSONResponse(content=_with_trace(response.dict()))
         return response
     except HTTPException:
         raise
@@ -256,6 +850,73 @@ async def clear_roam_cache():
         print(f"Error clearing cache: {e}")
         raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}")
 
+@app.get("/llm/stats")
+async def get_llm_stats():
+    return {"llm_stats": get_llm_pool().get_stats()}
+
+@app.get("/scripts/stats")
+async def get_script_stats():
+    return {"script_stats": script_generator.script_store.get_stats()}
+
+@app.get("/chat/cache/stats")
+async def get_chat_cache_stats():
+    return {"cache_stats": chat_cache.get_stats()}
+
+@app.get("/context/stats")
+async def get_context_stats():
+    return {
+        "context_stats": context_store.get_stats(),
+        "shared_state": shared_state.get_stats(),
+    }
+
+@app.get("/route/registry/stats")
+async def get_route_registry_stats():
+    return {
+        "registry_stats": route_registry.get_stats(),
+        "store_stats": route_store.get_stats() if route_store else None,
+    }
+
+@app.get("/route/reuse/stats")
+async def get_tour_reuse_stats():
+    return {"reuse_stats": tour_matcher.get_stats()}
+
+@app.get("/route/legs/stats")
+async def get_leg_cache_stats():
+    return {"cache_stats": osrm_client.leg_cache.get_stats()}
+
+@app.get("/geometry/cache/stats")
+async def get_geometry_cache_stats():
+    return {"cache_stats": geometry_cache.get_stats()}
+
+def _collect_cache_metrics():
+    """Copy the caches' own hit/miss counters into the metrics registry"""
+    script_stats = script_generator.script_store.get_stats()
+    leg_stats = osrm_client.leg_cache.get_stats()
+    reuse_stats = tour_matcher.get_stats()
+    # Not chat_cache.get_stats(): counting entries scans the shared state
+    metrics.record_cache("chat", chat_cache.hits, chat_cache.misses)
+    for cache, stats in (
+        ("scripts", script_stats),
+        ("geometry", geometry_cache.get_stats()),
+        ("route_registry", route_registry.get_stats()),
+    ):
+        metrics.record_cache(cache, stats["hits"], stats["misses"])
+    leg_hits = leg_stats["memory_hits"] + leg_stats["disk_hits"]
+    metrics.record_cache("route_legs", leg_hits, leg_stats["misses"])
+    metrics.record_cache("tour_reuse", reuse_stats["reused"], reuse_stats["generated"])
+
+metrics.REGISTRY.register_collector(_collect_cache_metrics)
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "uptime_s": round(startup_timer.uptime(), 3),
+        "warmup": warmup.status()["state"],
+    }
@@ -0,0 +1,411 @@
+"""
+Process-wide metrics in the Prometheus text exposition format
+
+Kept dependency-free: counters, gauges and histograms with labels, a registry
+that renders them for ``GET /metrics``, plus the instrumentation helpers the
+pipeline uses (stage timer, instrumented HTTP session, event-loop lag probe).
+"""
+
+import asyncio
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+import tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; wide enough for a multi-minute Overpass query at the top
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """Common label handling; one child value per label combination"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {_escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """Mirror a count kept elsewhere (e.g. a cache's own hit counter)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, plus sum and count"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * (len(self.buckets) + 1), 0.0)
+            counts, total = self._values[key]
+            # First bucket whose upper bound is >= value; the last slot is +Inf
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of the ``with`` block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get(self, **labels) -> Dict[str, float]:
+        """Count and sum of the observations for one label combination"""
+        with self._lock:
+            counts, total = self._values.get(self._key(labels), ([0], 0.0))
+            return {"count": sum(counts), "sum": total}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(c), s)) for key, (c, s) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = (
+                    'le="+Inf"' if bound == math.inf else f'le="{_format_value(bound)}"'
+                )
+                lines.append(
+                    f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}"
+            )
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named metrics plus collectors run right before each scrape
+
+    Collectors let components that already keep their own counters (caches,
+    the LLM pool) be exported without touching their hot paths: a collector
+    copies their ``get_stats()`` into gauges / counters at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                # A broken collector must not take the whole scrape down
+                print(f"⚠️ Metrics collector {collector.__name__} failed: {e}")
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "earsight_stage_duration_seconds",
+    "Wall time of each route pipeline stage",
+    ["stage"],
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "earsight_http_request_duration_seconds",
+    "Wall time of API requests by route and status",
+    ["method", "path", "status"],
+)
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "earsight_upstream_requests_total",
+    "HTTP calls to upstream services by host and status ('error' if no response)",
+    ["host", "status"],
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "earsight_upstream_request_duration_seconds",
+    "Wall time of HTTP calls to upstream services",
+    ["host"],
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "earsight_llm_requests_total",
+    "Gemini calls by model and outcome",
+    ["model", "status"],
+)
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "earsight_llm_queue_wait_seconds",
+    "Time a Gemini call waited for a concurrency slot",
+    ["model"],
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "earsight_llm_request_duration_seconds",
+    "Wall time of Gemini calls once they hold a slot",
+    ["model"],
+)
+CACHE_HITS = REGISTRY.counter(
+    "earsight_cache_hits_total", "Cache hits by cache", ["cache"]
+)
+CACHE_MISSES = REGISTRY.counter(
+    "earsight_cache_misses_total", "Cache misses by cache", ["cache"]
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "earsight_cache_hit_ratio", "Hits / lookups since startup by cache", ["cache"]
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "earsight_event_loop_lag_seconds",
+    "How late the event loop woke a sleeping probe task",
+    buckets=LAG_BUCKETS,
+)
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    "earsight_single_flight_calls_total",
+    "Upstream calls made (leader) or coalesced into one in flight (follower)",
+    ["flight", "role"],
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    "earsight_circuit_state",
+    "Circuit breaker state by upstream (0 closed, 1 half-open, 2 open)",
+    ["upstream"],
+)
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "earsight_circuit_transitions_total",
+    "Circuit breaker state changes by upstream and new state",
+    ["upstream", "state"],
+)
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "earsight_circuit_rejected_total",
+    "Upstream calls skipped because the circuit was open",
+    ["upstream"],
+)
+HEDGED_REQUESTS = REGISTRY.counter(
+    "earsight_hedged_requests_total",
+    "Requests repeated to a mirror because the first attempt was slow or failed",
+    ["upstream"],
+)
+DEADLINE_FALLBACKS = REGISTRY.counter(
+    "earsight_deadline_fallbacks_total",
+    "Upstream calls skipped for a fallback because the request deadline was near",
+    ["upstream"],
+)
+STARTUP_PHASE_SECONDS = REGISTRY.gauge(
+    "earsight_startup_phase_seconds",
+    "Duration of each startup phase and background warm-up step",
+    ["phase"],
+)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """
+    Time one pipeline stage (histogram, plus a span when the request is traced)
+
+    Usage:
+        with time_stage("overpass"):
+            pois = overpass_client.get_pois(...)
+    """
+    with tracing.span(stage), STAGE_SECONDS.time(stage=stage):
+        yield
+
+
+def record_cache(cache: str, hits: int, misses: int) -> None:
+    """Export a cache's own hit/miss counters (for registry collectors)"""
+    lookups = hits + misses
+    CACHE_HITS.set(hits, cache=cache)
+    CACHE_MISSES.set(misses, cache=cache)
+    CACHE_HIT_RATIO.set(hits / lookups if lookups else 0.0, cache=cache)
+
+
+class InstrumentedSession(requests.Session):
+    """
+    ``requests.Session`` that counts and times every call by upstream host
+
+    Calls without an explicit ``timeout`` get ``self.timeout`` (seconds,
+    UPSTREAM_TIMEOUT_S by default): requests itself would wait forever.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        super().__init__()
+        self.timeout = timeout or float(os.getenv("UPSTREAM_TIMEOUT_S", "10"))
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname or "unknown"
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span("http", method=method, host=host) as span:
+                response = super().request(method, url, *args, **kwargs)
+                status = str(response.status_code)
+                span.set(status=response.status_code)
+            return response
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=host)
+            UPSTREAM_REQUESTS.inc(host=host, status=status)
+
+
+class EventLoopLagMonitor:
+    """
+    Measures event-loop lag: a task sleeps ``interval`` seconds and records how
+    much later than that it actually woke up. Blocking calls made from async
+    handlers show up here directly.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - started - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            EVENT_LOOP_LAG_SECONDS.observe(self.last_lag)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
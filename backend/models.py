@@ -2,7 +2,7 @@
 Pydantic models for the simplified Roam API
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -12,12 +12,14 @@ class RoamRequest(BaseModel):
 
     coordinates: str  # e.g., "43.6426, -79.3871"
     context: Optional[list[dict]] = None  # Optional chat history for Gemini context
+    session_id: Optional[str] = None  # Server-side conversation session
 
 
 class RoamResponse(BaseModel):
     """Response model for Roam API"""
 
     summary: str
+    session_id: Optional[str] = None
 
 
 class RoutePoint(BaseModel):
@@ -32,9 +34,48 @@ class RoutePoint(BaseModel):
     duration_from_prev: Optional[float] = None
 
 
-class RouteRequest(BaseModel):
+class RouteResponseOptions(BaseModel):
+    """Response shaping shared by the route endpoints"""
+
+    # "slim" drops the O(N^2) matrices and duplicated scripts, "polyline"
+    # returns the route line as an encoded polyline string, and fields limits
+    # the response to the listed top-level keys
+    view: Optional[Literal["full", "slim"]] = "full"
+    geometry_format: Optional[Literal["geojson", "polyline"]] = "geojson"
+    fields: Optional[List[str]] = None
+    map_zoom: Optional[int] = None  # Zoom the route line is simplified for (16 by default)
+
+
+class RouteRequest(RouteResponseOptions):
     input_text: str
     context: Optional[List[dict]] = None
+    session_id: Optional[str] = None
+    coordinates: Optional[str] = None  # User's current position, e.g. "43.6426, -79.3871"
+    max_candidates: Optional[int] = None  # POI candidates considered (10 by default, up to 500)
+    reuse: Optional[bool] = True  # Serve a similar existing tour when there is one
+
+
+class ReoptimizeRequest(RouteResponseOptions):
+    """Request model for re-planning a generated route from the user's position"""
+
+    coordinates: str  # Current position, e.g. "43.6426, -79.3871"
+    # Positions in the route's current "points" list; by default every stop
+    # after the start is still to visit
+    remaining: Optional[List[int]] = None
+    skipped: Optional[List[int]] = None
+    max_distance_km: Optional[float] = None  # Defaults to the original budget
+
+
+class ScriptRequest(BaseModel):
+    """Request model for streaming a single POI script"""
+
+    name: str
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    category: Optional[str] = None
+    tags: Optional[Dict[str, str]] = None
+    context: Optional[List[dict]] = None
+    session_id: Optional[str] = None
 
 
 class RouteResponse(BaseModel):
@@ -2,46 +2,191 @@
 OSRM client for walking distance calculations
 """
 
-from typing import Any, Dict, List, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-import requests
+import numpy as np
 
+import metrics
+import tracing
+from circuit_breaker import CircuitBreaker
+from leg_cache import LegCache
+from route_matrix import RouteMatrix
+from routing_backends import RoutingBackend, get_routing_backend
 
-class OSRMClient:
-    """Client for OSRM routing service"""
-
-    OSRM_URL = "https://router.project-osrm.org/route/v1"
 
-    def __init__(self):
-        self.session = requests.Session()
-
-    def get_distance_matrix(
-        self, points: List[Tuple[float, float]]
-    ) -> Dict[str, List[List[float]]]:
+class OSRMClient:
+    """
+    Client for OSRM routing service
+
+    Requests go through a RoutingBackend (public OSRM, self-hosted OSRM or the
+    in-process graph router, see routing_backends.py), all answering in the
+    OSRM response format. While the backend keeps failing or stalling, a
+    circuit breaker skips it and the haversine fallbacks answer at once; they
+    also answer when the request's deadline is too close for the backend.
+    """
+
+    # The public server rejects table requests with more coordinates than this
+    MAX_TABLE_COORDINATES = 100
+    MAX_TABLE_WORKERS = 4
+
+    def __init__(
+        self,
+        leg_cache: Optional[LegCache] = None,
+        backend: Optional[RoutingBackend] = None,
+    ):
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self.leg_cache = leg_cache or LegCache()
+        self.breaker = CircuitBreaker("osrm", slow_call_s=5.0)
+
+    @property
+    def backend(self) -> RoutingBackend:
+        """
+        The routing backend, created on first use (loading a local OSM graph
+        can take seconds, which must not delay server startup)
+        """
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = get_routing_backend()
+                    print(f"🧭 Routing backend: {self._backend.name}")
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: RoutingBackend) -> None:
+        self._backend = backend
+
+    def get_distance_matrix(self, points: List[Tuple[float, float]]) -> RouteMatrix:
         """
         Get distance and duration matrices between all points using OSRM
 
+        Large point sets are split into source/destination blocks so that no
+        single table request exceeds the server's coordinate limit; the blocks
+        are fetched concurrently and assembled into one matrix.
+
         Args:
             points: List of (lat, lng) tuples
 
         Returns:
-            Dict with 'distance_matrix' (in km) and 'duration_matrix' (in minutes)
+            RouteMatrix with distances (in km) and durations (in minutes)
         """
-        if len(points) < 2:
-            return {"distance_matrix": [[0.0]], "duration_matrix": [[0.0]]}
+        n = len(points)
+        if n < 2:
+            return RouteMatrix(np.zeros((1, 1)), np.zeros((1, 1)))
+
+        matrix = RouteMatrix.empty(n)
+        if not self._can_afford():
+            matrix.fill_missing(self._haversine_matrix(points))
+            return matrix
+
+        # Each request carries a source block plus a destination block
+        block = n
+        if n > self.MAX_TABLE_COORDINATES:
+            block = max(1, self.MAX_TABLE_COORDINATES // 2)
+        blocks = [range(start, min(start + block, n)) for start in range(0, n, block)]
+        jobs = [(src, dst) for src in blocks for dst in blocks]
+
+        def fetch(job):
+            sources, destinations = job
+            return job, self._table_block(points, sources, destinations)
+
+        if len(jobs) == 1:
+            results = [fetch(jobs[0])]
+        else:
+            print(f"OSRM table: {n} points in {len(jobs)} chunked requests")
+            with ThreadPoolExecutor(max_workers=self.MAX_TABLE_WORKERS) as executor:
+                results = list(executor.map(tracing.wrap(fetch), jobs))
+
+        for (sources, destinations), block in results:
+            if block is not None:
+                matrix.set_block(
+                    slice(sources.start, sources.stop),
+                    slice(destinations.start, destinations.stop),
+                    block,
+                )
 
-        # Build coordinates string for OSRM
-        coords = ";".join([f"{lng},{lat}" for lat, lng in points])
+        # Fill cells OSRM could not answer (None or failed blocks) with haversine
+        if matrix.missing_mask().any():
+            filled = matrix.fill_missing(self._haversine_matrix(points))  # 5km/h
+            print(f"Warning: {filled} matrix cells missing from OSRM, using haversine")
 
-        # Use the OSRM table service for distance and duration matrix (foot profile)
-        url = f"https://router.project-osrm.org/table/v1/walk/{coords}"
-        params = {"annotations": "distance,duration"}
+        return matrix
 
-        try:
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
+    def extend_matrix(
+        self,
+        points: List[Tuple[float, float]],
+        matrix: RouteMatrix,
+        new_point: Tuple[float, float],
+    ) -> RouteMatrix:
+        """
+        Add one point to an existing matrix without recomputing it
 
-            data = response.json()
+        Only the new row and column are requested from the backend.
+
+        Args:
+            points: The (lat, lng) points the matrix was built for
+            matrix: Their RouteMatrix
+            new_point: (lat, lng) of the point to add (becomes the last index)
+
+        Returns:
+            (N+1, N+1) RouteMatrix
+        """
+        n = len(points)
+        all_points = list(points) + [new_point]
+        extended = matrix.expanded(1)
+        jobs = [(range(n, n + 1), range(0, n + 1)), (range(0, n), range(n, n + 1))]
+        if not self._can_afford():
+            jobs = []
+        for sources, destinations in jobs:
+            block = self._table_block(all_points, sources, destinations)
+            if block is not None:
+                extended.set_block(
+                    slice(sources.start, sources.stop),
+                    slice(destinations.start, destinations.stop),
+                    block,
+                )
+        if extended.missing_mask().any():
+            filled = extended.fill_missing(self._haversine_matrix(all_points))
+            print(f"Warning: {filled} matrix cells missing from OSRM, using haversine")
+        return extended
+
+    def _table_block(
+        self,
+        points: List[Tuple[float, float]],
+        sources: range,
+        destinations: range,
+    ) -> Optional[RouteMatrix]:
+        """
+        Fetch one block of the table
+
+        Returns:
+            RouteMatrix of shape (len(sources), len(destinations)) in km and
+            minutes (NaN where OSRM returned None), or None if the request failed
+        """
+        # Coordinates for this request: the sources followed by the destinations
+        # that are not already among them
+        block_indices = list(sources) + [j for j in destinations if j not in sources]
+        position = {idx: pos for pos, idx in enumerate(block_indices)}
+        block_sources = block_destinations = None
+        if len(block_indices) != len(points) or len(sources) != len(points):
+            block_sources = [position[i] for i in sources]
+            block_destinations = [position[j] for j in destinations]
+
+        try:
+            with tracing.span(
+                "osrm.table",
+                backend=self.backend.name,
+                sources=len(sources),
+                destinations=len(destinations),
+            ):
+                data = self.breaker.call(
+                    self.backend.table,
+                    [points[i] for i in block_indices],
+                    block_sources,
+                    block_destinations,
+                )
             if (
                 data["code"] != "Ok"
                 or "distances" not in data
@@ -51,49 +196,22 @@ class OSRMClient:
                     f"OSRM error: {data.get('message', 'No distances or durations in response')}"
                 )
 
-            # Extract and convert distances (meters to km) and durations (seconds to minutes)
-            distances = data["distances"]
-            durations = data["durations"]
-
-            distance_matrix = []
-            duration_matrix = []
-            for i, (row_dist, row_dur) in enumerate(zip(distances, durations)):
-                matrix_row_dist = []
-                matrix_row_dur = []
-                for j, (distance, duration) in enumerate(zip(row_dist, row_dur)):
-                    if distance is None:
-                        print("Warning: OSRM returned None for distance")
-                        distance = self._haversine_distance(points[i], points[j])
-                    else:
-                        distance = distance / 1000  # meters to km
-                    if duration is None:
-                        print("Warning: OSRM returned None for duration")
-                        duration = (
-                            self._haversine_distance(points[i], points[j]) / 5
-                        ) * 60  # assume 5km/h
-                    else:
-                        duration = 7*(duration / 60)  # seconds to minutes
-                    matrix_row_dist.append(distance)
-                    matrix_row_dur.append(duration)
-                distance_matrix.append(matrix_row_dist)
-                duration_matrix.append(matrix_row_dur)
-
-            return {
-                "distance_matrix": distance_matrix,
-                "duration_matrix": duration_matrix,
-            }
+            return RouteMatrix.from_osrm(
+                data, duration_scale=self.backend.duration_scale
+            )
 
         except Exception as e:
             print(f"Error getting distance/duration matrix from OSRM: {e}")
-            # Fallback to haversine distances and estimated durations
-            dist = self._haversine_matrix(points)
-            dur = [[(d / 5) * 60 for d in row] for row in dist]  # 5km/h walking
-            return {"distance_matrix": dist, "duration_matrix": dur}
+            return None
 
     def get_route(self, points: List[Tuple[float, float]]) -> Dict[str, Any]:
         """
         Get detailed route between points
 
+        The route is assembled from per-leg entries in the leg cache. Runs of
+        consecutive legs that are not cached are fetched with one OSRM request
+        per run (concurrently), split into legs and cached for later routes.
+
         Args:
             points: List of (lat, lng) tuples in order
 
@@ -103,33 +221,113 @@ class OSRMClient:
         if len(points) < 2:
             return {"distance": 0.0, "geometry": []}
 
-        # Build coordinates string for OSRM
-        coords = ";".join([f"{lng},{lat}" for lat, lng in points])
+        legs: List[Optional[Dict[str, Any]]] = [
+            self.leg_cache.get(points[i], points[i + 1]) for i in range(len(points) - 1)
+        ]
+
+        # Contiguous runs of missing legs, as (first leg, last leg) indices
+        runs = []
+        for i, leg in enumerate(legs):
+            if leg is not None:
+                continue
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+
+        if runs:
+            missing = sum(last - first + 1 for first, last in runs)
+            print(
+                f"Route legs: {missing}/{len(legs)} missing, {len(runs)} OSRM requests"
+            )
+
+            def fetch(run):
+                first, last = run
+                return run, self._route_legs(points[first : last + 2])
+
+            if not self._can_afford():
+                results = [(run, None) for run in runs]
+            elif len(runs) == 1:
+                results = [fetch(runs[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=self.MAX_TABLE_WORKERS) as executor:
+                    results = list(executor.map(tracing.wrap(fetch), runs))
+
+            for (first, last), fetched in results:
+                for i in range(first, last + 1):
+                    if fetched is None:
+                        # Not cached: the next request retries OSRM
+                        legs[i] = self._simple_route(points[i : i + 2])
+                    else:
+                        legs[i] = fetched[i - first]
+                        self.leg_cache.put(points[i], points[i + 1], legs[i])
 
-        url = f"https://router.project-osrm.org/route/v1/foot/{coords}"
-        params = {"overview": "full", "geometries": "geojson"}
+        return self._stitch(legs)
 
-        try:
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
+    def _route_legs(
+        self, points: List[Tuple[float, float]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch a route from OSRM split into one entry per leg
 
-            data = response.json()
+        Returns:
+            List of {distance, duration, geometry} per leg, or None on failure
+        """
+        try:
+            with tracing.span(
+                "osrm.route", backend=self.backend.name, legs=len(points) - 1
+            ):
+                data = self.breaker.call(self.backend.route, points, steps=True)
 
             if data["code"] != "Ok":
                 raise Exception(f"OSRM error: {data.get('message', 'Unknown error')}")
 
-            route = data["routes"][0]
-
-            return {
-                "distance": route["distance"] / 1000,  # Convert to km
-                "duration": route["duration"] / 60,  # Convert to minutes
-                "geometry": route["geometry"]["coordinates"],
-            }
+            legs = []
+            for leg in data["routes"][0]["legs"]:
+                geometry = []
+                for step in leg.get("steps", []):
+                    for coord in step["geometry"]["coordinates"]:
+                        if not geometry or geometry[-1] != coord:
+                            geometry.append(coord)
+                legs.append(
+                    {
+                        "distance": leg["distance"] / 1000,  # Convert to km
+                        "duration": leg["duration"] / 60,  # Convert to minutes
+                        "geometry": geometry,
+                    }
+                )
+            if len(legs) != len(points) - 1:
+                raise Exception(
+                    f"OSRM returned {len(legs)} legs for {len(points)} points"
+                )
+            return legs
 
         except Exception as e:
             print(f"Error getting route from OSRM: {e}")
-            # Fallback to simple route
-            return self._simple_route(points)
+            return None
+
+    def _can_afford(self) -> bool:
+        """False when the request deadline is too close to wait for the backend"""
+        if self.backend.can_afford():
+            return True
+        print("Too close to the request deadline for OSRM, using haversine")
+        metrics.DEADLINE_FALLBACKS.inc(upstream="osrm")
+        return False
+
+    @staticmethod
+    def _stitch(legs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Join consecutive legs into one route, dropping the shared joints"""
+        geometry = []
+        for leg in legs:
+            coords = [list(coord) for coord in leg["geometry"]]
+            if geometry and coords and geometry[-1] == coords[0]:
+                coords = coords[1:]
+            geometry.extend(coords)
+        return {
+            "distance": sum(leg["distance"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "geometry": geometry,
+        }
 
     def _haversine_distance(
         self, point1: Tuple[float, float], point2: Tuple[float, float]
@@ -163,7 +361,7 @@ class OSRMClient:
 
         return r * c
 
-    def _haversine_matrix(self, points: List[Tuple[float, float]]) -> List[List[float]]:
+    def _haversine_matrix(self, points: List[Tuple[float, float]]) -> np.ndarray:
         """
         Create distance matrix using haversine distances
 
@@ -171,18 +369,16 @@ class OSRMClient:
             points: List of (lat, lng) tuples
 
         Returns:
-            Distance matrix
-        """
-        matrix = []
-        for i, point1 in enumerate(points):
-            row = []
-            for j, point2 in enumerate(points):
-                if i == j:
-                    row.append(0.0)
-                else:
-                    row.append(self._haversine_distance(point1, point2))
-            matrix.append(row)
-        return matrix
+            (N, N) distance matrix in kilometers
+        """
+        coords = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+        lat = coords[:, 0][:, None]
+        lng = coords[:, 1][:, None]
+
+        dlat = lat.T - lat
+        dlng = lng.T - lng
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlng / 2) ** 2
+        return 2 * 6371 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
 
     def _simple_route(self, points: List[Tuple[float, float]]) -> Dict[str, Any]:
         """
@@ -195,14 +391,15 @@ class OSRMClient:
             Simple route information
         """
         total_distance = 0.0
-        geometry = []
+        # [lng, lat] like the OSRM GeoJSON geometry it stands in for
+        geometry = [[points[0][1], points[0][0]]]
 
         for i in range(len(points) - 1):
             distance = self._haversine_distance(points[i], points[i + 1])
             total_distance += distance
 
             # Add points to geometry
-            geometry.extend([points[i], points[i + 1]])
+            geometry.append([points[i + 1][1], points[i + 1][0]])
 
         return {
             "distance": total_distance,
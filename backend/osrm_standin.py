@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Lightweight local HTTP stand-in for an OSRM server
+
+Serves the OSRM ``table`` and ``route`` services from a LocalGraphBackend so
+the whole pipeline can run (and be benchmarked) without the public server:
+
+    python osrm_standin.py --graph toronto.osm --port 5001
+    ROUTING_BACKEND=osrm OSRM_BASE_URL=http://127.0.0.1:5001 uvicorn main:app
+
+Without --graph a synthetic street grid around --center is served.
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from routing_backends import LocalGraphBackend, RoutingBackend
+
+
+class OSRMStandIn:
+    """
+    OSRM-compatible HTTP server backed by an in-process routing backend
+
+    Usable as a context manager in tests:
+
+        with OSRMStandIn(LocalGraphBackend.grid(43.65, -79.38)) as server:
+            backend = OSRMHTTPBackend(server.url)
+    """
+
+    def __init__(
+        self,
+        backend: Optional[RoutingBackend] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.backend = backend or LocalGraphBackend.grid(43.6532, -79.3832)
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OSRMStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve in the calling thread (command-line use)"""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "OSRMStandIn":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def handle(self, path: str) -> dict:
+        """
+        Answer one OSRM request path
+
+        Args:
+            path: e.g. /route/v1/foot/-79.38,43.65;-79.37,43.66?steps=true
+
+        Returns:
+            OSRM JSON response
+        """
+        self.requests += 1
+        parsed = urlsplit(path)  # not urlparse: it splits ";" off the path
+        parts = parsed.path.strip("/").split("/")
+        if len(parts) != 4 or parts[1] != "v1":
+            return {"code": "InvalidUrl", "message": f"Unsupported path: {parsed.path}"}
+        service, coords = parts[0], parts[3]
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        points = []
+        for pair in coords.split(";"):
+            lng, lat = pair.split(",")
+            points.append((float(lat), float(lng)))
+
+        if service == "table":
+            return self.backend.table(
+                points,
+                _indices(query.get("sources")),
+                _indices(query.get("destinations")),
+            )
+        if service == "route":
+            return self.backend.route(points, steps=query.get("steps") == "true")
+        return {"code": "InvalidService", "message": f"Unsupported service: {service}"}
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Headers and body go out as two writes; without this, Nagle plus
+            # the client's delayed ACK stall every response by ~40 ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                try:
+                    body = standin.handle(self.path)
+                    status = 200 if body.get("code") == "Ok" else 400
+                except Exception as e:
+                    body, status = {"code": "InvalidQuery", "message": str(e)}, 400
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass  # keep benchmark output readable
+
+        return Handler
+
+
+def _indices(value: Optional[str]) -> Optional[list]:
+    if not value or value == "all":
+        return None
+    return [int(i) for i in value.split(";")]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--graph", default=None, help="OSM XML extract to route on")
+    parser.add_argument(
+        "--center",
+        default="43.6532,-79.3832",
+        help="lat,lng of the synthetic grid when no --graph is given",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.graph:
+        backend = LocalGraphBackend.from_osm(args.graph)
+    else:
+        lat, lng = (float(v) for v in args.center.split(","))
+        backend = LocalGraphBackend.grid(lat, lng, rows=100, cols=100)
+    server = OSRMStandIn(backend, args.host, args.port)
+    print(f"🚶 OSRM stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
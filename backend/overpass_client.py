@@ -2,26 +2,65 @@
 Overpass API client to fetch POIs from OpenStreetMap
 """
 
+import os
 import time
 from typing import Any, Dict, List, Optional
 
-import requests
+import metrics
+import tracing
+from candidate_selector import CandidateSelector
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import InstrumentedSession
+from request_policy import RequestPolicy
+from single_flight import SingleFlight
 
 
 class OverpassClient:
     """Client for Overpass API to fetch POIs"""
 
     OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+    # Public mirror asked when the main instance is slow (hedged requests)
+    OVERPASS_MIRROR_URL = "https://overpass.kumi.systems/api/interpreter"
+    NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+    # Query centers are rounded to ~10 m so that nearby users (a tour group)
+    # send identical queries, which are then coalesced
+    CENTER_DECIMALS = 4
 
     def __init__(self):
-        self.session = requests.Session()
+        # OVERPASS_URL points at a self-hosted instance or a local stand-in
+        self.overpass_url = os.getenv("OVERPASS_URL", self.OVERPASS_URL)
+        self.session = InstrumentedSession()
         # Add headers to avoid rate limiting
         self.session.headers.update(
             {"User-Agent": "EarSightAI/1.0 (https://github.com/your-repo)"}
         )
+        self.candidate_selector = CandidateSelector()
+        # Identical concurrent queries share one upstream call
+        self.overpass_flight = SingleFlight("overpass")
+        self.nominatim_flight = SingleFlight("nominatim")
+        # While an upstream keeps failing, skip it and use the fallbacks
+        self.overpass_breaker = CircuitBreaker("overpass", slow_call_s=10.0)
+        self.nominatim_breaker = CircuitBreaker("nominatim", slow_call_s=3.0)
+        # Queries ask the server for at most 25 s; wait no longer than that,
+        # nor past the request's deadline
+        self.overpass_policy = RequestPolicy(
+            "overpass",
+            [self.overpass_url] + self._mirrors(),
+            timeout_s=float(os.getenv("OVERPASS_TIMEOUT_S", "25")),
+            default_hedge_delay_s=3.0,
+        )
+        self.nominatim_policy = RequestPolicy(
+            "nominatim", [self.NOMINATIM_URL], timeout_s=5.0
+        )
 
     def get_pois(
-        self, lat: float, lng: float, radius_km: float, categories: List[str]
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        categories: List[str],
+        top_k: int = 10,
+        fallback: bool = True,
     ) -> List[Dict[str, Any]]:
         """
         Get POIs from OpenStreetMap using Overpass API
@@ -31,9 +70,17 @@ class OverpassClient:
             lng: Center longitude
             radius_km: Search radius in kilometers
             categories: List of POI categories to search for
+            top_k: Number of candidates kept after dedup and ranking
+            fallback: Return mock POIs when Overpass is unavailable or finds
+                nothing. Without it, errors are raised and an empty result
+                is returned as is.
 
         Returns:
-            List of POI dictionaries
+            List of POI dictionaries, best candidates first
+
+        Raises:
+            CircuitOpenError, requests.RequestException: Only without
+                ``fallback``, when Overpass could not be queried
         """
         pois = []
 
@@ -89,31 +136,39 @@ class OverpassClient:
             "attractions": ["tourism=attraction"],
         }
 
+        if self.overpass_breaker.is_open():
+            if not fallback:
+                raise CircuitOpenError("overpass circuit is open")
+            print("Overpass circuit open, using mock data")
+            return self._get_mock_pois(lat, lng, categories, cap=top_k)
+        if fallback and not self.overpass_policy.can_afford():
+            print("Too close to the request deadline for Overpass, using mock data")
+            metrics.DEADLINE_FALLBACKS.inc(upstream="overpass")
+            return self._get_mock_pois(lat, lng, categories, cap=top_k)
+
         for category in categories:
             if category in category_mapping:
                 tags = category_mapping[category]
                 for tag in tags:
-                    category_pois = self._query_overpass(lat, lng, radius_km, tag)
+                    with tracing.span("overpass.query", tag=tag) as span:
+                        category_pois = self._query_overpass(
+                            lat, lng, radius_km, tag, strict=not fallback
+                        )
+                        span.set(pois=len(category_pois))
                     pois.extend(category_pois)
 
-        # Remove duplicates and limit results
-        unique_pois = []
-        seen_names = set()
-        cap = 10
-        for poi in pois:
-            if poi["name"] not in seen_names and len(unique_pois) < cap:
-                unique_pois.append(poi)
-                seen_names.add(poi["name"])
+        # Drop unnamed elements, merge spatial duplicates and keep the best
+        unique_pois = self.candidate_selector.select(pois, lat, lng, radius_km, top_k)
 
         # If no POIs found, use mock data for testing
-        if not unique_pois:
+        if not unique_pois and fallback:
             print("No POIs found from Overpass API, using mock data for testing")
-            unique_pois = self._get_mock_pois(lat, lng, categories)
+            unique_pois = self._get_mock_pois(lat, lng, categories, cap=top_k)
 
         return unique_pois
 
     def _get_mock_pois(
-        self, lat: float, lng: float, categories: List[str]
+        self, lat: float, lng: float, categories: List[str], cap: int = 10
     ) -> List[Dict[str, Any]]:
         """
         Get mock POIs for testing when Overpass API fails
@@ -122,6 +177,7 @@ class OverpassClient:
             lat: Center latitude
             lng: Center longitude
             categories: List of POI categories
+            cap: Maximum number of POIs to return
 
         Returns:
             List of mock POI dictionaries
@@ -397,10 +453,10 @@ class OverpassClient:
                 unique_mock_pois.append(poi)
                 seen_names.add(poi["name"])
 
-        return unique_mock_pois[:10]  # Cap at 10 POIs
+        return unique_mock_pois[:cap]
 
     def _query_overpass(
-        self, lat: float, lng: float, radius_km: float, tag: str
+        self, lat: float, lng: float, radius_km: float, tag: str, strict: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Query Overpass API for specific tag
@@ -410,12 +466,15 @@ class OverpassClient:
             lng: Center longitude
             radius_km: Search radius in kilometers
             tag: OSM tag to search for (format: "key=value")
+            strict: Raise query errors instead of returning no POIs
 
         Returns:
             List of POI dictionaries
         """
         # Convert radius to meters
         radius_m = radius_km * 1000
+        lat = round(lat, self.CENTER_DECIMALS)
+        lng = round(lng, self.CENTER_DECIMALS)
 
         # Parse the tag into key and value
         if "=" in tag:
@@ -455,10 +514,9 @@ class OverpassClient:
             """
 
         try:
-            response = self.session.get(self.OVERPASS_URL, params={"data": query})
-            response.raise_for_status()
-
-            data = response.json()
+            data = self.overpass_flight.do(
+                query, self.overpass_breaker.call, self._run_query, query
+            )
             pois = []
 
             for element in data.get("elements", []):
@@ -487,6 +545,8 @@ class OverpassClient:
             return pois
 
         except Exception as e:
+            if strict:
+                raise
             print(f"Error querying Overpass API: {e}")
             return []
 
@@ -516,20 +576,13 @@ class OverpassClient:
             if key in location_lower:
                 return coords
 
-        # Try Nominatim with better headers
-        nominatim_url = "https://nominatim.openstreetmap.org/search"
-        params = {"q": location_name, "format": "json", "limit": 1}
-
-        headers = {
-            "User-Agent": "EarSightAI/1.0 (https://github.com/your-repo)",
-            "Accept": "application/json",
-        }
-
+        # Try Nominatim; lookups differing only in case or spacing are coalesced
+        key = " ".join(location_lower.split())
         try:
-            response = self.session.get(nominatim_url, params=params, headers=headers)
-            response.raise_for_status()
-
-            data = response.json()
+            with tracing.span("nominatim.geocode", query=location_name):
+                data = self.nominatim_flight.do(
+                    key, self.nominatim_breaker.call, self._geocode, location_name
+                )
             if data:
                 return {"lat": float(data[0]["lat"]), "lng": float(data[0]["lon"])}
 
@@ -539,6 +592,48 @@ class OverpassClient:
         # Default to Toronto coordinates
         return {"lat": 43.6532, "lng": -79.3832}
 
+    def _geocode(self, location_name: str) -> Any:
+        """Raw Nominatim search results for a location name"""
+        params = {"q": location_name, "format": "json", "limit": 1}
+        headers = {
+            "User-Agent": "EarSightAI/1.0 (https://github.com/your-repo)",
+            "Accept": "application/json",
+        }
+        return self.nominatim_policy.call(
+            lambda url, timeout: self._get_json(url, params, timeout, headers)
+        )
+
+    def _run_query(self, query: str) -> Dict[str, Any]:
+        """Run an Overpass query (hedged across mirrors) and decode the response"""
+        return self.overpass_policy.call(
+            lambda url, timeout: self._get_json(url, {"data": query}, timeout)
+        )
+
+    def _get_json(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        timeout: float,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        response = self.session.get(
+            url, params=params, headers=headers, timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _mirrors(self) -> List[str]:
+        """
+        Overpass mirrors for hedged requests: OVERPASS_MIRRORS (comma
+        separated), or the public mirror when using the public instance
+        """
+        mirrors = os.getenv("OVERPASS_MIRRORS")
+        if mirrors is not None:
+            return [url.strip() for url in mirrors.split(",") if url.strip()]
+        if self.overpass_url == self.OVERPASS_URL:
+            return [self.OVERPASS_MIRROR_URL]
+        return []
+
     def geocode_locations(self, location_names: List[str]) -> List[Dict[str, float]]:
         """
         Geocode a list of location names to coordinates using Nominatim or mappings
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Offline job that warms the persistent script store for the top POIs per city
+
+Usage:
+    python precompute_scripts.py --cities toronto,paris --budget 200
+
+The job is resumable: enumerated POIs are checkpointed to a state file so a
+re-run does not query Overpass again, and POIs that already have a stored
+script are skipped without spending any Gemini quota. Every script is
+committed as soon as it is generated, so the job can be interrupted at any
+time.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+
+from overpass_client import OverpassClient
+from script_generator import ScriptGenerator
+from script_store import ScriptStore
+
+load_dotenv()
+
+# City centers we warm by default (keep in sync with geocode_location mappings)
+CITY_CENTERS = {
+    "toronto": {"lat": 43.6532, "lng": -79.3832},
+    "paris": {"lat": 48.8566, "lng": 2.3522},
+    "london": {"lat": 51.5074, "lng": -0.1278},
+    "new york": {"lat": 40.7128, "lng": -74.0060},
+}
+
+DEFAULT_CATEGORIES = ["monuments", "museums", "parks", "historical", "attractions"]
+
+DEFAULT_STATE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "precompute_state.json"
+)
+
+
+def load_state(path: str) -> dict:
+    """Load the checkpoint file (enumerated POIs per city)"""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"cities": {}}
+
+
+def save_state(path: str, state: dict) -> None:
+    """Atomically write the checkpoint file"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def enumerate_city_pois(
+    overpass_client: OverpassClient,
+    city: str,
+    center: dict,
+    radius_km: float,
+    categories: list,
+    top_n: int,
+    state: dict,
+    state_file: str,
+) -> Optional[list]:
+    """
+    Get the POIs for a city, from the checkpoint if we already enumerated it
+
+    Returns:
+        The city's POIs, or None when Overpass could not be queried or found
+        nothing. Nothing is checkpointed then, so the next run retries; the
+        client's mock POIs are never used.
+    """
+    cached = state["cities"].get(city)
+    if cached is not None:
+        print(f"📂 {city}: {len(cached)} POIs from checkpoint")
+        return cached
+
+    pois = []
+    seen = set()
+    # One query per category so each category gets its own top slots
+    for category in categories:
+        try:
+            category_pois = overpass_client.get_pois(
+                center["lat"],
+                center["lng"],
+                radius_km,
+                [category],
+                top_k=top_n,
+                fallback=False,
+            )
+        except Exception as e:
+            print(f"❌ {city}: Overpass query for {category} failed ({e}), skipping")
+            return None
+        for poi in category_pois:
+            key = ScriptStore.poi_key(poi)
+            if key not in seen:
+                seen.add(key)
+                pois.append(poi)
+
+    if not pois:
+        print(f"⚠️ {city}: Overpass found no POIs, skipping")
+        return None
+
+    state["cities"][city] = pois
+    save_state(state_file, state)
+    print(f"🔍 {city}: enumerated {len(pois)} POIs")
+    return pois
+
+
+def run(args) -> dict:
+    """Run the precomputation job and return a summary"""
+    cities = {}
+    for name in [c.strip().lower() for c in args.cities.split(",") if c.strip()]:
+        if name not in CITY_CENTERS:
+            print(f"⚠️ Unknown city '{name}', skipping")
+            continue
+        cities[name] = CITY_CENTERS[name]
+
+    categories = [c.strip() for c in args.categories.split(",") if c.strip()]
+
+    store = ScriptStore(args.store) if args.store else ScriptStore()
+    overpass_client = OverpassClient()
+    script_generator = ScriptGenerator(script_store=store)
+    state = load_state(args.state_file)
+
+    summary = {
+        "generated": 0,
+        "skipped": 0,
+        "failed": 0,
+        "skipped_cities": [],
+        "budget": args.budget,
+    }
+    start_time = time.time()
+
+    for city, center in cities.items():
+        pois = enumerate_city_pois(
+            overpass_client,
+            city,
+            center,
+            args.radius_km,
+            categories,
+            args.top_n,
+            state,
+            args.state_file,
+        )
+        if pois is None:
+            summary["skipped_cities"].append(city)
+            continue
+
+        for poi in pois:
+            if store.contains(poi):
+                summary["skipped"] += 1
+                continue
+            if summary["generated"] + summary["failed"] >= args.budget:
+                print("💸 Quota budget exhausted, stopping (re-run to resume)")
+                return _finish(summary, start_time)
+
+            script_generator.generate_script(poi)
+            # generate_script only stores real Gemini output, never fallbacks
+            if store.contains(poi):
+                summary["generated"] += 1
+                print(f"✅ {city}: {poi['name']}")
+            else:
+                summary["failed"] += 1
+                print(f"❌ {city}: {poi['name']} (fallback, will retry next run)")
+
+    return _finish(summary, start_time)
+
+
+def _finish(summary: dict, start_time: float) -> dict:
+    summary["elapsed_s"] = round(time.time() - start_time, 1)
+    print(f"📊 Precompute summary: {summary}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--cities",
+        default=",".join(CITY_CENTERS),
+        help="Comma-separated city names (default: all configured)",
+    )
+    parser.add_argument(
+        "--categories",
+        default=",".join(DEFAULT_CATEGORIES),
+        help="Comma-separated POI categories",
+    )
+    parser.add_argument("--radius-km", type=float, default=5.0)
+    parser.add_argument(
+        "--top-n", type=int, default=10, help="Top POIs per category and city"
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=100,
+        help="Maximum number of Gemini calls for this run",
+    )
+    parser.add_argument("--state-file", default=DEFAULT_STATE_FILE)
+    parser.add_argument("--store", default=None, help="Script store SQLite path")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
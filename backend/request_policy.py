@@ -0,0 +1,228 @@
+"""
+Deadlines and hedged requests for the upstream HTTP services
+
+Public Overpass and OSRM servers have long latency tails, so a route request
+used to take as long as its slowest upstream call. Two mechanisms bound it:
+
+- a per-request deadline: ``with deadline(20):`` around a request (see the
+  ``apply_deadline`` middleware in main.py) caps every upstream call made on
+  its behalf, in any thread it hands work to via ``tracing.wrap`` or
+  ``asyncio.to_thread``. Clients ask ``RequestPolicy.can_afford()`` before a
+  stage and take their fallback (mock POIs, haversine distances) when the
+  time left would not cover a typical call.
+- hedging: ``RequestPolicy.call`` sends a request to the first endpoint and,
+  if no answer came within the p95 of recent latencies, the same request to
+  the next mirror; the first success wins. A failed attempt moves on to the
+  next mirror at once.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+import requests
+
+import metrics
+import tracing
+
+# time.monotonic() by which the current request must be answered
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+# Latency samples needed before the p95 replaces the default hedge delay
+MIN_SAMPLES = 20
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline left no time for this upstream call"""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give the block (and work it hands off) ``seconds`` to finish
+
+    A nested deadline never extends the enclosing one; None sets no deadline.
+    """
+    expires_at = _deadline.get()
+    if seconds is not None:
+        own = time.monotonic() + seconds
+        expires_at = own if expires_at is None else min(expires_at, own)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (None without one)"""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+class RequestPolicy:
+    """
+    Deadline-bounded, hedged calls to one upstream served by several mirrors
+
+    Calls are ``fn(endpoint, timeout_s)``; the timeout is the policy's own
+    ``timeout_s`` or the time left before the deadline, whichever is shorter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        endpoints: List[str],
+        timeout_s: float = 10.0,
+        default_hedge_delay_s: float = 1.0,
+        min_hedge_delay_s: float = 0.05,
+        window: int = 200,
+    ):
+        if not endpoints:
+            raise ValueError(f"{name} needs at least one endpoint")
+        self.name = name
+        self.endpoints = list(endpoints)
+        self.timeout_s = timeout_s
+        self.default_hedge_delay_s = default_hedge_delay_s
+        self.min_hedge_delay_s = min_hedge_delay_s
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if len(self.endpoints) > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=4 * len(self.endpoints), thread_name_prefix=name
+            )
+
+    def hedge_delay(self) -> float:
+        """How long to wait for an answer before asking the next mirror"""
+        samples = self._samples()
+        if len(samples) < MIN_SAMPLES:
+            return self.default_hedge_delay_s
+        p95 = samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)]
+        return max(self.min_hedge_delay_s, p95)
+
+    def expected_latency(self) -> float:
+        """Median latency of recent successful calls (0 before any)"""
+        samples = self._samples()
+        return samples[len(samples) // 2] if samples else 0.0
+
+    def can_afford(self) -> bool:
+        """False when the deadline will likely pass before a call answers"""
+        left = remaining()
+        return left is None or left > self.expected_latency()
+
+    def call(self, fn: Callable[[str, float], Any]) -> Any:
+        """
+        Call ``fn`` on the endpoints, hedging slow attempts
+
+        Args:
+            fn: ``fn(endpoint, timeout_s)`` making one attempt
+
+        Returns:
+            The first successful attempt's result
+
+        Raises:
+            DeadlineExceeded: No time was left, or the attempts ran out of
+                the time the deadline left them
+            TimeoutError: No attempt answered within ``timeout_s``
+            Exception: The last attempt's error when every attempt failed
+        """
+        left = remaining()
+        budget = self.timeout_s if left is None else min(self.timeout_s, left)
+        if budget <= 0:
+            raise DeadlineExceeded(f"no time left for {self.name}")
+        limited = left is not None and left < self.timeout_s
+
+        try:
+            if self._executor is None:
+                return self._attempt(fn, self.endpoints[0], budget)
+            return self._hedged(fn, budget)
+        except (requests.Timeout, TimeoutError) as e:
+            # Cut short by our deadline, not a verdict on the upstream
+            if limited:
+                raise DeadlineExceeded(f"{self.name} ran out of time") from e
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        delay_ms = round(self.hedge_delay() * 1000, 1)
+        with self._lock:
+            return {
+                "endpoints": self.endpoints,
+                "hedge_delay_ms": delay_ms,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+    def _hedged(self, fn: Callable[[str, float], Any], budget: float) -> Any:
+        started = time.monotonic()
+        delay = self.hedge_delay()
+        pending: Dict[Any, int] = {}
+        errors: List[Exception] = []
+        next_endpoint = 0
+
+        def launch() -> None:
+            nonlocal next_endpoint
+            endpoint = self.endpoints[next_endpoint]
+            timeout = max(0.001, budget - (time.monotonic() - started))
+            future = self._executor.submit(
+                tracing.wrap(self._attempt), fn, endpoint, timeout
+            )
+            pending[future] = next_endpoint
+            if next_endpoint > 0:
+                with self._lock:
+                    self.hedges += 1
+                metrics.HEDGED_REQUESTS.inc(upstream=self.name)
+            next_endpoint += 1
+
+        launch()
+        while pending:
+            left = budget - (time.monotonic() - started)
+            if left <= 0:
+                break
+            more = next_endpoint < len(self.endpoints)
+            done, _ = wait(
+                pending,
+                timeout=min(delay, left) if more else left,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if index > 0:
+                    with self._lock:
+                        self.hedge_wins += 1
+                # Slower attempts finish in the background; their results
+                # are dropped
+                return result
+            # Nothing answered within the hedge delay, or everything sent so
+            # far failed: ask the next mirror
+            if more and (not done or not pending):
+                launch()
+        if errors:
+            raise errors[-1]
+        raise TimeoutError(f"{self.name} did not answer in {budget:.1f}s")
+
+    def _attempt(
+        self, fn: Callable[[str, float], Any], endpoint: str, timeout: float
+    ) -> Any:
+        started = time.monotonic()
+        result = fn(endpoint, timeout)
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _samples(self) -> List[float]:
+        with self._lock:
+            return sorted(self._latencies)
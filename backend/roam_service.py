@@ -2,8 +2,10 @@
 Simplified Roam service that generates tour summaries
 """
 
+import asyncio
 import time
 
+import metrics
 from models import RoamRequest, RoamResponse
 from roam_summary_generator import RoamSummaryGenerator
 
@@ -14,12 +16,15 @@ class RoamService:
     def __init__(self):
         self.summary_generator = RoamSummaryGenerator()
 
-    async def generate_roam_response(self, request: RoamRequest) -> RoamResponse:
+    async def generate_roam_response(
+        self, request: RoamRequest, context: str = None
+    ) -> RoamResponse:
         """
         Generate a Roam response with tour summary
 
         Args:
             request: RoamRequest with coordinates string
+            context: Preformatted session context (falls back to request.context)
 
         Returns:
             RoamResponse with summary
@@ -27,13 +32,18 @@ class RoamService:
         start_time = time.time()
 
         print(f"📍 Generating tour for coordinates: {request.coordinates}")
-        # Generate tour summary, passing context if available
-        summary = self.summary_generator.generate_tour_summary(
-            request.coordinates, context=request.context
-        )
+        # Generate tour summary, passing context if available. The Gemini call
+        # blocks, so it runs in a worker thread to keep the event loop serving
+        # (and lets identical concurrent calls be coalesced)
+        with metrics.time_stage("roam"):
+            summary = await asyncio.to_thread(
+                self.summary_generator.generate_tour_summary,
+                request.coordinates,
+                context=context if context is not None else request.context,
+            )
 
         # Create response
-        response = RoamResponse(summary=summary)
+        response = RoamResponse(summary=summary, session_id=request.session_id)
 
         # Log performance
         elapsed_time = (time.time() - start_time) * 1000
@@ -41,22 +51,26 @@ class RoamService:
 
         return response
 
-    async def get_roam_with_fallback(self, request: RoamRequest) -> RoamResponse:
+    async def get_roam_with_fallback(
+        self, request: RoamRequest, context: str = None
+    ) -> RoamResponse:
         """
         Get Roam response with fallback handling
 
         Args:
             request: RoamRequest with coordinates string
+            context: Preformatted session context (falls back to request.context)
 
         Returns:
             RoamResponse with summary
         """
         try:
-            return await self.generate_roam_response(request)
+            return await self.generate_roam_response(request, context=context)
         except Exception as e:
             print(f"❌ Error in Roam service: {e}")
 
             # Return fallback response
             return RoamResponse(
-                summary="Welcome to this exciting area! This location offers amazing opportunities for visitors. Take a stroll around and discover local attractions, historical landmarks, and hidden gems."
+                summary="Welcome to this exciting area! This location offers amazing opportunities for visitors. Take a stroll around and discover local attractions, historical landmarks, and hidden gems.",
+                session_id=request.session_id,
             )
@@ -2,22 +2,26 @@
 Simplified Gemini API integration for generating tour summaries
 """
 
-import os
 from typing import Any
 
-import google.generativeai as genai
+from context_store import format_context
+from llm_pool import get_llm_pool
+
+# The summary describes the surrounding area, so the prompt carries the
+# position to ~100 m; users standing together then send identical prompts,
+# which the LLM pool coalesces into one call
+PROMPT_COORDINATE_DECIMALS = 3
 
 
 class RoamSummaryGenerator:
     """Generates AI tour summaries using Gemini API"""
 
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
+        pool = get_llm_pool()
+        if not pool.api_key:
             raise ValueError("GEMINI_API_KEY environment variable is required")
 
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
+        self.model = pool.get_model("gemini-1.5-flash")
 
     def generate_tour_summary(
         self, coordinates: str, context: list[dict] = None
@@ -27,18 +31,14 @@ class RoamSummaryGenerator:
 
         Args:
             coordinates: Coordinate string (e.g., "43.6426, -79.3871")
-            context: Optional chat history for Gemini
+            context: Optional chat history (message list or preformatted session context)
 
         Returns:
             Tour summary string
         """
-        context_str = ""
-        if context:
-            for msg in context:
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                context_str += f"{role.capitalize()}: {content}\n"
-        prompt = f"""{context_str}You are a knowledgeable tour guide. Create an engaging 30-second tour summary for the location at coordinates: {coordinates}
+        context_str = format_context(context)
+        location = _round_coordinates(coordinates)
+        prompt = f"""{context_str}You are a knowledgeable tour guide. Create an engaging 30-second tour summary for the location at coordinates: {location}
 
 Include information about:
 - Historical landmarks and facts
@@ -67,3 +67,13 @@ Do NOT mention the coordinates in your response. Keep the summary around 2-3 sen
             print(f"❌ Gemini API error: {e}")
             print(f"❌ Error type: {type(e).__name__}")
             return "Welcome to this exciting area! This location offers amazing opportunities for visitors. Take a stroll around and discover local attractions, historical landmarks, and hidden gems. Every location has its unique charm and stories waiting to be uncovered!"
+
+
+def _round_coordinates(coordinates: str) -> str:
+    """Round a "lat, lng" string (returned unchanged if it does not parse)"""
+    try:
+        lat, lng = (float(part) for part in coordinates.split(","))
+    except ValueError:
+        return coordinates
+    digits = PROMPT_COORDINATE_DECIMALS
+    return f"{lat:.{digits}f}, {lng:.{digits}f}"
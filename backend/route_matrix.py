@@ -0,0 +1,135 @@
+"""
+Compact distance/duration matrix shared by the routing pipeline
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class RouteMatrix:
+    """
+    Distance (km) and duration (minutes) matrices as contiguous float32 arrays
+
+    Built straight from OSRM table JSON with vectorized unit conversion;
+    cells OSRM could not answer are NaN until filled. Solvers read the arrays
+    directly and serializers call ``to_dict``.
+    """
+
+    def __init__(self, distances: np.ndarray, durations: np.ndarray):
+        self.distances = np.ascontiguousarray(distances, dtype=np.float32)
+        self.durations = np.ascontiguousarray(durations, dtype=np.float32)
+        if self.distances.shape != self.durations.shape:
+            raise ValueError("Distance and duration matrices must have the same shape")
+
+    @classmethod
+    def empty(cls, size: int) -> "RouteMatrix":
+        """All-missing matrix to be filled block by block"""
+        return cls(
+            np.full((size, size), np.nan, dtype=np.float32),
+            np.full((size, size), np.nan, dtype=np.float32),
+        )
+
+    @classmethod
+    def from_osrm(
+        cls, data: Dict[str, Any], duration_scale: float = 1.0
+    ) -> "RouteMatrix":
+        """
+        Build a matrix from an OSRM table response
+
+        Args:
+            data: OSRM table JSON with "distances" (m) and "durations" (s)
+            duration_scale: Multiplier applied to durations after conversion
+
+        Returns:
+            RouteMatrix in km and minutes, NaN where OSRM returned None
+        """
+        # dtype=float turns None cells into NaN in a single C-level pass
+        distances = np.array(data["distances"], dtype=np.float32) / 1000
+        durations = np.array(data["durations"], dtype=np.float32) * (
+            duration_scale / 60
+        )
+        return cls(distances, durations)
+
+    def __len__(self) -> int:
+        return self.distances.shape[0]
+
+    @property
+    def size(self) -> int:
+        return self.distances.shape[0]
+
+    def set_block(self, rows: slice, cols: slice, block: "RouteMatrix") -> None:
+        """Copy a sub-matrix (e.g. one chunked OSRM request) into place"""
+        self.distances[rows, cols] = block.distances
+        self.durations[rows, cols] = block.durations
+
+    def expanded(self, extra: int = 1) -> "RouteMatrix":
+        """Copy with ``extra`` new (missing) rows and columns appended"""
+        matrix = RouteMatrix.empty(self.size + extra)
+        matrix.set_block(slice(0, self.size), slice(0, self.size), self)
+        return matrix
+
+    def missing_mask(self) -> np.ndarray:
+        """Boolean mask of cells with no distance or no duration"""
+        return np.isnan(self.distances) | np.isnan(self.durations)
+
+    def fill_missing(
+        self, fallback_distances: np.ndarray, speed_kmh: float = 5.0
+    ) -> int:
+        """
+        Fill missing cells from a fallback distance matrix
+
+        Args:
+            fallback_distances: (N, N) distances in km (e.g. haversine)
+            speed_kmh: Walking speed used to derive fallback durations
+
+        Returns:
+            Number of cells filled
+        """
+        missing_distance = np.isnan(self.distances)
+        missing_duration = np.isnan(self.durations)
+        self.distances[missing_distance] = fallback_distances[missing_distance]
+        self.durations[missing_duration] = (
+            fallback_distances[missing_duration] / speed_kmh * 60
+        )
+        return int((missing_distance | missing_duration).sum())
+
+    def distance(self, i: int, j: int) -> float:
+        return float(self.distances[i, j])
+
+    def duration(self, i: int, j: int) -> float:
+        return float(self.durations[i, j])
+
+    def route_distance(self, route: Sequence[int]) -> float:
+        """Total distance (km) along a route of node indices"""
+        if len(route) < 2:
+            return 0.0
+        idx = np.asarray(route)
+        return float(self.distances[idx[:-1], idx[1:]].sum(dtype=np.float64))
+
+    def submatrix(self, indices: Sequence[int]) -> "RouteMatrix":
+        """Matrix restricted to the given nodes, in the given order"""
+        idx = np.asarray(indices)
+        return RouteMatrix(
+            self.distances[np.ix_(idx, idx)], self.durations[np.ix_(idx, idx)]
+        )
+
+    def to_dict(self, decimals: Optional[int] = 4) -> Dict[str, List[List[float]]]:
+        """
+        Serialize for JSON responses
+
+        Args:
+            decimals: Rounding applied before conversion (None keeps full precision)
+
+        Returns:
+            Dict with 'distance_matrix' and 'duration_matrix' nested lists
+        """
+        distances = self.distances.astype(np.float64)
+        durations = self.durations.astype(np.float64)
+        if decimals is not None:
+            distances = np.round(distances, decimals)
+            durations = np.round(durations, decimals)
+        return {
+            "distance_matrix": distances.tolist(),
+            "duration_matrix": durations.tolist(),
+        }
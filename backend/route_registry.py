@@ -0,0 +1,151 @@
+"""
+In-memory registry of generated routes, kept for incremental re-optimization
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from route_matrix import RouteMatrix
+
+
+class RouteRegistry:
+    """
+    Recently generated routes by id
+
+    A route keeps everything needed to re-solve it without re-running the
+    pipeline: the matrix points and their RouteMatrix, the node details
+    (POI name, category and script once generated) and the current order.
+    Entries expire after ``ttl_seconds`` and at most ``max_routes`` are kept.
+
+    A route id names one route: ``put`` refuses an id that is already
+    registered, and changing a route in place goes through ``replace``, which
+    calls ``on_replace(route_id)`` so indexes built from the old record (the
+    tour reuse index) can drop it.
+    """
+
+    def __init__(
+        self,
+        max_routes: int = 1000,
+        ttl_seconds: int = 6 * 3600,
+        on_replace: Optional[Callable[[str], None]] = None,
+    ):
+        self._routes = TTLCache(maxsize=max_routes, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+        self.on_replace = on_replace
+        self.hits = 0
+        self.misses = 0
+
+    def put(
+        self,
+        route_id: str,
+        points: List[Tuple[float, float]],
+        nodes: List[Dict[str, Any]],
+        matrix: RouteMatrix,
+        order: List[int],
+        max_distance_km: float,
+    ) -> Dict[str, Any]:
+        """
+        Register a new route
+
+        Args:
+            route_id: Route id returned to the client
+            points: (lat, lng) per matrix node
+            nodes: Node details per matrix node (name, lat, lng, category, script)
+            matrix: RouteMatrix over points
+            order: Visiting order as node indices
+            max_distance_km: Distance budget of the route
+
+        Returns:
+            The registered route record
+
+        Raises:
+            ValueError: If a route is already registered under ``route_id``
+        """
+        route = self._record(route_id, points, nodes, matrix, order, max_distance_km)
+        with self._lock:
+            if route_id in self._routes:
+                raise ValueError(f"Route {route_id} is already registered")
+            self._routes[route_id] = route
+        return route
+
+    def replace(
+        self,
+        route_id: str,
+        points: List[Tuple[float, float]],
+        nodes: List[Dict[str, Any]],
+        matrix: RouteMatrix,
+        order: List[int],
+        max_distance_km: float,
+    ) -> Dict[str, Any]:
+        """
+        Register a route over whatever is registered under its id
+
+        Same arguments as ``put``. ``on_replace`` is called with the id first,
+        so nothing derived from the previous record outlives it.
+
+        Returns:
+            The registered route record
+        """
+        route = self._record(route_id, points, nodes, matrix, order, max_distance_km)
+        if self.on_replace is not None:
+            self.on_replace(route_id)
+        with self._lock:
+            self._routes[route_id] = route
+        return route
+
+    def restore(self, **record: Any) -> Dict[str, Any]:
+        """
+        Register a route loaded from the persistent store, unless it is live
+
+        A live record is the same route, with any scripts generated since it
+        was saved, so it is kept (and returned) rather than overwritten.
+
+        Args:
+            **record: The stored route record (``put`` arguments)
+
+        Returns:
+            The registered route record
+        """
+        route = self._record(**record)
+        with self._lock:
+            return self._routes.setdefault(record["route_id"], route)
+
+    def get(self, route_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a route by id (None if unknown or expired)"""
+        with self._lock:
+            route = self._routes.get(route_id)
+            if route is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return route
+
+    @staticmethod
+    def _record(
+        route_id: str,
+        points: List[Tuple[float, float]],
+        nodes: List[Dict[str, Any]],
+        matrix: RouteMatrix,
+        order: List[int],
+        max_distance_km: float,
+    ) -> Dict[str, Any]:
+        return {
+            "route_id": route_id,
+            "points": list(points),
+            "nodes": nodes,
+            "matrix": matrix,
+            "order": list(order),
+            "max_distance_km": max_distance_km,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get registry statistics"""
+        with self._lock:
+            return {
+                "routes": len(self._routes),
+                "max_routes": self._routes.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
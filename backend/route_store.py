@@ -0,0 +1,243 @@
+"""
+Persistent route store on MongoDB (async, with geospatial and TTL indexes)
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from bson.binary import Binary
+
+from route_matrix import RouteMatrix
+
+DEFAULT_TTL_DAYS = 30
+
+
+class RouteStore:
+    """
+    Generated tours in the ``tours`` collection, keyed by route id
+
+    Each document holds what is needed to serve the tour again (the response
+    body without the matrices), to re-optimize it (matrix points, nodes with
+    their scripts, order, and the matrices as packed float32 binaries) and to
+    find it again by location:
+
+    - ``start`` (Point) and ``waypoints`` (MultiPoint) have 2dsphere indexes
+    - ``expires_at`` has a TTL index, so Mongo drops old tours by itself
+
+    All access goes through PyMongo's native asyncio client, so request
+    handlers never block the event loop on the database.
+    """
+
+    def __init__(self, collection, ttl_days: Optional[float] = None):
+        """
+        Args:
+            collection: Async collection (pymongo AsyncMongoClient)
+            ttl_days: How long a tour is kept after it was last saved
+                (ROUTE_STORE_TTL_DAYS, 30 by default)
+        """
+        if ttl_days is None:
+            ttl_days = float(os.getenv("ROUTE_STORE_TTL_DAYS", DEFAULT_TTL_DAYS))
+        self.collection = collection
+        self.ttl = timedelta(days=ttl_days)
+        self._indexes_ready = False
+        self.saves = 0
+        self.loads = 0
+        self.errors = 0
+
+    async def ensure_indexes(self) -> None:
+        """Create the geospatial and TTL indexes (idempotent)"""
+        if self._indexes_ready:
+            return
+        # Compound with preferences: the nearby-tour lookup filters on both
+        await self.collection.create_index(
+            [("start", "2dsphere"), ("metadata.preferences", 1)]
+        )
+        await self.collection.create_index([("waypoints", "2dsphere")])
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self._indexes_ready = True
+        print("🗄️ Route store indexes ready")
+
+    async def save(
+        self,
+        route: Dict[str, Any],
+        response: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Upsert a route (errors are logged, never raised: persistence is best effort)
+
+        Args:
+            route: Registry record (route_id, points, nodes, matrix, order, ...)
+            response: Response body served for the route
+            metadata: Request attributes worth querying on (preferences, ...)
+        """
+        try:
+            await self.ensure_indexes()
+            document = self.to_document(route, response, metadata, ttl=self.ttl)
+            await self.collection.replace_one(
+                {"_id": document["_id"]}, document, upsert=True
+            )
+            self.saves += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Failed to persist route {route.get('route_id')}: {e}")
+
+    async def get(self, route_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a stored route
+
+        Returns:
+            Dict with "route" (registry record) and "response", or None
+        """
+        try:
+            document = await self.collection.find_one({"_id": route_id})
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Failed to load route {route_id}: {e}")
+            return None
+        if document is None:
+            return None
+        self.loads += 1
+        return self.from_document(document)
+
+    async def find_nearby(
+        self,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        preferences: List[str],
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        Reusable tours starting near a point with at least one shared preference
+
+        Returns:
+            TourMatcher entries (route_id, lat, lng, preferences, budgets),
+            nearest first
+        """
+        query = {
+            "start": {
+                "$nearSphere": {
+                    "$geometry": {"type": "Point", "coordinates": [lng, lat]},
+                    "$maxDistance": radius_m,
+                }
+            },
+            "metadata.reusable": True,
+            "metadata.preferences": {"$in": [p.lower() for p in preferences]},
+        }
+        projection = {"start": 1, "metadata": 1, "response.total_distance_km": 1}
+        try:
+            await self.ensure_indexes()
+            cursor = self.collection.find(query, projection).limit(limit)
+            documents = await cursor.to_list(length=limit)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Nearby tour lookup failed: {e}")
+            return []
+        return [
+            {
+                "route_id": document["_id"],
+                "lat": document["start"]["coordinates"][1],
+                "lng": document["start"]["coordinates"][0],
+                "preferences": document["metadata"].get("preferences", []),
+                "max_distance_km": document["metadata"].get("max_distance_km", 0.0),
+                "total_distance_km": document.get("response", {}).get(
+                    "total_distance_km"
+                ),
+            }
+            for document in documents
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics"""
+        return {
+            "saves": self.saves,
+            "loads": self.loads,
+            "errors": self.errors,
+            "ttl_days": self.ttl.total_seconds() / 86400,
+        }
+
+    @staticmethod
+    def to_document(
+        route: Dict[str, Any],
+        response: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+        ttl: timedelta = timedelta(days=DEFAULT_TTL_DAYS),
+    ) -> Dict[str, Any]:
+        """Build the Mongo document for a route"""
+        matrix: RouteMatrix = route["matrix"]
+        points = route["points"]
+        order = route["order"]
+        now = datetime.now(timezone.utc)
+        start = points[order[0]]
+        return {
+            "_id": route["route_id"],
+            "start": {"type": "Point", "coordinates": [start[1], start[0]]},
+            "waypoints": {
+                "type": "MultiPoint",
+                "coordinates": [[points[i][1], points[i][0]] for i in order],
+            },
+            "points": [list(point) for point in points],
+            "nodes": route["nodes"],
+            "order": list(order),
+            "max_distance_km": route["max_distance_km"],
+            "matrix": {
+                "size": matrix.size,
+                "distances": Binary(matrix.distances.tobytes()),
+                "durations": Binary(matrix.durations.tobytes()),
+            },
+            "response": {
+                key: value
+                for key, value in response.items()
+                if key not in ("distance_matrix", "duration_matrix", "session_id")
+            },
+            "metadata": metadata or {},
+            "created_at": now,
+            "expires_at": now + ttl,
+        }
+
+    @staticmethod
+    def from_document(document: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuild the registry record and response from a Mongo document"""
+        size = document["matrix"]["size"]
+
+        def unpack(data: bytes) -> np.ndarray:
+            # frombuffer is read-only over the BSON bytes; the matrix owns a copy
+            return np.frombuffer(data, dtype=np.float32).reshape(size, size).copy()
+
+        matrix = RouteMatrix(
+            unpack(document["matrix"]["distances"]),
+            unpack(document["matrix"]["durations"]),
+        )
+        route = {
+            "route_id": document["_id"],
+            "points": [tuple(point) for point in document["points"]],
+            "nodes": document["nodes"],
+            "matrix": matrix,
+            "order": document["order"],
+            "max_distance_km": document["max_distance_km"],
+        }
+        return {
+            "route": route,
+            "response": document.get("response", {}),
+            "metadata": document.get("metadata", {}),
+        }
+
+
+def create_route_store() -> Optional[RouteStore]:
+    """RouteStore on MONGO_URI, or None when Mongo is not configured or unreachable"""
+    try:
+        from database import get_async_database
+
+        database = get_async_database()
+    except Exception as e:
+        # e.g. an SRV URI that does not resolve; the API works without the store
+        print(f"⚠️ Route store disabled, could not set up MongoDB: {e}")
+        return None
+    if database is None:
+        print("ℹ️ MONGO_URI not set, routes are kept in memory only")
+        return None
+    return RouteStore(database["tours"])
+
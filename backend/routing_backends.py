@@ -0,0 +1,487 @@
+"""
+Pluggable routing backends behind OSRMClient
+
+All backends answer in the shape of the OSRM HTTP API (``table`` and
+``route`` services), so the client parses one format whichever backend is
+configured:
+
+- ``public``: the OSRM demo server (no SLA, car profile only)
+- ``osrm``: a self-hosted OSRM server at OSRM_BASE_URL
+- ``local``: an in-process router over a local OSM walking network
+"""
+
+import heapq
+import math
+import os
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import request_policy
+from metrics import InstrumentedSession
+from request_policy import RequestPolicy
+from single_flight import SingleFlight
+
+PUBLIC_OSRM_URL = "https://router.project-osrm.org"
+
+WALKING_SPEED_MPS = 5 / 3.6  # 5 km/h, same pace as the haversine fallbacks
+
+EARTH_RADIUS_M = 6_371_000.0
+
+# OSM highway values a pedestrian can use
+WALKABLE_HIGHWAYS = {
+    "footway",
+    "pedestrian",
+    "path",
+    "steps",
+    "living_street",
+    "residential",
+    "service",
+    "unclassified",
+    "tertiary",
+    "tertiary_link",
+    "secondary",
+    "secondary_link",
+    "primary",
+    "primary_link",
+    "track",
+    "cycleway",
+    "corridor",
+}
+
+
+class RoutingBackend:
+    """
+    Interface for routing backends
+
+    Coordinates are (lat, lng) tuples like everywhere else in the backend;
+    responses are OSRM JSON with distances in meters and durations in seconds.
+    """
+
+    name = "base"
+    # Multiplier OSRMClient applies to table durations
+    duration_scale = 1.0
+
+    def table(
+        self,
+        points: Sequence[Tuple[float, float]],
+        sources: Optional[Sequence[int]] = None,
+        destinations: Optional[Sequence[int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Distance/duration table (OSRM ``table`` service)
+
+        Args:
+            points: (lat, lng) coordinates
+            sources: Indices of the rows (all points when None)
+            destinations: Indices of the columns (all points when None)
+
+        Returns:
+            OSRM table JSON with "distances" and "durations"
+        """
+        raise NotImplementedError
+
+    def route(
+        self, points: Sequence[Tuple[float, float]], steps: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Route through the points in order (OSRM ``route`` service)
+
+        Args:
+            points: (lat, lng) waypoints
+            steps: Include per-leg step geometries
+
+        Returns:
+            OSRM route JSON with one route, its legs and a GeoJSON geometry
+        """
+        raise NotImplementedError
+
+    def can_afford(self) -> bool:
+        """
+        Whether a call would likely answer before the request's deadline
+        (callers use their fallback otherwise)
+        """
+        left = request_policy.remaining()
+        return left is None or left > 0
+
+
+class OSRMHTTPBackend(RoutingBackend):
+    """
+    OSRM server reached over HTTP (the public demo server or a self-hosted one)
+
+    ``mirrors`` are base URLs of servers with the same profile and data;
+    requests slower than the recent p95 are repeated there (see
+    request_policy.py).
+    """
+
+    def __init__(
+        self,
+        base_url: str = PUBLIC_OSRM_URL,
+        profile: str = "foot",
+        duration_scale: float = 1.0,
+        name: str = "osrm",
+        mirrors: Sequence[str] = (),
+        timeout_s: float = 10.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.profile = profile
+        self.duration_scale = duration_scale
+        self.name = name
+        self.session = InstrumentedSession()
+        # Identical concurrent requests (same URL and parameters) share one call
+        self.flight = SingleFlight(name)
+        self.policy = RequestPolicy(
+            name,
+            [self.base_url] + [url.rstrip("/") for url in mirrors],
+            timeout_s=timeout_s,
+        )
+
+    def table(self, points, sources=None, destinations=None):
+        params = {"annotations": "distance,duration"}
+        if sources is not None:
+            params["sources"] = ";".join(str(i) for i in sources)
+        if destinations is not None:
+            params["destinations"] = ";".join(str(j) for j in destinations)
+        return self._get("table", points, params)
+
+    def route(self, points, steps=False):
+        params = {"overview": "full", "geometries": "geojson"}
+        if steps:
+            # Leg geometries come from the steps; the overview would duplicate them
+            params.update({"overview": "false", "steps": "true"})
+        return self._get("route", points, params)
+
+    def _get(
+        self, service: str, points: Sequence[Tuple[float, float]], params: dict
+    ) -> Dict[str, Any]:
+        coords = ";".join(f"{lng},{lat}" for lat, lng in points)
+        path = f"/{service}/v1/{self.profile}/{coords}"
+        key = (path, tuple(sorted(params.items())))
+        return self.flight.do(key, self.policy.call, self._fetcher(path, params))
+
+    def can_afford(self) -> bool:
+        return self.policy.can_afford()
+
+    def _fetcher(self, path: str, params: dict):
+        """One attempt against a given server, as RequestPolicy expects"""
+
+        def fetch(base_url: str, timeout: float) -> Dict[str, Any]:
+            response = self.session.get(base_url + path, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+        return fetch
+
+
+class LocalGraphBackend(RoutingBackend):
+    """
+    In-process router over a walking network
+
+    Tables run one Dijkstra per source that stops once every destination is
+    settled. Point-to-point routes use A* with ALT landmark bounds (distances
+    to a few far-apart landmarks, precomputed on first use), which prunes far
+    more of the graph than the straight-line bound alone.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        coords: Sequence[Tuple[float, float]],
+        edges: Sequence[Tuple[int, int, float]],
+        num_landmarks: int = 8,
+    ):
+        """
+        Args:
+            coords: (lat, lng) per node
+            edges: Undirected (u, v, length_m) edges
+            num_landmarks: Landmarks used for the A* bounds
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self._adj: List[List[Tuple[int, float]]] = [[] for _ in range(len(self.coords))]
+        for u, v, length in edges:
+            self._adj[u].append((v, length))
+            self._adj[v].append((u, length))
+        self.num_landmarks = min(num_landmarks, len(self.coords))
+        self._landmark_dist: Optional[List[List[float]]] = None
+        self._rad = np.radians(self.coords)
+
+    @classmethod
+    def from_osm(cls, path: str, **kwargs) -> "LocalGraphBackend":
+        """
+        Build the walking network from an OSM XML extract
+
+        Args:
+            path: .osm file (e.g. exported from openstreetmap.org or osmium)
+
+        Returns:
+            LocalGraphBackend over the walkable ways
+        """
+        node_coords: Dict[str, Tuple[float, float]] = {}
+        ways: List[List[str]] = []
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "node":
+                node_coords[elem.get("id")] = (
+                    float(elem.get("lat")),
+                    float(elem.get("lon")),
+                )
+                elem.clear()
+            elif elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+                if (
+                    tags.get("highway") in WALKABLE_HIGHWAYS
+                    and tags.get("foot") != "no"
+                ):
+                    ways.append([nd.get("ref") for nd in elem.findall("nd")])
+                elem.clear()
+
+        index: Dict[str, int] = {}
+        coords: List[Tuple[float, float]] = []
+        edges: List[Tuple[int, int, float]] = []
+        for refs in ways:
+            refs = [ref for ref in refs if ref in node_coords]
+            for a, b in zip(refs, refs[1:]):
+                for ref in (a, b):
+                    if ref not in index:
+                        index[ref] = len(coords)
+                        coords.append(node_coords[ref])
+                edges.append(
+                    (index[a], index[b], _haversine_m(node_coords[a], node_coords[b]))
+                )
+
+        print(f"🗺️ Loaded walking graph: {len(coords)} nodes, {len(edges)} edges")
+        return cls(coords, edges, **kwargs)
+
+    @classmethod
+    def grid(
+        cls,
+        lat: float,
+        lng: float,
+        rows: int = 40,
+        cols: int = 40,
+        spacing_m: float = 100.0,
+        **kwargs,
+    ) -> "LocalGraphBackend":
+        """Synthetic street grid centred on (lat, lng), for tests and benchmarks"""
+        dlat = math.degrees(spacing_m / EARTH_RADIUS_M)
+        dlng = dlat / math.cos(math.radians(lat))
+        coords = [
+            (lat + (r - rows / 2) * dlat, lng + (c - cols / 2) * dlng)
+            for r in range(rows)
+            for c in range(cols)
+        ]
+        edges = []
+        for r in range(rows):
+            for c in range(cols):
+                node = r * cols + c
+                if c + 1 < cols:
+                    edges.append(
+                        (node, node + 1, _haversine_m(coords[node], coords[node + 1]))
+                    )
+                if r + 1 < rows:
+                    edges.append(
+                        (
+                            node,
+                            node + cols,
+                            _haversine_m(coords[node], coords[node + cols]),
+                        )
+                    )
+        return cls(coords, edges, **kwargs)
+
+    def snap(self, point: Tuple[float, float]) -> int:
+        """Nearest graph node to a (lat, lng) point"""
+        lat, lng = np.radians(point)
+        x = (self._rad[:, 1] - lng) * np.cos(lat)
+        y = self._rad[:, 0] - lat
+        return int(np.argmin(x * x + y * y))
+
+    def table(self, points, sources=None, destinations=None):
+        nodes = [self.snap(p) for p in points]
+        sources = range(len(points)) if sources is None else sources
+        destinations = range(len(points)) if destinations is None else destinations
+        targets = {nodes[j] for j in destinations}
+
+        distances = []
+        for i in sources:
+            dist, _ = self._dijkstra(nodes[i], targets)
+            distances.append(
+                [dist.get(nodes[j]) for j in destinations]  # None if unreachable
+            )
+        durations = [
+            [None if d is None else d / WALKING_SPEED_MPS for d in row]
+            for row in distances
+        ]
+        return {"code": "Ok", "distances": distances, "durations": durations}
+
+    def route(self, points, steps=False):
+        nodes = [self.snap(p) for p in points]
+        legs = []
+        geometry: List[List[float]] = []
+        for a, b in zip(nodes, nodes[1:]):
+            path = self._astar(a, b)
+            if path is None:
+                return {"code": "NoRoute", "message": "No walking route found"}
+            distance, node_path = path
+            leg_geometry = [[self.coords[n][1], self.coords[n][0]] for n in node_path]
+            if len(leg_geometry) == 1:
+                leg_geometry.append(leg_geometry[0])
+            leg = {
+                "distance": distance,
+                "duration": distance / WALKING_SPEED_MPS,
+                "steps": [],
+            }
+            if steps:
+                leg["steps"] = [
+                    {
+                        "distance": leg["distance"],
+                        "duration": leg["duration"],
+                        "geometry": {"type": "LineString", "coordinates": leg_geometry},
+                    }
+                ]
+            legs.append(leg)
+            geometry.extend(leg_geometry[1:] if geometry else leg_geometry)
+
+        route = {
+            "distance": sum(leg["distance"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "legs": legs,
+        }
+        if not steps:
+            route["geometry"] = {"type": "LineString", "coordinates": geometry}
+        return {"code": "Ok", "routes": [route]}
+
+    def _dijkstra(
+        self, source: int, targets: Optional[set] = None
+    ) -> Tuple[Dict[int, float], Dict[int, int]]:
+        """Shortest distances from source (stops early once all targets settle)"""
+        dist = {source: 0.0}
+        prev: Dict[int, int] = {}
+        remaining = set(targets) if targets else None
+        settled = set()
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            for v, w in self._adj[u]:
+                nd = d + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    prev[v] = u
+                    heapq.heappush(heap, (nd, v))
+        if targets is not None:
+            dist = {node: dist[node] for node in settled}
+        return dist, prev
+
+    def _astar(self, source: int, target: int) -> Optional[Tuple[float, List[int]]]:
+        """A* with ALT bounds; returns (distance_m, node path) or None"""
+        if source == target:
+            return 0.0, [source]
+        landmarks = self._landmarks()
+        to_target = [row[target] for row in landmarks]
+        target_coord = self.coords[target]
+
+        def heuristic(v: int) -> float:
+            bound = _haversine_m(self.coords[v], target_coord)
+            for row, lt in zip(landmarks, to_target):
+                lv = row[v]
+                if lv == math.inf and lt == math.inf:
+                    continue
+                bound = max(bound, abs(lt - lv))
+            return bound
+
+        dist = {source: 0.0}
+        prev: Dict[int, int] = {}
+        settled = set()
+        heap = [(heuristic(source), source)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            if u == target:
+                path = [u]
+                while path[-1] != source:
+                    path.append(prev[path[-1]])
+                return dist[u], path[::-1]
+            settled.add(u)
+            for v, w in self._adj[u]:
+                nd = dist[u] + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    prev[v] = u
+                    f = nd + heuristic(v)
+                    if f < math.inf:
+                        heapq.heappush(heap, (f, v))
+        return None
+
+    def _landmarks(self) -> List[List[float]]:
+        """Distances from each landmark to every node (farthest-point selection)"""
+        if self._landmark_dist is None:
+            n = len(self.coords)
+            rows: List[List[float]] = []
+            landmark = 0
+            closest = [math.inf] * n
+            for _ in range(self.num_landmarks):
+                dist, _ = self._dijkstra(landmark)
+                row = [dist.get(v, math.inf) for v in range(n)]
+                rows.append(row)
+                # Next landmark: the reachable node farthest from all chosen ones
+                closest = [min(c, d) for c, d in zip(closest, row)]
+                finite = [(d, v) for v, d in enumerate(closest) if d < math.inf]
+                landmark = max(finite)[1] if finite else landmark
+            self._landmark_dist = rows
+        return self._landmark_dist
+
+
+def get_routing_backend(name: Optional[str] = None) -> RoutingBackend:
+    """
+    Create the routing backend selected by ROUTING_BACKEND
+
+    Args:
+        name: "public" (default), "osrm" (self-hosted, OSRM_BASE_URL) or
+            "local" (OSM_GRAPH_PATH); overrides the environment variable
+
+    Returns:
+        RoutingBackend instance
+    """
+    name = (name or os.getenv("ROUTING_BACKEND", "public")).lower()
+    profile = os.getenv("OSRM_PROFILE", "foot")
+
+    if name == "public":
+        # The demo server only routes cars; scale its durations to walking pace
+        return OSRMHTTPBackend(
+            PUBLIC_OSRM_URL, profile=profile, duration_scale=7, name="public"
+        )
+    if name == "osrm":
+        base_url = os.getenv("OSRM_BASE_URL")
+        if not base_url:
+            raise ValueError("ROUTING_BACKEND=osrm requires OSRM_BASE_URL")
+        mirrors = os.getenv("OSRM_MIRRORS", "")
+        return OSRMHTTPBackend(
+            base_url,
+            profile=profile,
+            duration_scale=float(os.getenv("OSRM_DURATION_SCALE", "1")),
+            mirrors=[url.strip() for url in mirrors.split(",") if url.strip()],
+        )
+    if name == "local":
+        graph_path = os.getenv("OSM_GRAPH_PATH")
+        if not graph_path:
+            raise ValueError("ROUTING_BACKEND=local requires OSM_GRAPH_PATH")
+        return LocalGraphBackend.from_osm(graph_path)
+    raise ValueError(f"Unknown routing backend: {name}")
+
+
+def _haversine_m(a: Sequence[float], b: Sequence[float]) -> float:
+    lat1, lng1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lng2 = math.radians(b[0]), math.radians(b[1])
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(h, 1.0)))
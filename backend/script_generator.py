@@ -2,26 +2,35 @@
 Script generator using Gemini API for location-specific narratives
 """
 
-import os
 import random
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional
 
-import google.generativeai as genai
+import request_policy
+from context_store import format_context
+from llm_pool import get_llm_pool
+from script_store import ScriptStore
+from shared_state import MemorySharedState, RateLimiter
 
 
 class ScriptGenerator:
     """Generate scripts for POIs using Gemini API"""
 
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    def __init__(
+        self,
+        script_store: Optional[ScriptStore] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        # Shared, lazily-initialized model from the LLM pool
+        self.model = get_llm_pool().get_model("gemini-2.0-flash")
 
-        # Initialize model
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        # Persistent scripts (precomputed or previously generated)
+        self.script_store = script_store or ScriptStore()
 
-        # Rate limiting
-        self.last_request_time = 0
+        # Rate limiting, shared by every worker when given a shared limiter
+        self.rate_limiter = rate_limiter or RateLimiter(
+            MemorySharedState(), "gemini-scripts"
+        )
         self.min_request_interval = (
             4.0  # Minimum 4 seconds between requests (15 req/min = 4 sec/req)
         )
@@ -32,29 +41,23 @@ class ScriptGenerator:
 
         Args:
             poi: POI dictionary with name, category, tags, etc.
-            context: Optional chat history for Gemini
+            context: Optional chat history (message list or preformatted session context)
 
         Returns:
             Generated script string
         """
-        # Rate limiting: ensure minimum interval between requests
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            print(f"Rate limiting: waiting {sleep_time:.1f} seconds...")
-            time.sleep(sleep_time)
+        stored = self.script_store.get(poi)
+        if stored:
+            return stored
+        if self.model.circuit_open():
+            # Gemini keeps failing: don't queue behind the rate limit for it
+            return self._generate_fallback_script(poi)
 
-        # Update last request time
-        self.last_request_time = time.time()
+        if not self._wait_for_rate_limit():
+            return self._generate_fallback_script(poi)
 
         # Format context as chat transcript if provided
-        context_str = ""
-        if context:
-            for msg in context:
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                context_str += f"{role.capitalize()}: {content}\n"
+        context_str = format_context(context)
         # Create prompt for script generation
         prompt = context_str + self._create_script_prompt(poi)
 
@@ -64,7 +67,11 @@ class ScriptGenerator:
         for attempt in range(max_retries):
             try:
                 response = self.model.generate_content(prompt)
-                return response.text.strip()
+                script = response.text.strip()
+                if script and not context:
+                    # Only context-free narration is reusable across users
+                    self.script_store.put(poi, script)
+                return script
 
             except Exception as e:
                 error_msg = str(e)
@@ -93,6 +100,79 @@ class ScriptGenerator:
         # Fallback if all retries failed
         return self._generate_fallback_script(poi)
 
+    def generate_script_stream(
+        self, poi: Dict[str, Any], context: dict = None
+    ) -> Iterator[str]:
+        """
+        Stream a script for a POI chunk by chunk as Gemini generates it
+
+        Args:
+            poi: POI dictionary with name, category, tags, etc.
+            context: Optional chat history (message list or preformatted session context)
+
+        Yields:
+            Script text chunks; the fallback script if Gemini fails before
+            producing any text
+        """
+        stored = self.script_store.get(poi)
+        if stored:
+            yield stored
+            return
+        if self.model.circuit_open() or not self._wait_for_rate_limit():
+            yield self._generate_fallback_script(poi)
+            return
+
+        prompt = format_context(context) + self._create_script_prompt(poi)
+
+        chunks = []
+        try:
+            for chunk in self.model.generate_content_stream(prompt):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"Error streaming script with Gemini: {e}")
+            if not chunks:
+                yield self._generate_fallback_script(poi)
+            return
+
+        script = "".join(chunks).strip()
+        if script and not context:
+            self.script_store.put(poi, script)
+
+    def expected_time_s(self, pois: List[Dict[str, Any]]) -> float:
+        """
+        Rough time generate_script needs for these POIs
+
+        Stored scripts are free; each new one waits for its rate-limit slot
+        (min_request_interval apart) or for the call itself, whichever is
+        longer, using the model's average latency so far.
+        """
+        pending = sum(1 for poi in pois if not self.script_store.contains(poi))
+        stats = get_llm_pool().get_stats().get(self.model.model_name, {})
+        call_s = stats.get("avg_latency_ms", 0.0) / 1000
+        return pending * max(self.min_request_interval, call_s)
+
+    def _wait_for_rate_limit(self) -> bool:
+        """
+        Ensure minimum interval between Gemini requests
+
+        Returns:
+            False, without waiting, when the wait would outlast the request's
+            deadline (see request_policy.py)
+        """
+        # Only slots starting before the deadline are reserved: a slot taken
+        # and then abandoned would push every later caller further back
+        sleep_time = self.rate_limiter.reserve(
+            self.min_request_interval, max_wait_s=request_policy.remaining()
+        )
+        if sleep_time is None:
+            print("Rate limit wait exceeds the request deadline, using fallback")
+            return False
+        if sleep_time > 0:
+            print(f"Rate limiting: waiting {sleep_time:.1f} seconds...")
+            time.sleep(sleep_time)
+        return True
+
     def _create_script_prompt(self, poi: Dict[str, Any]) -> str:
         """Create a prompt for script generation"""
         name = poi.get("name", "this location")
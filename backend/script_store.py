@@ -0,0 +1,128 @@
+"""
+Persistent store for generated POI narration scripts (SQLite)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "scripts.sqlite3"
+)
+
+
+class ScriptStore:
+    """
+    Key-value store of narration scripts keyed by POI identity
+
+    A POI is identified by its lower-cased name plus coordinates rounded to
+    ~11 m, so the same place returned by Overpass on different requests maps
+    to the same script. Writes are committed immediately, which lets batch
+    jobs be interrupted and resumed without losing work.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("SCRIPT_STORE_PATH", DEFAULT_STORE_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scripts (
+                    poi_key TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    lat REAL,
+                    lng REAL,
+                    category TEXT,
+                    script TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def poi_key(poi: Dict[str, Any]) -> str:
+        """Stable identity for a POI across requests"""
+        name = (poi.get("name") or "").strip().lower()
+        lat = poi.get("lat")
+        lng = poi.get("lng")
+        if lat is None or lng is None:
+            return name
+        return f"{name}@{round(float(lat), 4)},{round(float(lng), 4)}"
+
+    def get(self, poi: Dict[str, Any]) -> Optional[str]:
+        """
+        Look up the stored script for a POI
+
+        Args:
+            poi: POI dictionary with name, lat, lng
+
+        Returns:
+            Script text or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT script FROM scripts WHERE poi_key = ?", (self.poi_key(poi),)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, poi: Dict[str, Any], script: str, source: str = "gemini") -> None:
+        """
+        Store (or replace) the script for a POI
+
+        Args:
+            poi: POI dictionary with name, lat, lng, category
+            script: Script text
+            source: Where the script came from ("gemini", "precompute", ...)
+        """
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO scripts
+                    (poi_key, name, lat, lng, category, script, source, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    self.poi_key(poi),
+                    poi.get("name", ""),
+                    poi.get("lat"),
+                    poi.get("lng"),
+                    poi.get("category"),
+                    script,
+                    source,
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def contains(self, poi: Dict[str, Any]) -> bool:
+        """Check whether a script exists without touching hit/miss counters"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM scripts WHERE poi_key = ?", (self.poi_key(poi),)
+            ).fetchone()
+            return row is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM scripts").fetchone()[0]
+        return {
+            "scripts": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "path": self.path,
+        }
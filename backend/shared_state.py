@@ -0,0 +1,376 @@
+"""
+Shared state for caches, rate limiters and sessions across worker processes
+
+Everything the API keeps between requests used to live in one process, so
+running uvicorn with several workers split cache hit rates and let every
+worker call Gemini at the full rate. Components now keep that state behind
+one small interface with three backends:
+
+- ``memory``: a dict in this process (single worker, the default)
+- ``sqlite``: one SQLite file in WAL mode at SHARED_STATE_PATH, shared by
+  every worker on the machine (the default when WEB_CONCURRENCY > 1)
+- ``redis``: a Redis-compatible server at REDIS_URL, for workers spread over
+  several machines (needs the optional ``redis`` package)
+
+Values are JSON documents with an optional TTL. The only atomic operation is
+``incr``, which every backend supports natively and is all RateLimiter needs.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+DEFAULT_STATE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "shared_state.sqlite3"
+)
+KEY_PREFIX = "earsight:"
+
+
+class SharedState:
+    """
+    Interface for shared-state backends
+
+    Keys are strings; values anything ``json.dumps`` accepts. ``ttl_s`` is in
+    seconds and ``None`` means no expiry.
+    """
+
+    name = "base"
+
+    def get(self, key: str) -> Any:
+        """Stored value, or None when missing or expired"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl_s: Optional[float] = None) -> int:
+        """
+        Atomically add to an integer counter, across every process sharing
+        this state
+
+        Args:
+            key: Counter key
+            amount: Increment
+            ttl_s: Expiry set when the counter is created (not refreshed)
+
+        Returns:
+            The counter value after the increment
+        """
+        raise NotImplementedError
+
+    def keys(self, prefix: str) -> List[str]:
+        """Live keys starting with ``prefix`` (for stats: may scan everything)"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemorySharedState(SharedState):
+    """
+    In-process backend: a dict of JSON strings with expiry times
+
+    Values are stored serialized, so callers cannot tell it apart from the
+    cross-process backends (no aliasing of mutable values). At most
+    ``max_entries`` keys are kept, least recently used evicted first.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            raw = self._live(key, time.time())
+            if raw is None:
+                return None
+            self._data.move_to_end(key)
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        raw = json.dumps(value)
+        expires_at = time.time() + ttl_s if ttl_s else None
+        with self._lock:
+            self._store(key, raw, expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl_s: Optional[float] = None) -> int:
+        now = time.time()
+        with self._lock:
+            raw = self._live(key, now)
+            if raw is None:
+                value, expires_at = amount, now + ttl_s if ttl_s else None
+            else:
+                value, expires_at = int(raw) + amount, self._data[key][1]
+            self._store(key, str(value), expires_at)
+            return value
+
+    def keys(self, prefix: str) -> List[str]:
+        now = time.time()
+        with self._lock:
+            return [
+                key
+                for key, (_, expires_at) in self._data.items()
+                if key.startswith(prefix) and (expires_at is None or expires_at > now)
+            ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "keys": len(self._data),
+                "max_entries": self.max_entries,
+            }
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        raw, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return raw
+
+    def _store(self, key: str, raw: str, expires_at: Optional[float]) -> None:
+        self._data[key] = (raw, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class SQLiteSharedState(SharedState):
+    """
+    Backend shared by the processes on one machine: a single SQLite table
+
+    WAL mode lets readers run alongside the one writer; ``incr`` runs in a
+    ``BEGIN IMMEDIATE`` transaction, which SQLite serializes across
+    processes. Expired rows are ignored on read and purged every
+    ``purge_every`` writes. Each process needs its own instance: a connection
+    inherited through ``fork`` does not hold SQLite's locks.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None, purge_every: int = 1000):
+        self.path = path or os.getenv("SHARED_STATE_PATH", DEFAULT_STATE_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit mode, so transactions are exactly the ones opened below
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=10
+        )
+        self._lock = threading.Lock()
+        self.purge_every = purge_every
+        self._writes = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                )
+                """)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM shared_state WHERE key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        raw = json.dumps(value)
+        expires_at = time.time() + ttl_s if ttl_s else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, raw, expires_at),
+            )
+            self._after_write()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1, ttl_s: Optional[float] = None) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or (row[1] is not None and row[1] <= now):
+                    value, expires_at = amount, now + ttl_s if ttl_s else None
+                else:
+                    value, expires_at = int(row[0]) + amount, row[1]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO shared_state (key, value, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, str(value), expires_at),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+        return value
+
+    def keys(self, prefix: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM shared_state WHERE substr(key, 1, ?) = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (len(prefix), prefix, time.time()),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = self._conn.execute("SELECT COUNT(*) FROM shared_state").fetchone()[0]
+        return {"backend": self.name, "path": self.path, "keys": keys}
+
+    def _after_write(self) -> None:
+        """Purge expired rows now and then (caller holds the lock)"""
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self._conn.execute(
+                "DELETE FROM shared_state WHERE expires_at IS NOT NULL "
+                "AND expires_at <= ?",
+                (time.time(),),
+            )
+
+
+class RedisSharedState(SharedState):
+    """
+    Backend on a Redis-compatible server, shared by workers on any machine
+
+    Takes any client with the redis-py command methods (``redis.Redis``, or
+    ``fake_upstreams.FakeRedis`` in tests). Keys get KEY_PREFIX so several
+    apps can share a server.
+    """
+
+    name = "redis"
+
+    def __init__(self, client: Any = None, url: Optional[str] = None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(
+                url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        self.client = client
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(KEY_PREFIX + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        px = max(1, math.ceil(ttl_s * 1000)) if ttl_s else None
+        self.client.set(KEY_PREFIX + key, json.dumps(value), px=px)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(KEY_PREFIX + key)
+
+    def incr(self, key: str, amount: int = 1, ttl_s: Optional[float] = None) -> int:
+        value = self.client.incrby(KEY_PREFIX + key, amount)
+        if ttl_s and value == amount:  # we created the counter
+            self.client.pexpire(KEY_PREFIX + key, max(1, math.ceil(ttl_s * 1000)))
+        return int(value)
+
+    def keys(self, prefix: str) -> List[str]:
+        return [
+            (key.decode() if isinstance(key, bytes) else key)[len(KEY_PREFIX) :]
+            for key in self.client.scan_iter(match=KEY_PREFIX + prefix + "*")
+        ]
+
+
+class RateLimiter:
+    """
+    Paces calls to ``interval_s`` apart on average, across every process
+    sharing ``state``
+
+    Time is cut into slots of ``interval_s``. A caller takes the first slot
+    (from the current one on) whose counter it is the first to increment and
+    waits until that slot starts, so at most one call starts per slot: the
+    same per-minute rate as the old per-process limiter, now for all workers
+    together.
+    """
+
+    def __init__(self, state: SharedState, name: str, max_slots_ahead: int = 1000):
+        self.state = state
+        self.name = name
+        self.max_slots_ahead = max_slots_ahead
+
+    def reserve(
+        self, interval_s: float, max_wait_s: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Reserve the next free slot
+
+        Args:
+            interval_s: Minimum average spacing between calls
+            max_wait_s: Only consider slots starting within this many seconds
+
+        Returns:
+            Seconds to wait before making the call, or None (nothing reserved)
+            when no slot is free within ``max_wait_s``
+        """
+        if interval_s <= 0:
+            return 0.0
+        now = time.time()
+        slot = int(now // interval_s)
+        for ahead in range(self.max_slots_ahead):
+            start = (slot + ahead) * interval_s
+            # A caller that won't wait that long must not claim the slot
+            if max_wait_s is not None and start - now >= max_wait_s:
+                return None
+            key = f"rate:{self.name}:{interval_s:g}:{slot + ahead}"
+            # The counter only has to outlive its slot
+            if self.state.incr(key, ttl_s=interval_s * (ahead + 2)) == 1:
+                return max(0.0, start - now)
+        return self.max_slots_ahead * interval_s
+
+
+def get_shared_state(name: Optional[str] = None) -> SharedState:
+    """
+    Create the shared-state backend selected by SHARED_STATE_BACKEND
+
+    Args:
+        name: "memory", "sqlite" or "redis"; overrides the environment. The
+            default is "sqlite" when WEB_CONCURRENCY (uvicorn's worker count)
+            is above 1, otherwise "memory".
+
+    Returns:
+        SharedState instance
+    """
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+    default = "sqlite" if workers > 1 else "memory"
+    name = (name or os.getenv("SHARED_STATE_BACKEND") or default).lower()
+    if name == "memory":
+        return MemorySharedState()
+    if name == "sqlite":
+        return SQLiteSharedState()
+    if name == "redis":
+        return RedisSharedState()
+    raise ValueError(f"Unknown shared state backend: {name}")
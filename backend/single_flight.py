@@ -0,0 +1,150 @@
+"""
+Request coalescing ("single flight") for identical concurrent upstream calls
+
+When a tour group or a crowd asks for the same place at the same moment, every
+request used to send the same Overpass query, Nominatim lookup, OSRM table and
+Gemini prompt. A ``SingleFlight`` lets the first caller for a key (the leader)
+make the call while callers that arrive with the same key before it finishes
+wait for its outcome instead of repeating it:
+
+    data = self._flight.do(("table", url), self._fetch, url)
+
+- the outcome is shared, not cached: the key is forgotten as soon as the call
+  finishes, so the next caller makes a fresh call
+- errors propagate: followers get the exception the leader got
+- cancellation safe: a follower that stops waiting (``timeout``) does not
+  affect the call, and if the leader itself is interrupted (KeyboardInterrupt,
+  a closed generator) one of the followers makes the call instead of failing
+- deadline aware: a follower waits no longer than its own request deadline
+  (see request_policy.py), and when the leader failed only for lack of time
+  (its deadline, or an open circuit) a follower with time left calls again
+
+Callers must treat a shared result as read-only. Calls are blocking and may
+come from any thread (async handlers hand them to the thread pool).
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import metrics
+import request_policy
+import tracing
+from circuit_breaker import CircuitOpenError
+from request_policy import DeadlineExceeded
+
+
+class _LeaderAbandoned(Exception):
+    """Set on a call whose leader was interrupted; followers retry it"""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with equal keys into one call per key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Run ``fn(*args, **kwargs)``, or wait for the identical call in flight
+
+        Args:
+            key: Normalized identity of the call (same key, same upstream answer)
+            fn: The upstream call
+            timeout: Longest a follower waits for the leader, in seconds
+                (TimeoutError when exceeded; the call itself goes on)
+
+        Returns:
+            The result of the leader's call
+
+        Raises:
+            DeadlineExceeded: The request's deadline passed while following
+        """
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._in_flight[key] = future
+                    self.calls += 1
+                else:
+                    self.shared += 1
+
+            if leader:
+                metrics.SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="leader")
+                return self._lead(key, future, fn, args, kwargs)
+
+            metrics.SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="follower")
+            wait, limited = timeout, False
+            left = request_policy.remaining()
+            if left is not None and (wait is None or left < wait):
+                wait, limited = max(0.0, left), True
+            started = time.time()
+            try:
+                return future.result(wait)
+            except _LeaderAbandoned:
+                continue
+            except (DeadlineExceeded, CircuitOpenError):
+                # The leader's verdict, not necessarily ours: with time left,
+                # make the call (or meet the breaker) ourselves
+                left = request_policy.remaining()
+                if left is None or left > 0:
+                    continue
+                raise
+            except TimeoutError:
+                if future.done() or not limited:
+                    raise
+                raise DeadlineExceeded(f"deadline passed waiting on {self.name}")
+            finally:
+                tracing.add_span(
+                    "singleflight.wait", started, time.time(), flight=self.name
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._in_flight),
+            }
+
+    def _lead(
+        self,
+        key: Hashable,
+        future: Future,
+        fn: Callable[..., Any],
+        args: tuple,
+        kwargs: dict,
+    ) -> Any:
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._forget(key, future)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._forget(key, future)
+            future.set_exception(_LeaderAbandoned())
+            raise
+        self._forget(key, future)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        """Drop the key before publishing, so later callers start a fresh call"""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
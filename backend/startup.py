@@ -0,0 +1,121 @@
+"""
+Startup phase timings and background warm-up
+
+Heavy libraries (the Gemini client, OR-Tools) and slow clients (a local OSM
+routing graph) are loaded on first use, so the server answers /health and
+/roam soon after the process starts. ``Warmup`` then loads them in a
+background thread, so the first route request does not pay for them either.
+Every phase is printed and exported as ``earsight_startup_phase_seconds``.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+
+def process_start_time() -> Optional[float]:
+    """Wall-clock time the process started (from /proc), None where unavailable"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which is in parentheses and may
+            # contain spaces; starttime (field 22) is the 20th of them
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """
+    Durations of consecutive startup phases
+
+    The first phase is measured from process start when the OS tells us when
+    that was (interpreter, server and imports included), otherwise from when
+    the timer was created.
+    """
+
+    def __init__(self):
+        self.process_started = process_start_time()
+        self.started = self.process_started or time.time()
+        self._last = self.started
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> float:
+        """
+        End a phase that ran since the previous mark
+
+        Returns:
+            The phase duration in seconds
+        """
+        now = time.time()
+        with self._lock:
+            duration, self._last = now - self._last, now
+        self.record(phase, duration)
+        return duration
+
+    def record(self, phase: str, seconds: float) -> None:
+        """Record a phase timed elsewhere (e.g. a warm-up step)"""
+        with self._lock:
+            self.phases[phase] = seconds
+        metrics.STARTUP_PHASE_SECONDS.set(seconds, phase=phase)
+
+    def uptime(self) -> float:
+        return time.time() - self.started
+
+    def summary(self) -> str:
+        with self._lock:
+            return ", ".join(
+                f"{phase} {seconds * 1000:.0f}ms"
+                for phase, seconds in self.phases.items()
+            )
+
+
+class Warmup:
+    """
+    Named warm-up steps run one after another in a daemon thread
+
+    Steps only load what a request would otherwise load on first use, so a
+    request that arrives before its step ran simply does that work itself.
+    Failures are logged and reported, never raised.
+    """
+
+    def __init__(self, timer: StartupTimer):
+        self.timer = timer
+        self.steps: List[Tuple[str, Callable[[], Any]]] = []
+        self.errors: Dict[str, str] = {}
+        self.done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, name: str, step: Callable[[], Any]) -> "Warmup":
+        self.steps.append((name, step))
+        return self
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def run(self) -> None:
+        for name, step in self.steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Warm-up step {name} failed: {e}")
+            self.timer.record(f"warmup.{name}", time.perf_counter() - started)
+        self.done.set()
+        print(f"🔥 Warm-up done: {self.timer.summary()}")
+
+    def status(self) -> Dict[str, Any]:
+        if self._thread is None:
+            state = "off"
+        else:
+            state = "done" if self.done.is_set() else "running"
+        return {"state": state, "errors": self.errors}
@@ -0,0 +1,44 @@
+"""
+Tests for Overpass candidate selection
+"""
+
+from candidate_selector import CandidateSelector
+
+START = (43.6532, -79.3832)
+
+
+def _poi(name, lat, lng, category="tourism", **tags):
+    return {"name": name, "lat": lat, "lng": lng, "category": category, "tags": tags}
+
+
+def test_drops_unnamed_and_merges_node_and_way_of_same_place():
+    pois = [
+        _poi("Royal Ontario Museum", 43.6677, -79.3948, tourism="museum", wikipedia="en:ROM"),
+        _poi("Royal Ontario Museum", 43.6679, -79.3946, tourism="museum", website="rom.on.ca"),
+        _poi("Unnamed Location", 43.6530, -79.3830, tourism="attraction"),
+    ]
+    selected = CandidateSelector().select(pois, *START, radius_km=5, top_k=10)
+
+    assert [poi["name"] for poi in selected] == ["Royal Ontario Museum"]
+    assert {"wikipedia", "website"} <= set(selected[0]["tags"])
+
+
+def test_ranking_prefers_documented_nearby_places_and_category_diversity():
+    pois = [
+        _poi(f"Monument {i}", 43.6533 + i * 0.001, -79.3833, "historic", historic="monument")
+        for i in range(5)
+    ] + [
+        _poi("Gallery", 43.6600, -79.3900, tourism="gallery", wikipedia="x", wikidata="y"),
+        _poi("Far Away Park", 43.7000, -79.4500, "leisure", leisure="park"),
+    ]
+    selected = CandidateSelector().select(pois, *START, radius_km=5, top_k=3)
+    names = [poi["name"] for poi in selected]
+
+    assert len(names) == 3
+    assert "Gallery" in names
+    assert sum(name.startswith("Monument") for name in names) < 3
+
+
+def test_top_k_is_respected():
+    pois = [_poi(f"Spot {i}", 43.65 + i * 0.002, -79.38, tourism="attraction") for i in range(50)]
+    assert len(CandidateSelector().select(pois, *START, radius_km=10, top_k=7)) == 7
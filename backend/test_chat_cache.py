@@ -0,0 +1,47 @@
+"""
+Tests for the near-duplicate chat response cache
+"""
+
+from chat_cache import ChatResponseCache
+
+
+def test_near_duplicate_prompts_hit_within_the_same_cell():
+    cache = ChatResponseCache(threshold=0.7)
+    cell = cache.cell_key(43.6426, -79.3871)
+    cache.put(cell, "What's the history of this area?", "It was a rail yard.")
+
+    assert cache.get(cell, "what is the history of this area") == "It was a rail yard."
+    assert cache.get(cell, "Tell me about the history of the area!") == "It was a rail yard."
+    assert cache.get(cell, "Where can I get good ramen?") is None
+    assert cache.get(cache.cell_key(48.8566, 2.3522), "history of this area") is None
+
+
+def test_replies_are_not_shared_across_conversation_contexts():
+    cache = ChatResponseCache(threshold=0.7)
+    on_tour = cache.cell_key(43.6426, -79.3871, "User: plan a museum walk\n")
+    elsewhere = cache.cell_key(43.6426, -79.3871, "User: plan a park walk\n")
+    no_context = cache.cell_key(43.6426, -79.3871)
+    question = "what should I see after this stop"
+    cache.put(on_tour, question, "The Bata Shoe Museum.")
+
+    assert cache.get(elsewhere, question) is None
+    assert cache.get(no_context, question) is None
+    assert cache.get(on_tour, question) == "The Bata Shoe Museum."
+
+
+def test_short_context_dependent_prompts_are_never_cached():
+    cache = ChatResponseCache()
+    cache.put("cell", "tell me more", "More details")
+    assert cache.get("cell", "tell me more") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_memory_is_bounded():
+    cache = ChatResponseCache(max_cells=2, max_entries_per_cell=3)
+    for cell in ("a", "b", "c"):
+        for i in range(5):
+            cache.put(cell, f"best museum number {i} nearby", f"reply {i}")
+
+    stats = cache.get_stats()
+    assert stats["cells"] == 2
+    assert stats["entries"] == 6
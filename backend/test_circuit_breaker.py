@@ -0,0 +1,139 @@
+"""
+Tests for the circuit breakers and the fallbacks they switch the clients to
+"""
+
+import time
+
+import pytest
+
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from fake_upstreams import FakeGemini, OverpassStandIn
+from llm_pool import LLMPool
+from osrm_client import OSRMClient
+from overpass_client import OverpassClient
+from routing_backends import RoutingBackend
+
+TORONTO = (43.6532, -79.3832)
+
+
+def _fail():
+    raise ConnectionError("upstream down")
+
+
+def _state(name):
+    return metrics.CIRCUIT_STATE.get(upstream=name)
+
+
+def test_opens_on_failure_rate_and_recovers_through_a_probe():
+    breaker = CircuitBreaker("test-errors", min_calls=4, open_s=0.1)
+    for outcome in [lambda: "ok", _fail, _fail, lambda: "ok"]:
+        try:
+            breaker.call(outcome)
+        except ConnectionError:
+            pass
+
+    assert breaker.state == "open" and _state("test-errors") == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+    assert breaker.get_stats()["rejected"] == 1
+
+    time.sleep(0.15)
+    assert not breaker.is_open()
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)  # the probe fails: open again
+    assert breaker.is_open()
+
+    time.sleep(0.15)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed" and _state("test-errors") == 0
+    assert breaker.get_stats()["calls"] == 0
+
+
+def test_opens_on_slow_calls_and_limits_half_open_probes():
+    breaker = CircuitBreaker(
+        "test-slow", min_calls=3, slow_call_s=0.01, slow_call_rate=0.6, open_s=0.05
+    )
+    for _ in range(3):
+        breaker.call(time.sleep, 0.02)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    probe_saw_open = []
+    breaker.call(lambda: probe_saw_open.append(breaker.is_open()))
+    assert probe_saw_open == [True]  # one probe at a time
+    assert breaker.state == "closed"
+
+
+def test_old_outcomes_leave_the_window():
+    breaker = CircuitBreaker("test-window", window_s=0.05, min_calls=3)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == "closed"
+
+
+def test_overpass_outage_switches_to_mock_pois(monkeypatch):
+    with OverpassStandIn(error_rate=1.0) as overpass:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        client = OverpassClient()
+        client.get_pois(*TORONTO, 2.0, ["monuments", "museums", "parks"])
+        assert client.overpass_breaker.state == "open"
+        sent = overpass.requests
+
+        started = time.perf_counter()
+        pois = client.get_pois(*TORONTO, 2.0, ["monuments"], top_k=5)
+        assert time.perf_counter() - started < 0.05
+        assert overpass.requests == sent
+    assert len(pois) == 5
+
+
+class _DownBackend(RoutingBackend):
+    name = "down"
+
+    def __init__(self):
+        self.calls = 0
+
+    def table(self, points, sources=None, destinations=None):
+        self.calls += 1
+        raise ConnectionError("OSRM down")
+
+    def route(self, points, steps=False):
+        self.calls += 1
+        raise ConnectionError("OSRM down")
+
+
+def test_osrm_outage_switches_to_haversine():
+    backend = _DownBackend()
+    client = OSRMClient(backend=backend)
+    points = [TORONTO, (43.66, -79.39), (43.65, -79.37)]
+    for _ in range(5):
+        client.get_route(points[:2])
+    assert client.breaker.state == "open"
+
+    matrix = client.get_distance_matrix(points)
+    route = client.get_route(points)
+    assert backend.calls == 5
+    assert not matrix.missing_mask().any()
+    assert route["distance"] > 0
+
+
+def test_gemini_outage_fails_fast():
+    gemini = FakeGemini(error_rate=1.0)
+    pool = LLMPool(api_key="offline")
+    pool.register_model("gemini-2.0-flash", gemini)
+    model = pool.get_model("gemini-2.0-flash")
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            model.generate_content("Describe the CN Tower")
+
+    assert model.circuit_open()
+    with pytest.raises(CircuitOpenError):
+        model.generate_content("Describe the CN Tower")
+    assert gemini.calls == 5
+    stats = pool.get_stats()["gemini-2.0-flash"]
+    assert stats["requests"] == 5 and stats["in_flight"] == 0
+    assert stats["circuit"] == "open"
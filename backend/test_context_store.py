@@ -0,0 +1,56 @@
+"""
+Tests for the server-side conversation context store
+"""
+
+from context_store import ConversationContextStore, estimate_tokens, format_context
+
+
+def _history(n):
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message number {i}. " + "Some filler about Toronto. " * 10,
+        }
+        for i in range(n)
+    ]
+
+
+def test_format_context_accepts_list_and_string():
+    messages = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    assert format_context(messages) == "User: Hi\nAssistant: Hello\n"
+    assert format_context("User: Hi") == "User: Hi\n"
+    assert format_context(None) == ""
+
+
+def test_prompt_size_stays_flat_for_long_sessions():
+    store = ConversationContextStore(window_tokens=200, summary_tokens=50)
+    session_id = store.new_session_id()
+
+    sizes = []
+    for n in (10, 100, 1000):
+        store.sync(session_id, _history(n))
+        sizes.append(estimate_tokens(store.get_context(session_id)))
+
+    assert max(sizes) <= 200 + 50 + 20
+    assert "Summary of earlier conversation" in store.get_context(session_id)
+    assert "Message number 999" in store.get_context(session_id)
+
+
+def test_sync_only_ingests_new_messages_and_resets_on_shorter_history():
+    store = ConversationContextStore()
+    session_id = store.new_session_id()
+    history = [{"role": "user", "content": "First"}]
+    store.sync(session_id, history)
+    store.sync(session_id, history + [{"role": "assistant", "content": "Second"}])
+    assert store.get_context(session_id) == "User: First\nAssistant: Second\n"
+
+    store.sync(session_id, [{"role": "user", "content": "Fresh start"}])
+    assert store.get_context(session_id) == "User: Fresh start\n"
+
+
+def test_record_turn_and_unknown_session():
+    store = ConversationContextStore()
+    assert store.get_context("missing") == ""
+    store.record_turn("abc", "user", "Where am I?")
+    store.record_turn("abc", "assistant", "Near the CN Tower.")
+    assert store.get_context("abc") == "User: Where am I?\nAssistant: Near the CN Tower.\n"
@@ -0,0 +1,57 @@
+"""
+Tests for the offline upstream stand-ins
+"""
+
+import json
+
+import pytest
+
+from fake_upstreams import FakeGemini, FlakyBackend, ManhattanBackend, OverpassStandIn
+from overpass_client import OverpassClient
+
+TORONTO = (43.6532, -79.3832)
+
+
+def test_overpass_standin_serves_the_client(monkeypatch):
+    with OverpassStandIn(per_tag=30, seed=7) as overpass:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        client = OverpassClient()
+        first = client._query_overpass(*TORONTO, 2.0, "historic=monument")
+        again = client._query_overpass(*TORONTO, 2.0, "historic=monument")
+        pois = client.get_pois(*TORONTO, 2.0, ["monuments"], top_k=20)
+
+    assert len(first) == 30
+    assert first == again  # seeded
+    assert all(poi["category"] == "historic" for poi in first)
+    assert len(pois) == 20
+    assert overpass.requests == 5
+
+
+def test_manhattan_backend_table_matches_routes():
+    backend = ManhattanBackend()
+    points = [TORONTO, (43.66, -79.39), (43.65, -79.37)]
+    table = backend.table(points)
+    route = backend.route(points, steps=True)["routes"][0]
+    assert table["distances"][0][0] == 0
+    assert route["legs"][0]["distance"] == pytest.approx(table["distances"][0][1])
+    assert route["legs"][1]["distance"] == pytest.approx(table["distances"][1][2])
+    assert len(route["legs"][0]["steps"][0]["geometry"]["coordinates"]) == 3
+
+
+def test_flaky_backend_injects_failures():
+    backend = FlakyBackend(ManhattanBackend(), error_rate=1.0)
+    assert backend.table([TORONTO, TORONTO])["code"] != "Ok"
+
+
+def test_fake_gemini_answers_parse_and_narration_prompts():
+    gemini = FakeGemini({"max_distance_km": 3})
+    parsed = gemini.generate_content(
+        "Parse the following text and extract route planning parameters"
+    )
+    assert json.loads(parsed.text)["max_distance_km"] == 3
+    chunks = list(gemini.generate_content("Describe the CN Tower", stream=True))
+    assert "".join(chunk.text for chunk in chunks).startswith("Welcome")
+    assert gemini.calls == 2
+
+    with pytest.raises(RuntimeError):
+        FakeGemini(error_rate=1.0).generate_content("anything")
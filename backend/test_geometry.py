@@ -0,0 +1,59 @@
+"""
+Tests for route geometry simplification, polyline encoding and caching
+"""
+
+import math
+
+from geometry import (
+    GeometryCache,
+    decode_polyline,
+    encode_polyline,
+    simplify_douglas_peucker,
+    simplify_visvalingam,
+    tolerance_for_zoom,
+)
+
+
+def _wiggly_line(n=2000):
+    # ~5 km east-west walk with centimeter-level wiggle and one real corner
+    coords = []
+    for i in range(n):
+        lng = -79.40 + 0.06 * i / n
+        lat = 43.65 + 0.0000005 * math.sin(i)
+        if i > n // 2:
+            lat += 0.01 * (i - n // 2) / n
+        coords.append([lng, lat])
+    return coords
+
+
+def test_polyline_round_trip_matches_reference_encoding():
+    coords = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+    encoded = encode_polyline(coords)
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline(encoded) == coords
+
+
+def test_simplifiers_drop_invisible_vertices_but_keep_the_shape():
+    coords = _wiggly_line()
+    tolerance = tolerance_for_zoom(16, 43.65)
+    for simplify in (simplify_douglas_peucker, simplify_visvalingam):
+        simplified = simplify(coords, tolerance)
+        assert len(simplified) < len(coords) // 10
+        assert simplified[0] == coords[0] and simplified[-1] == coords[-1]
+        # The corner survives: the line still reaches the final latitude gain
+        assert any(abs(c[1] - 43.65) < 1e-5 and c[0] > -79.375 for c in simplified)
+
+
+def test_geometry_cache_reuses_results_per_route_and_zoom():
+    cache = GeometryCache()
+    coords = _wiggly_line()
+    key = GeometryCache.route_key([(43.65, -79.40), (43.655, -79.34)])
+
+    first = cache.simplify(key, coords, zoom=16)
+    assert cache.simplify(key, coords, zoom=16) is first
+    assert len(cache.simplify(key, coords, zoom=12)) <= len(first)
+    assert decode_polyline(cache.polyline(key, coords, zoom=16)) == [
+        [round(lng, 5), round(lat, 5)] for lng, lat in first
+    ]
+    stats = cache.get_stats()
+    assert stats["hits"] == 2 and stats["entries"] == 3
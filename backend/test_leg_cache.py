@@ -0,0 +1,84 @@
+"""
+Tests for the per-leg route cache and route stitching
+"""
+
+from leg_cache import LegCache
+from osrm_client import OSRMClient
+
+POINTS = [(43.6426, -79.3871), (43.6453, -79.3806), (43.6487, -79.3817)]
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeRouteSession:
+    """OSRM /route stand-in: straight legs with a midpoint, 1 km and 10 min each"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        coords = [
+            [float(v) for v in pair.split(",")]
+            for pair in url.rsplit("/", 1)[1].split(";")
+        ]
+        self.requests.append(len(coords))
+        legs = []
+        for a, b in zip(coords, coords[1:]):
+            mid = [(a[0] + b[0]) / 2, (a[1] + b[1]) / 2]
+            steps = [
+                {"geometry": {"coordinates": [a, mid]}},
+                {"geometry": {"coordinates": [mid, b]}},
+            ]
+            legs.append({"distance": 1000, "duration": 600, "steps": steps})
+        return FakeResponse({"code": "Ok", "routes": [{"legs": legs}]})
+
+
+def _client(tmp_path):
+    client = OSRMClient(leg_cache=LegCache(str(tmp_path / "legs.sqlite3")))
+    client.backend.session = FakeRouteSession()
+    return client
+
+
+def test_route_is_stitched_from_legs_and_reused(tmp_path):
+    client = _client(tmp_path)
+    route = client.get_route(POINTS)
+    assert route["distance"] == 2.0 and route["duration"] == 20.0
+    # 2 legs x 3 vertices, sharing the middle waypoint
+    assert len(route["geometry"]) == 5
+    assert route["geometry"][2] == [POINTS[1][1], POINTS[1][0]]
+    assert client.backend.session.requests == [3]
+
+    # Same tour again, and a tour that only adds a leg: one 2-point request
+    assert client.get_route(POINTS)["geometry"] == route["geometry"]
+    client.get_route(POINTS + [(43.6500, -79.3900)])
+    assert client.backend.session.requests == [3, 2]
+
+
+def test_legs_persist_across_instances(tmp_path):
+    _client(tmp_path).get_route(POINTS)
+    client = _client(tmp_path)
+    client.get_route(POINTS)
+    assert client.backend.session.requests == []
+    assert client.leg_cache.get_stats()["disk_hits"] == 2
+
+
+def test_memory_and_storage_are_bounded(tmp_path):
+    cache = LegCache(
+        str(tmp_path / "legs.sqlite3"), max_memory_legs=2, max_stored_legs=3
+    )
+    leg = {"distance": 1.0, "duration": 1.0, "geometry": [[0.0, 0.0], [1.0, 1.0]]}
+    for i in range(300):
+        cache.put((i, 0), (i, 1), leg)
+    stats = cache.get_stats()
+    assert stats["memory_legs"] == 2
+    assert stats["stored_legs"] <= 3 + 255
+    assert cache.get((299, 0), (299, 1))["geometry"] == leg["geometry"]
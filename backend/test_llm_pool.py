@@ -0,0 +1,212 @@
+"""
+Tests for the shared Gemini model pool
+"""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_pool
+from llm_pool import LLMPool
+
+
+class StubModel:
+    """generate_content stand-in that records how many calls overlap"""
+
+    def __init__(self, latency_s=0.0, fail=False):
+        self.latency_s = latency_s
+        self.fail = fail
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.latency_s)
+            if self.fail:
+                raise RuntimeError("500 Internal error (stub)")
+            return SimpleNamespace(
+                text=f"reply to {prompt}",
+                usage_metadata=SimpleNamespace(
+                    prompt_token_count=3, candidates_token_count=5
+                ),
+            )
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class FakeGenAI:
+    """google.generativeai stand-in counting configuration and model builds"""
+
+    def __init__(self):
+        self.configured = []
+        self.built = []
+
+    def configure(self, **options):
+        self.configured.append(options)
+
+    def GenerativeModel(self, model_name):
+        self.built.append(model_name)
+        return StubModel()
+
+
+def _run_concurrently(n, fn):
+    threads = [threading.Thread(target=fn, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+
+def test_concurrent_calls_are_capped_per_model():
+    stub = StubModel(latency_s=0.1)
+    pool = LLMPool(api_key="offline", max_concurrency=2)
+    pool.register_model("gemini-2.0-flash", stub)
+
+    _run_concurrently(6, lambda i: pool.generate("gemini-2.0-flash", f"prompt {i}"))
+
+    assert stub.calls == 6 and stub.max_active == 2
+    stats = pool.get_stats()["gemini-2.0-flash"]
+    assert stats["requests"] == 6 and stats["in_flight"] == 0
+    assert stats["queue_wait_ms_total"] > 0  # four calls had to queue
+    assert stats["prompt_tokens"] == 18 and stats["output_tokens"] == 30
+
+
+def test_models_are_built_lazily_and_configured_once(monkeypatch):
+    genai = FakeGenAI()
+    monkeypatch.setattr(llm_pool, "_genai", lambda: genai)
+    pool = LLMPool(api_key="key", transport="rest")
+
+    flash = pool.get_model("gemini-2.0-flash")
+    assert genai.configured == [] and genai.built == []
+
+    flash.generate_content("first")
+    flash.generate_content("second")
+    pool.get_model("gemini-1.5-pro").generate_content("third")
+
+    assert genai.configured == [{"api_key": "key", "transport": "rest"}]
+    assert genai.built == ["gemini-2.0-flash", "gemini-1.5-pro"]
+
+
+def test_registered_models_never_load_the_client_library(monkeypatch):
+    def no_library():
+        raise AssertionError("google.generativeai imported")
+
+    monkeypatch.setattr(llm_pool, "_genai", no_library)
+    pool = LLMPool(api_key="offline")
+    pool.register_model("gemini-2.0-flash", StubModel())
+
+    response = pool.get_model("gemini-2.0-flash").generate_content("hello")
+    assert response.text == "reply to hello"
+
+
+def test_errors_are_counted_and_free_the_slot():
+    stub = StubModel(fail=True)
+    pool = LLMPool(api_key="offline", max_concurrency=1)
+    pool.register_model("gemini-2.0-flash", stub)
+
+    for i in range(3):
+        with pytest.raises(RuntimeError):
+            pool.generate("gemini-2.0-flash", f"prompt {i}")
+
+    stats = pool.get_stats()["gemini-2.0-flash"]
+    assert stats["requests"] == 3 and stats["errors"] == 3
+    assert stats["in_flight"] == 0
+    # The single slot was given back every time
+    stub.fail = False
+    assert pool.generate("gemini-2.0-flash", "again").text == "reply to again"
+    assert pool.get_stats()["gemini-2.0-flash"]["errors"] == 3
+
+
+class StreamingStub:
+    """Model whose streamed reply arrives word by word"""
+
+    def __init__(self, text="Welcome to the old town hall."):
+        self.text = text
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        words = self.text.split(" ")
+        chunks = [word + " " for word in words[:-1]] + [words[-1]]
+        return iter(SimpleNamespace(text=chunk) for chunk in chunks)
+
+
+def test_a_closed_stream_gives_back_its_slot():
+    pool = LLMPool(api_key="offline", max_concurrency=1)
+    pool.register_model("gemini-2.0-flash", StreamingStub())
+
+    stream = pool.generate_stream("gemini-2.0-flash", "Describe the hall")
+    assert next(stream) == "Welcome "
+    assert pool.get_stats()["gemini-2.0-flash"]["in_flight"] == 1
+    stream.close()  # what a client disconnect does to the SSE generator
+
+    stats = pool.get_stats()["gemini-2.0-flash"]
+    assert stats["in_flight"] == 0 and stats["requests"] == 1
+    # The only slot is free again: a second stream runs to the end
+    done = []
+    worker = threading.Thread(
+        target=lambda: done.append(
+            "".join(pool.generate_stream("gemini-2.0-flash", "Again"))
+        )
+    )
+    worker.start()
+    worker.join(2)
+    assert done == ["Welcome to the old town hall."]
+
+
+def test_an_abandoned_stream_holds_no_slot():
+    pool = LLMPool(api_key="offline", max_concurrency=1)
+    pool.register_model("gemini-2.0-flash", StreamingStub())
+
+    # Read part-way, then neither finished nor closed (the reference is kept,
+    # so garbage collection can't close it either)
+    abandoned = pool.generate_stream("gemini-2.0-flash", "Describe the hall")
+    assert next(abandoned) == "Welcome "
+
+    done = []
+    worker = threading.Thread(
+        target=lambda: done.append(
+            "".join(pool.generate_stream("gemini-2.0-flash", "Again"))
+        ),
+        daemon=True,
+    )
+    worker.start()
+    worker.join(2)
+    assert done == ["Welcome to the old town hall."]
+    # and the abandoned stream can still be read to the end
+    assert "".join(abandoned) == "to the old town hall."
+
+
+def test_chat_replies_are_framed_as_server_sent_events(monkeypatch):
+    monkeypatch.setenv("MONGO_URI", "")
+    monkeypatch.setenv("GEMINI_API_KEY", "offline")
+    from fastapi.testclient import TestClient
+
+    import main
+
+    llm_pool.get_llm_pool().register_model(
+        main.script_generator.model.model_name, StreamingStub()
+    )
+    response = TestClient(main.app).post(
+        "/chat/stream", json={"input_text": "What is this building?"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    messages = response.text.split("\n\n")
+    assert messages[-1] == ""  # every message ends with a blank line
+    events = [message.split("\n") for message in messages[:-1]]
+    texts = [json.loads(lines[0][len("data: "):])["text"] for lines in events[:-1]]
+    assert "".join(texts) == "Welcome to the old town hall."
+    assert events[-1][0] == "event: done"
+    done = json.loads(events[-1][1][len("data: "):])
+    assert done["chat_response"] == "Welcome to the old town hall."
+    assert done["session_id"]
@@ -0,0 +1,54 @@
+"""
+Tests for the load test's report helpers
+"""
+
+from loadtest import EndpointStats, lag_delta, parse_histogram
+from metrics import MetricsRegistry
+
+LAG = "earsight_event_loop_lag_seconds"
+
+
+def test_parse_histogram_reads_rendered_metrics():
+    registry = MetricsRegistry()
+    histogram = registry.histogram(LAG, "Lag", buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.5):
+        histogram.observe(value)
+
+    parsed = parse_histogram(registry.render(), LAG)
+    assert parsed["count"] == 3
+    assert abs(parsed["sum"] - 0.555) < 1e-9
+    assert parsed["buckets"] == {"0.01": 1.0, "0.1": 2.0, "+Inf": 3.0}
+
+
+def test_lag_delta_covers_only_the_step():
+    before = {
+        "buckets": {"0.01": 10.0, "0.1": 10.0, "+Inf": 10.0},
+        "sum": 0.02,
+        "count": 10,
+    }
+    after = {
+        "buckets": {"0.01": 10.0, "0.1": 110.0, "+Inf": 110.0},
+        "sum": 5.02,
+        "count": 110,
+    }
+
+    delta = lag_delta(before, after)
+    assert delta["probes"] == 100
+    assert abs(delta["lag_total_s"] - 5.0) < 1e-9
+    assert abs(delta["lag_mean_ms"] - 50.0) < 1e-9
+    assert delta["lag_p99_ms_upper"] == 100.0
+    assert lag_delta(before, None)["lag_mean_ms"] is None
+
+
+def test_endpoint_summary():
+    stats = EndpointStats()
+    for latency in range(1, 101):
+        stats.record(float(latency))
+    stats.record(0.0, "timeout")
+
+    summary = stats.summary(duration_s=10.0)
+    assert summary["requests"] == 101
+    assert summary["errors"] == {"timeout": 1}
+    assert summary["throughput_rps"] == 10.0
+    assert 49 <= summary["p50_ms"] <= 51
+    assert summary["max_ms"] == 100.0
@@ -0,0 +1,113 @@
+"""
+Tests for the Prometheus metrics registry and instrumentation helpers
+"""
+
+import asyncio
+import time
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import metrics
+from metrics import EventLoopLagMonitor, InstrumentedSession, MetricsRegistry
+
+
+class FakeAdapter(BaseAdapter):
+    def __init__(self, status=200, error=None):
+        super().__init__()
+        self.status = status
+        self.error = error
+
+    def send(self, request, **kwargs):
+        if self.error is not None:
+            raise self.error
+        response = requests.Response()
+        response.status_code = self.status
+        response.url = request.url
+        response._content = b"{}"
+        return response
+
+    def close(self):
+        pass
+
+
+def test_render_text_format():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ["host"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    calls.inc(host='a"b')
+    calls.inc(2, host='a"b')
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE calls_total counter" in lines
+    assert 'calls_total{host="a\\"b"} 3' in lines
+    # Buckets are cumulative and le is inclusive
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 3.65" in lines
+
+
+def test_labels_must_match():
+    counter = MetricsRegistry().counter("things_total", "Things", ["kind"])
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+def test_collectors_run_at_scrape_time():
+    registry = MetricsRegistry()
+    ratio = registry.gauge("hit_ratio", "Ratio", ["cache"])
+    stats = {"hits": 0}
+
+    def collect():
+        ratio.set(stats["hits"] / 4, cache="demo")
+
+    def broken():
+        raise RuntimeError("boom")
+
+    registry.register_collector(broken)
+    registry.register_collector(collect)
+    stats["hits"] = 3
+    assert 'hit_ratio{cache="demo"} 0.75' in registry.render().splitlines()
+
+
+def test_time_stage_records_failures_too():
+    before = metrics.STAGE_SECONDS.get(stage="test_stage")["count"]
+    with pytest.raises(KeyError):
+        with metrics.time_stage("test_stage"):
+            raise KeyError("x")
+    assert metrics.STAGE_SECONDS.get(stage="test_stage")["count"] == before + 1
+
+
+def test_instrumented_session_counts_by_host_and_status():
+    session = InstrumentedSession()
+    session.mount("http://ok.test/", FakeAdapter(200))
+    session.mount("http://busy.test/", FakeAdapter(429))
+    session.mount("http://down.test/", FakeAdapter(error=requests.ConnectionError()))
+
+    session.get("http://ok.test/a")
+    session.get("http://busy.test/a", params={"q": 1})
+    with pytest.raises(requests.ConnectionError):
+        session.get("http://down.test/a")
+
+    assert metrics.UPSTREAM_REQUESTS.get(host="ok.test", status="200") == 1
+    assert metrics.UPSTREAM_REQUESTS.get(host="busy.test", status="429") == 1
+    assert metrics.UPSTREAM_REQUESTS.get(host="down.test", status="error") == 1
+    assert metrics.UPSTREAM_SECONDS.get(host="ok.test")["count"] == 1
+
+
+def test_event_loop_lag_monitor_sees_blocking_calls():
+    async def scenario():
+        monitor = EventLoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0)
+        time.sleep(0.1)  # blocks the loop while the probe is asleep
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+        return monitor.max_lag
+
+    assert asyncio.run(scenario()) >= 0.05
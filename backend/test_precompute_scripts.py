@@ -0,0 +1,41 @@
+"""
+Tests for the script precompute job's POI enumeration
+"""
+
+import precompute_scripts
+from fake_upstreams import OverpassStandIn
+from overpass_client import OverpassClient
+
+TORONTO = {"lat": 43.6532, "lng": -79.3832}
+
+
+def _enumerate(client, state, state_file):
+    return precompute_scripts.enumerate_city_pois(
+        client, "toronto", TORONTO, 2.0, ["monuments", "parks"], 5, state, state_file
+    )
+
+
+def test_enumerated_pois_are_checkpointed(monkeypatch, tmp_path):
+    state_file = str(tmp_path / "state.json")
+    state = {"cities": {}}
+    with OverpassStandIn(per_tag=5) as overpass:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        pois = _enumerate(OverpassClient(), state, state_file)
+    assert pois
+    assert precompute_scripts.load_state(state_file)["cities"]["toronto"] == pois
+
+
+def test_overpass_failures_are_not_checkpointed(monkeypatch, tmp_path):
+    state_file = str(tmp_path / "state.json")
+    state = {"cities": {}}
+    with OverpassStandIn(error_rate=1.0) as overpass:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        client = OverpassClient()
+        assert _enumerate(client, state, state_file) is None
+        # Also once the breaker has opened, where get_pois would mock
+        for _ in range(5):
+            _enumerate(client, state, state_file)
+        assert client.overpass_breaker.is_open()
+        assert _enumerate(client, state, state_file) is None
+    assert state["cities"] == {}
+    assert precompute_scripts.load_state(state_file) == {"cities": {}}
@@ -0,0 +1,84 @@
+"""
+Tests for incremental route re-optimization (matrix extension + warm start)
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from leg_cache import LegCache
+from osrm_client import OSRMClient
+from route_registry import RouteRegistry
+from routing_backends import LocalGraphBackend
+from tsp_solver import TSPSolver
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    backend = LocalGraphBackend.grid(43.6532, -79.3832, rows=20, cols=20)
+    cache = LegCache(str(tmp_path_factory.mktemp("legs") / "legs.sqlite3"))
+    return OSRMClient(leg_cache=cache, backend=backend)
+
+
+def test_extend_matrix_matches_a_full_recomputation(client):
+    coords = client.backend.coords
+    points = [tuple(coords[i]) for i in (0, 21, 150, 233, 399)]
+    new_point = tuple(coords[87])
+
+    matrix = client.get_distance_matrix(points)
+    extended = client.extend_matrix(points, matrix, new_point)
+    full = client.get_distance_matrix(points + [new_point])
+
+    assert extended.size == 6
+    np.testing.assert_allclose(extended.distances, full.distances, rtol=1e-5)
+    np.testing.assert_allclose(extended.durations, full.durations, rtol=1e-5)
+
+
+def test_reoptimize_is_fast_and_never_worse_than_the_old_order():
+    rng = np.random.default_rng(7)
+    xy = rng.uniform(0, 3, size=(15, 2))
+    distances = np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1))
+    old_order = list(range(15))
+    old_length = distances[old_order[:-1], old_order[1:]].sum()
+
+    solver = TSPSolver()
+    start = time.perf_counter()
+    order = solver.reoptimize(distances, old_order, max_distance=100)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.0
+    assert order[0] == 0 and sorted(order) == old_order
+    assert solver.get_route_distance(order, distances) <= old_length + 1e-9
+
+
+def test_registry_round_trip():
+    registry = RouteRegistry(max_routes=1)
+    registry.put("a", [(0, 0)], [{"name": "start"}], None, [0], 3.0)
+    registry.put("b", [(0, 0)], [{"name": "start"}], None, [0], 3.0)
+    assert registry.get("a") is None
+    assert registry.get("b")["max_distance_km"] == 3.0
+
+
+def test_registry_changes_a_route_only_through_replace():
+    replaced = []
+    registry = RouteRegistry(on_replace=replaced.append)
+    registry.put("a", [(0, 0)], [{"name": "start"}], None, [0], 3.0)
+    with pytest.raises(ValueError):
+        registry.put("a", [(1, 1)], [{"name": "elsewhere"}], None, [0], 5.0)
+    assert registry.get("a")["max_distance_km"] == 3.0
+    assert replaced == []
+
+    registry.replace("a", [(1, 1)], [{"name": "elsewhere"}], None, [0], 5.0)
+    assert registry.get("a")["max_distance_km"] == 5.0
+    assert replaced == ["a"]
+
+
+def test_registry_restore_keeps_the_live_route():
+    registry = RouteRegistry()
+    nodes = [{"name": "start", "script": "Hi"}]
+    live = registry.put("a", [(0, 0)], nodes, None, [0], 3.0)
+    stored = dict(live, nodes=[{"name": "start"}])
+    assert registry.restore(**stored) is live
+    other = registry.restore(**dict(stored, route_id="b"))
+    assert other["nodes"] == [{"name": "start"}]
@@ -0,0 +1,213 @@
+"""
+Tests for request deadlines, hedged requests and deadline-aware fallbacks
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import metrics
+import request_policy
+import tracing
+from circuit_breaker import CircuitBreaker
+from fake_upstreams import (
+    FakeGemini,
+    ManhattanBackend,
+    OverpassStandIn,
+    install_fake_gemini,
+)
+from leg_cache import LegCache
+from osrm_client import OSRMClient
+from osrm_standin import OSRMStandIn
+from overpass_client import OverpassClient
+from request_policy import DeadlineExceeded, RequestPolicy, deadline
+from routing_backends import OSRMHTTPBackend
+from script_store import ScriptStore
+from shared_state import MemorySharedState, RateLimiter
+
+TORONTO = (43.6532, -79.3832)
+
+
+def _endpoint(delay=0.0, error=None):
+    def attempt(timeout):
+        time.sleep(min(delay, timeout))
+        if error is not None:
+            raise error
+        if delay > timeout:
+            raise TimeoutError("read timed out")
+        return delay
+
+    return attempt
+
+
+def test_deadlines_nest_and_reach_worker_threads():
+    assert request_policy.remaining() is None
+    with deadline(10):
+        with deadline(60):  # cannot extend the outer deadline
+            assert 9 < request_policy.remaining() <= 10
+        with deadline(1):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                left = executor.submit(tracing.wrap(request_policy.remaining))
+                assert 0.9 < left.result() <= 1
+    assert request_policy.remaining() is None
+
+
+def test_slow_attempts_are_hedged_to_a_mirror():
+    endpoints = {"primary": _endpoint(delay=1.0), "mirror": _endpoint(delay=0.01)}
+    policy = RequestPolicy("test", list(endpoints), default_hedge_delay_s=0.05)
+
+    started = time.perf_counter()
+    assert policy.call(lambda url, timeout: endpoints[url](timeout)) == 0.01
+    assert time.perf_counter() - started < 0.5
+    assert policy.get_stats()["hedges"] == 1
+    assert policy.get_stats()["hedge_wins"] == 1
+
+
+def test_failed_attempts_move_to_the_next_mirror_at_once():
+    endpoints = {
+        "primary": _endpoint(error=ConnectionError("refused")),
+        "mirror": _endpoint(),
+    }
+    policy = RequestPolicy("test", list(endpoints), default_hedge_delay_s=5.0)
+
+    started = time.perf_counter()
+    assert policy.call(lambda url, timeout: endpoints[url](timeout)) == 0.0
+    assert time.perf_counter() - started < 1.0
+
+    down = RequestPolicy("test", ["a", "b"])
+    with pytest.raises(ConnectionError):
+        down.call(lambda url, timeout: _endpoint(error=ConnectionError(url))(timeout))
+
+
+def test_hedge_delay_follows_the_latency_p95():
+    policy = RequestPolicy("test", ["only"], default_hedge_delay_s=2.0)
+    assert policy.hedge_delay() == 2.0
+    for i in range(100):
+        policy._latencies.append(i / 100)
+    assert policy.hedge_delay() == pytest.approx(0.94)
+    assert policy.expected_latency() == pytest.approx(0.5)
+
+
+def test_the_deadline_bounds_attempts_without_tripping_the_breaker():
+    policy = RequestPolicy("test", ["only"], timeout_s=10.0)
+    breaker = CircuitBreaker("test-deadline", min_calls=1)
+    timeouts = []
+
+    def slow(url, timeout):
+        timeouts.append(timeout)
+        return _endpoint(delay=1.0)(timeout)
+
+    with deadline(0.1):
+        with pytest.raises(DeadlineExceeded):
+            breaker.call(policy.call, slow)
+        time.sleep(0.1)
+        with pytest.raises(DeadlineExceeded):
+            policy.call(slow)
+    assert len(timeouts) == 1 and timeouts[0] <= 0.1
+    assert breaker.state == "closed"
+
+
+def test_overpass_is_hedged_and_skipped_near_the_deadline(monkeypatch):
+    with OverpassStandIn(latency_s=2.0) as slow, OverpassStandIn() as mirror:
+        monkeypatch.setenv("OVERPASS_URL", slow.url)
+        monkeypatch.setenv("OVERPASS_MIRRORS", mirror.url)
+        client = OverpassClient()
+        client.overpass_policy.default_hedge_delay_s = 0.05
+
+        started = time.perf_counter()
+        pois = client._query_overpass(*TORONTO, 2.0, "historic=monument")
+        assert time.perf_counter() - started < 1.0
+        assert pois and mirror.requests == 1
+
+        with deadline(0):
+            mock = client.get_pois(*TORONTO, 2.0, ["monuments"], top_k=3)
+        assert len(mock) == 3 and mirror.requests == 1
+
+
+def test_osrm_uses_haversine_when_the_deadline_is_near():
+    backend = OSRMHTTPBackend("http://127.0.0.1:9")  # nothing listens here
+    client = OSRMClient(backend=backend)
+    points = [TORONTO, (43.66, -79.39), (43.65, -79.37)]
+
+    with deadline(0):
+        matrix = client.get_distance_matrix(points)
+        route = client.get_route(points)
+    assert not matrix.missing_mask().any()
+    assert route["distance"] > 0
+    assert client.breaker.get_stats()["calls"] == 0
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setenv("MONGO_URI", "")
+    monkeypatch.setenv("GEMINI_API_KEY", "offline")
+    import main
+
+    generator = main.script_generator
+    monkeypatch.setattr(
+        generator, "script_store", ScriptStore(str(tmp_path / "scripts.sqlite3"))
+    )
+    monkeypatch.setattr(
+        generator, "rate_limiter", RateLimiter(MemorySharedState(), "test-scripts")
+    )
+    return main
+
+
+def test_the_default_deadline_leaves_the_solver_time_after_scripts(app):
+    # Ten new stops at the real 4 s Gemini pacing need 40 s of the deadline
+    pois = [{"name": f"Stop {i}", "lat": 43.65, "lng": -79.38} for i in range(10)]
+    with deadline(app.REQUEST_DEADLINES["/generate-route"]):
+        limit = app._tsp_time_limit(pois)
+    assert app.MIN_TSP_TIME_LIMIT_S < limit < app.tsp_solver.DEFAULT_TIME_LIMIT_S
+    assert app._tsp_time_limit(pois) is None  # no deadline, solver default
+
+
+def test_a_feasible_route_keeps_llm_scripts_and_osrm_geometry(
+    app, monkeypatch, tmp_path
+):
+    from fastapi.testclient import TestClient
+
+    # The default deadline, Gemini pacing and stage reserve, scaled down 10x;
+    # the solver keeps its 30 s default time limit
+    monkeypatch.setitem(
+        app.REQUEST_DEADLINES,
+        "/generate-route",
+        app.REQUEST_DEADLINES["/generate-route"] / 10,
+    )
+    monkeypatch.setattr(app.script_generator, "min_request_interval", 0.4)
+    monkeypatch.setattr(app, "ROUTE_STAGES_RESERVE_S", 0.3)
+    install_fake_gemini(FakeGemini({"max_distance_km": 100}))  # feasible cap
+
+    with OverpassStandIn(per_tag=5) as overpass, OSRMStandIn(
+        ManhattanBackend()
+    ) as osrm:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        monkeypatch.setattr(app, "overpass_client", OverpassClient())
+        monkeypatch.setattr(
+            app,
+            "osrm_client",
+            OSRMClient(
+                leg_cache=LegCache(str(tmp_path / "legs.sqlite3")),
+                backend=OSRMHTTPBackend(osrm.url),
+            ),
+        )
+        fallbacks = metrics.DEADLINE_FALLBACKS.get(upstream="osrm")
+        started = time.perf_counter()
+        response = TestClient(app.app).post(
+            "/generate-route",
+            json={"input_text": "A walk through toronto", "reuse": False},
+        )
+        elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert elapsed < app.REQUEST_DEADLINES["/generate-route"]
+    stops = body["points"][1:]
+    assert len(stops) >= 5
+    assert all(stop["script"].startswith("Welcome to one of") for stop in stops)
+    # Street-grid legs from OSRM, not straight haversine lines
+    assert metrics.DEADLINE_FALLBACKS.get(upstream="osrm") == fallbacks
+    line = body["geojson"]["features"][-1]["geometry"]
+    assert line["type"] == "LineString"
+    assert len(line["coordinates"]) > len(body["points"])
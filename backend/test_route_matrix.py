@@ -0,0 +1,69 @@
+"""
+Tests for the float32 distance/duration matrix
+"""
+
+import numpy as np
+import pytest
+
+from route_matrix import RouteMatrix
+
+OSRM_TABLE = {
+    "code": "Ok",
+    "distances": [[0, 1500, None], [1500, 0, 800], [2000, 800, 0]],
+    "durations": [[0, 1200, None], [1200, 0, 600], [1500, 600, 0]],
+}
+
+
+def test_osrm_tables_are_converted_to_km_and_minutes():
+    matrix = RouteMatrix.from_osrm(OSRM_TABLE, duration_scale=2.0)
+
+    assert matrix.distances.dtype == np.float32 and matrix.distances.flags.c_contiguous
+    assert matrix.size == len(matrix) == 3
+    assert matrix.distance(0, 1) == pytest.approx(1.5)
+    assert matrix.duration(0, 1) == pytest.approx(40.0)  # 20 min, scaled x2
+    assert matrix.missing_mask().tolist() == [
+        [False, False, True],
+        [False, False, False],
+        [False, False, False],
+    ]
+
+    fallback = np.full((3, 3), 3.0)
+    assert matrix.fill_missing(fallback, speed_kmh=6.0) == 1
+    assert matrix.distance(0, 2) == pytest.approx(3.0)
+    assert matrix.duration(0, 2) == pytest.approx(30.0)
+    assert matrix.distance(2, 0) == pytest.approx(2.0)  # answered cells are kept
+
+
+def test_expanded_keeps_the_old_cells_and_adds_missing_ones():
+    matrix = RouteMatrix.from_osrm(OSRM_TABLE)
+    extended = matrix.expanded(2)
+
+    assert extended.size == 5
+    np.testing.assert_array_equal(extended.distances[:3, :3], matrix.distances)
+    assert extended.missing_mask()[3:, :].all() and extended.missing_mask()[:, 3:].all()
+
+    extended.set_block(slice(3, 4), slice(0, 2), RouteMatrix([[0.1, 0.2]], [[1, 2]]))
+    assert extended.distance(3, 1) == pytest.approx(0.2)
+    assert extended.duration(3, 0) == pytest.approx(1.0)
+    # The original is left untouched
+    assert matrix.size == 3
+
+
+def test_submatrix_follows_the_given_order():
+    matrix = RouteMatrix(np.arange(16).reshape(4, 4), np.arange(16).reshape(4, 4) * 2)
+    sub = matrix.submatrix([3, 1])
+
+    assert sub.distances.tolist() == [[15, 13], [7, 5]]
+    assert sub.durations.tolist() == [[30, 26], [14, 10]]
+    assert matrix.route_distance([0, 1, 3]) == pytest.approx(1 + 7)
+    assert matrix.route_distance([2]) == 0.0
+
+
+def test_to_dict_rounds_and_rejects_mismatched_shapes():
+    matrix = RouteMatrix([[0, 1.23456]], [[0, 7.654321]])
+    assert matrix.to_dict(decimals=2) == {
+        "distance_matrix": [[0.0, 1.23]],
+        "duration_matrix": [[0.0, 7.65]],
+    }
+    with pytest.raises(ValueError):
+        RouteMatrix(np.zeros((2, 2)), np.zeros((3, 3)))
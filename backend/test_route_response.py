@@ -0,0 +1,82 @@
+"""
+Tests for the shape of route responses (full and slim views)
+"""
+
+import numpy as np
+import pytest
+
+from fake_upstreams import ManhattanBackend
+from leg_cache import LegCache
+from models import RoutePoint, RouteResponseOptions
+from osrm_client import OSRMClient
+from route_matrix import RouteMatrix
+
+POINTS = [(43.6532, -79.3832), (43.6426, -79.3871), (43.6677, -79.3948)]
+
+
+@pytest.fixture
+def main(monkeypatch, tmp_path):
+    monkeypatch.setenv("MONGO_URI", "")
+    monkeypatch.setenv("GEMINI_API_KEY", "offline")
+    import main
+
+    client = OSRMClient(
+        leg_cache=LegCache(str(tmp_path / "legs.sqlite3")), backend=ManhattanBackend()
+    )
+    monkeypatch.setattr(main, "osrm_client", client)
+    return main
+
+
+def _content(main, **options):
+    route_points = [
+        RoutePoint(lat=lat, lng=lng, name=f"Stop {i}", script=f"Script {i}")
+        for i, (lat, lng) in enumerate(POINTS)
+    ]
+    hops = np.ones((3, 3)) - np.eye(3)  # 1 km, 12 minutes between any two stops
+    matrix = RouteMatrix(hops, hops * 12)
+    return main.build_route_content(
+        "route-1", [0, 1, 2], route_points, matrix, RouteResponseOptions(**options)
+    )
+
+
+def test_full_view_keeps_the_matrices_and_scripts(main):
+    content = _content(main)
+
+    assert content["distance_matrix"][0][1] == 1.0
+    assert content["duration_matrix"][0][1] == 12.0
+    features = content["geojson"]["features"]
+    stops = [f for f in features if f["geometry"]["type"] == "Point"]
+    assert [f["properties"]["script"] for f in stops] == [
+        "Script 0",
+        "Script 1",
+        "Script 2",
+    ]
+    assert features[-1]["geometry"]["type"] == "LineString"
+    assert "route_polyline" not in content
+
+
+def test_slim_view_drops_the_matrices_but_keeps_what_clients_need(main):
+    content = _content(main, view="slim", geometry_format="polyline")
+
+    assert "distance_matrix" not in content and "duration_matrix" not in content
+    needed = {"route", "points", "geojson", "total_distance_km", "success"}
+    assert needed <= set(content)
+    assert content["route"]["id"] == "route-1" and content["route"]["waypoints"] == 3
+    assert content["total_distance_km"] == pytest.approx(2.0)
+    # Scripts are sent once, on the points; no nulls on the points either
+    assert [point["script"] for point in content["points"]] == [
+        "Script 0",
+        "Script 1",
+        "Script 2",
+    ]
+    assert all(None not in point.values() for point in content["points"])
+    features = content["geojson"]["features"]
+    assert all("script" not in f["properties"] for f in features)
+    # The route line comes as a polyline string instead of a LineString
+    assert all(f["geometry"]["type"] == "Point" for f in features)
+    assert isinstance(content["route_polyline"], str) and content["route_polyline"]
+
+
+def test_fields_limit_the_response_but_keep_the_status_flags(main):
+    content = main.project_fields(_content(main, view="slim"), ["route"])
+    assert set(content) == {"route", "is_route_response", "success", "message"}
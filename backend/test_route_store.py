@@ -0,0 +1,78 @@
+"""
+Tests for the MongoDB route store (document mapping, against an in-memory collection)
+"""
+
+import asyncio
+
+import numpy as np
+
+from route_matrix import RouteMatrix
+from route_store import RouteStore
+
+
+class FakeAsyncCollection:
+    """The subset of the async collection API the store uses"""
+
+    def __init__(self):
+        self.documents = {}
+        self.indexes = []
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+
+    async def replace_one(self, query, document, upsert=False):
+        self.documents[query["_id"]] = document
+
+    async def find_one(self, query):
+        return self.documents.get(query["_id"])
+
+
+def _route():
+    distances = np.array([[0, 1.5, 2.0], [1.5, 0, 0.7], [2.0, 0.7, 0]])
+    return {
+        "route_id": "2026-01-01T10:00:00",
+        "points": [(43.64, -79.38), (43.65, -79.39), (43.66, -79.37)],
+        "nodes": [{"name": "start"}, {"name": "A", "script": "a"}, {"name": "B"}],
+        "matrix": RouteMatrix(distances, distances * 12),
+        "order": [0, 2, 1],
+        "max_distance_km": 5.0,
+    }
+
+
+def test_document_has_geojson_fields_and_round_trips():
+    response = {"points": [], "distance_matrix": [[0.0]], "success": True}
+    document = RouteStore.to_document(_route(), response, {"preferences": ["parks"]})
+
+    assert document["start"] == {"type": "Point", "coordinates": [-79.38, 43.64]}
+    assert document["waypoints"]["coordinates"][1] == [-79.37, 43.66]
+    assert "distance_matrix" not in document["response"]
+    assert document["expires_at"] > document["created_at"]
+
+    loaded = RouteStore.from_document(document)
+    route = loaded["route"]
+    assert route["order"] == [0, 2, 1] and route["points"][1] == (43.65, -79.39)
+    np.testing.assert_allclose(route["matrix"].durations, _route()["matrix"].durations)
+    assert route["matrix"].distances.flags.writeable
+    assert loaded["metadata"] == {"preferences": ["parks"]}
+
+
+def test_save_creates_indexes_once_and_get_loads():
+    collection = FakeAsyncCollection()
+    store = RouteStore(collection, ttl_days=1)
+
+    async def scenario():
+        await store.save(_route(), {"success": True})
+        await store.save(_route(), {"success": True})
+        return await store.get("2026-01-01T10:00:00"), await store.get("missing")
+
+    found, missing = asyncio.run(scenario())
+    assert found["response"] == {"success": True} and missing is None
+    kinds = [
+        kwargs.get("expireAfterSeconds", keys) for keys, kwargs in collection.indexes
+    ]
+    assert kinds == [
+        [("start", "2dsphere"), ("metadata.preferences", 1)],
+        [("waypoints", "2dsphere")],
+        0,
+    ]
+    assert store.get_stats()["saves"] == 2
@@ -0,0 +1,111 @@
+"""
+Tests for the routing backends and the local OSRM stand-in
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from leg_cache import LegCache
+from osrm_client import OSRMClient
+from osrm_standin import OSRMStandIn
+from routing_backends import (
+    LocalGraphBackend,
+    OSRMHTTPBackend,
+    RoutingBackend,
+    get_routing_backend,
+)
+
+CENTER = (43.6532, -79.3832)
+
+
+@pytest.fixture(scope="module")
+def grid():
+    # 100 m blocks, so walking distances are Manhattan distances
+    return LocalGraphBackend.grid(*CENTER, rows=20, cols=20, spacing_m=100)
+
+
+def test_grid_routes_follow_the_streets(grid):
+    a, b = grid.coords[0], grid.coords[3 * 20 + 4]  # 3 blocks up, 4 across
+    route = grid.route([tuple(a), tuple(b)], steps=True)["routes"][0]
+    assert route["distance"] == pytest.approx(700, rel=0.01)
+    assert route["duration"] == pytest.approx(700 / (5 / 3.6), rel=0.01)
+    assert len(route["legs"][0]["steps"][0]["geometry"]["coordinates"]) == 8
+
+
+def test_astar_agrees_with_the_table(grid):
+    points = [tuple(grid.coords[i]) for i in (0, 57, 133, 399, 210)]
+    table = grid.table(points)
+    for i, a in enumerate(points):
+        for j, b in enumerate(points):
+            routed = grid.route([a, b])["routes"][0]["distance"]
+            assert table["distances"][i][j] == pytest.approx(routed)
+
+    sub = grid.table(points, sources=[1], destinations=[2, 3])
+    assert sub["distances"] == [[table["distances"][1][2], table["distances"][1][3]]]
+
+
+def test_client_routes_through_the_http_standin(grid, tmp_path):
+    with OSRMStandIn(grid) as server:
+        client = OSRMClient(
+            leg_cache=LegCache(str(tmp_path / "legs.sqlite3")),
+            backend=OSRMHTTPBackend(server.url),
+        )
+        points = [tuple(grid.coords[i]) for i in (0, 45, 310)]
+        matrix = client.get_distance_matrix(points)
+        route = client.get_route(points)
+
+    assert matrix.distance(0, 1) == pytest.approx(0.7, rel=0.01)
+    assert route["distance"] == pytest.approx(
+        matrix.distance(0, 1) + matrix.distance(1, 2), rel=0.01
+    )
+    assert server.requests == 2
+
+
+class _LimitedTable(RoutingBackend):
+    """Rejects table requests over the public server's coordinate limit"""
+
+    def __init__(self, backend, limit):
+        self.backend = backend
+        self.limit = limit
+        self.name = backend.name
+        self.duration_scale = backend.duration_scale
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def table(self, points, sources=None, destinations=None):
+        assert len(points) <= self.limit, f"{len(points)} coordinates"
+        with self._lock:
+            self.requests.append(len(points))
+        return self.backend.table(points, sources, destinations)
+
+
+def test_large_tables_are_stitched_from_blocks(grid):
+    # 130 points: three 50-point blocks, so nine source x destination requests
+    points = [tuple(grid.coords[i]) for i in range(0, 390, 3)]
+    limited = _LimitedTable(grid, OSRMClient.MAX_TABLE_COORDINATES)
+    chunked = OSRMClient(backend=limited).get_distance_matrix(points)
+
+    whole = OSRMClient(backend=grid)
+    whole.MAX_TABLE_COORDINATES = len(points)
+    expected = whole.get_distance_matrix(points)
+
+    assert len(limited.requests) == 9 and max(limited.requests) == 100
+    assert chunked.size == expected.size == 130
+    assert not chunked.missing_mask().any()
+    np.testing.assert_allclose(chunked.distances, expected.distances, rtol=1e-6)
+    np.testing.assert_allclose(chunked.durations, expected.durations, rtol=1e-6)
+    # Off-diagonal blocks: rows of one block against columns of another
+    assert chunked.distance(10, 120) == pytest.approx(expected.distance(10, 120))
+    assert chunked.distance(120, 60) == pytest.approx(expected.distance(120, 60))
+
+
+def test_backend_selection(monkeypatch):
+    assert get_routing_backend("public").duration_scale == 7
+    monkeypatch.delenv("OSRM_BASE_URL", raising=False)
+    with pytest.raises(ValueError):
+        get_routing_backend("osrm")
+    monkeypatch.setenv("OSRM_BASE_URL", "http://localhost:5000/")
+    backend = get_routing_backend("osrm")
+    assert backend.base_url == "http://localhost:5000" and backend.profile == "foot"
@@ -0,0 +1,137 @@
+"""
+Tests for the shared-state backends and the components built on them
+"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from chat_cache import ChatResponseCache
+from context_store import ConversationContextStore
+from fake_upstreams import FakeRedis
+from shared_state import (
+    MemorySharedState,
+    RateLimiter,
+    RedisSharedState,
+    SQLiteSharedState,
+    get_shared_state,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return MemorySharedState()
+    if request.param == "sqlite":
+        return SQLiteSharedState(str(tmp_path / "state.sqlite3"))
+    return RedisSharedState(FakeRedis())
+
+
+def test_values_round_trip_and_expire(state):
+    state.set("session:a", {"turns": [["user", "hi", 1]], "seen": 1})
+    state.set("session:b", [1, 2, 3], ttl_s=0.05)
+    state.set("other", "x")
+
+    assert state.get("session:a") == {"turns": [["user", "hi", 1]], "seen": 1}
+    assert sorted(state.keys("session:")) == ["session:a", "session:b"]
+    time.sleep(0.1)
+    assert state.get("session:b") is None
+    assert state.keys("session:") == ["session:a"]
+    state.delete("session:a")
+    assert state.get("session:a") is None
+
+
+def test_incr_is_atomic_across_threads(state):
+    def work():
+        for _ in range(200):
+            state.incr("counter")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state.incr("counter", 0) == 800
+
+
+def test_counter_ttl_is_set_on_creation(state):
+    assert state.incr("slot", ttl_s=0.05) == 1
+    assert state.incr("slot", ttl_s=10) == 2
+    time.sleep(0.1)
+    assert state.incr("slot", ttl_s=10) == 1
+
+
+def _incr_many(path, n):
+    state = SQLiteSharedState(path)
+    for _ in range(n):
+        state.incr("counter")
+
+
+def test_sqlite_incr_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    SQLiteSharedState(path)  # create the table before the workers race
+    # Spawned like uvicorn's workers, not forked with the parent's connections
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_incr_many, args=(path, 100)) for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert SQLiteSharedState(path).incr("counter", 0) == 300
+
+
+def test_rate_limiter_spaces_calls_across_workers(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    # Two "workers" with their own connections to the same file
+    workers = [RateLimiter(SQLiteSharedState(path), "gemini") for _ in range(2)]
+    started = time.time()
+    delays = sorted(workers[i % 2].reserve(1.0) for i in range(6))
+
+    # One call per one-second slot: the current slot, then the next five
+    slot_start = int(started) - started
+    for i, delay in enumerate(delays):
+        assert delay == pytest.approx(max(0.0, slot_start + i), abs=0.05)
+    assert RateLimiter(MemorySharedState(), "off").reserve(0) == 0.0
+
+
+def test_rate_limiter_callers_out_of_time_leave_slots_free():
+    limiter = RateLimiter(MemorySharedState(), "gemini")
+    assert limiter.reserve(10.0, max_wait_s=30.0) is not None
+    # Callers whose deadline is closer than the next free slot get nothing
+    # and must not push that slot back for the callers behind them
+    for _ in range(50):
+        assert limiter.reserve(10.0, max_wait_s=0.0) is None
+    started = time.time()
+    delay = limiter.reserve(10.0, max_wait_s=30.0)
+    assert delay == pytest.approx(10.0 - started % 10.0, abs=0.05)
+
+
+def test_workers_share_sessions_and_chat_replies(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SQLiteSharedState(path), SQLiteSharedState(path)
+
+    ConversationContextStore(state=first).record_turn("s1", "user", "Hello there")
+    assert "User: Hello there" in ConversationContextStore(state=second).get_context(
+        "s1"
+    )
+
+    prompt = "what are the best museums around here"
+    ChatResponseCache(state=first).put("cell", prompt, "Try the ROM.")
+    assert ChatResponseCache(state=second).get("cell", prompt) == "Try the ROM."
+
+
+def test_backend_selection(monkeypatch, tmp_path):
+    monkeypatch.delenv("SHARED_STATE_BACKEND", raising=False)
+    monkeypatch.setenv("SHARED_STATE_PATH", str(tmp_path / "state.sqlite3"))
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert get_shared_state().name == "memory"
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert get_shared_state().name == "sqlite"
+    monkeypatch.setenv("SHARED_STATE_BACKEND", "memory")
+    assert get_shared_state().name == "memory"
+    with pytest.raises(ValueError):
+        get_shared_state("memcached")
@@ -0,0 +1,184 @@
+"""
+Tests for request coalescing and the upstream clients that use it
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fake_upstreams import FakeGemini, OverpassStandIn
+from llm_pool import LLMPool
+from overpass_client import OverpassClient
+from request_policy import DeadlineExceeded, deadline
+from single_flight import SingleFlight
+
+TORONTO = (43.6532, -79.3832)
+
+
+def _run_together(n, fn):
+    """Start ``fn(i)`` in n threads at once and return the results in order"""
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        return list(executor.map(run, range(n)))
+
+
+def test_concurrent_calls_with_one_key_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    def fetch(key):
+        calls.append(key)
+        time.sleep(0.2)
+        return {"key": key}
+
+    results = _run_together(6, lambda i: flight.do(i % 2, fetch, i % 2))
+
+    assert sorted(calls) == [0, 1]
+    assert results == [{"key": i % 2} for i in range(6)]
+    assert flight.get_stats() == {"calls": 2, "shared": 4, "in_flight": 0}
+    # Nothing is cached once the call is over
+    flight.do(0, fetch, 0)
+    assert len(calls) == 3
+
+
+def test_errors_reach_every_waiting_caller():
+    flight = SingleFlight("test")
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ConnectionError("upstream down")
+
+    def call(_):
+        try:
+            flight.do("key", fail)
+        except ConnectionError as e:
+            return str(e)
+
+    assert _run_together(4, call) == ["upstream down"] * 4
+    assert len(calls) == 1
+
+
+def test_a_follower_that_gives_up_does_not_cancel_the_call():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(flight.do, "key", slow)
+        assert started.wait(5)
+        with pytest.raises(TimeoutError):
+            flight.do("key", slow, timeout=0.05)
+        release.set()
+        assert leader.result(5) == "done"
+
+
+def test_an_interrupted_leader_hands_the_call_to_a_follower():
+    flight = SingleFlight("test")
+    leading = threading.Event()
+
+    def interrupted():
+        leading.set()
+        time.sleep(0.2)  # the follower joins meanwhile
+        raise KeyboardInterrupt
+
+    def follow():
+        leading.wait(5)
+        return flight.do("key", lambda: "retried")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        follower = executor.submit(follow)
+        with pytest.raises(KeyboardInterrupt):
+            flight.do("key", interrupted)
+        assert follower.result(5) == "retried"
+    assert flight.get_stats() == {"calls": 2, "shared": 1, "in_flight": 0}
+
+
+def test_followers_keep_to_their_own_deadline():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(flight.do, "key", slow)
+        assert started.wait(5)
+        waited = time.perf_counter()
+        with deadline(0.1), pytest.raises(DeadlineExceeded):
+            flight.do("key", slow)
+        assert time.perf_counter() - waited < 1.0
+        release.set()
+        assert leader.result(5) == "done"
+
+
+def test_a_follower_with_time_left_retries_a_leader_out_of_time():
+    flight = SingleFlight("test")
+    leading = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            leading.set()
+            time.sleep(0.2)  # the follower joins meanwhile
+            raise DeadlineExceeded("the leader's deadline passed")
+        return "fetched"
+
+    def follow():
+        leading.wait(5)
+        with deadline(10):
+            return flight.do("key", fetch)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        follower = executor.submit(follow)
+        with deadline(0.2), pytest.raises(DeadlineExceeded):
+            flight.do("key", fetch)
+        assert follower.result(5) == "fetched"
+    assert len(calls) == 2
+
+
+def test_overpass_queries_from_a_group_are_coalesced(monkeypatch):
+    with OverpassStandIn(per_tag=20, latency_s=0.2) as overpass:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        client = OverpassClient()
+        # A group standing within a few meters of each other
+        results = _run_together(
+            5,
+            lambda i: client._query_overpass(
+                TORONTO[0] + i * 1e-6, TORONTO[1], 2.0, "historic=monument"
+            ),
+        )
+
+    assert overpass.requests == 1
+    assert all(result == results[0] and len(result) == 20 for result in results)
+    assert results[0][0] is not results[1][0]  # every caller gets its own POIs
+
+
+def test_identical_prompts_share_one_gemini_call():
+    gemini = FakeGemini(latency_s=0.2)
+    pool = LLMPool(api_key="offline")
+    pool.register_model("gemini-1.5-flash", gemini)
+
+    prompts = ["Describe the CN Tower", "Describe the CN Tower", "Describe Union"]
+    results = _run_together(
+        3, lambda i: pool.generate("gemini-1.5-flash", prompts[i]).text
+    )
+
+    assert gemini.calls == 2
+    assert results[0] == results[1]
+    assert pool.get_stats()["gemini-1.5-flash"]["requests"] == 2
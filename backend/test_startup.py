@@ -0,0 +1,72 @@
+"""
+Tests for startup timings, the background warm-up and lazy imports
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import metrics
+from startup import StartupTimer, Warmup, process_start_time
+
+
+def test_timer_records_consecutive_phases():
+    timer = StartupTimer()
+    time.sleep(0.01)
+    timer.mark("imports")
+    timer.record("warmup.test", 0.25)
+
+    assert list(timer.phases) == ["imports", "warmup.test"]
+    assert timer.phases["imports"] >= 0.01
+    assert "warmup.test 250ms" in timer.summary()
+    assert 'earsight_startup_phase_seconds{phase="warmup.test"} 0.25' in (
+        metrics.REGISTRY.render()
+    )
+
+
+def test_process_start_is_in_the_past():
+    started = process_start_time()
+    if started is not None:  # not every OS has /proc
+        assert 0 < time.time() - started < 24 * 3600
+
+
+def test_warmup_runs_steps_in_order_and_reports_failures():
+    ran = []
+
+    def broken():
+        raise RuntimeError("no network")
+
+    warmup = Warmup(StartupTimer())
+    assert warmup.status()["state"] == "off"
+    warmup.add("first", lambda: ran.append("first"))
+    warmup.add("broken", broken)
+    warmup.add("last", lambda: ran.append("last"))
+    warmup.start()
+
+    assert warmup.done.wait(5)
+    assert ran == ["first", "last"]
+    assert warmup.status() == {
+        "state": "done",
+        "errors": {"broken": "RuntimeError: no network"},
+    }
+    assert set(warmup.timer.phases) >= {"warmup.first", "warmup.broken", "warmup.last"}
+
+
+def test_importing_the_app_defers_heavy_libraries():
+    code = (
+        "import sys, main; "
+        "print(sorted(m for m in ('google.generativeai', 'ortools', 'geojson') "
+        "if m in sys.modules))"
+    )
+    env = dict(os.environ, MONGO_URI="", GEMINI_API_KEY="offline")
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
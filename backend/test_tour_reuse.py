@@ -0,0 +1,118 @@
+"""
+Tests for nearby-tour matching
+"""
+
+import pytest
+
+from fake_upstreams import (
+    FakeGemini,
+    ManhattanBackend,
+    OverpassStandIn,
+    install_fake_gemini,
+)
+from leg_cache import LegCache
+from osrm_client import OSRMClient
+from overpass_client import OverpassClient
+from route_registry import RouteRegistry
+from script_store import ScriptStore
+from tour_reuse import TourMatcher
+
+DOWNTOWN = (43.6532, -79.3832)
+
+
+def _matcher(**kwargs):
+    matcher = TourMatcher(radius_m=300, threshold=0.75, **kwargs)
+    matcher.add("museums-5k", *DOWNTOWN, ["Museums"], 5.0, 4.6)
+    matcher.add("parks-3k", *DOWNTOWN, ["parks"], 3.0, 2.9)
+    return matcher
+
+
+def _lookup(matcher, lat, lng, preferences, max_km):
+    candidates = matcher.candidates(lat, lng)
+    return matcher.best_match(candidates, lat, lng, preferences, max_km)
+
+
+def test_similar_request_nearby_reuses_the_tour():
+    matcher = _matcher()
+    # ~100 m away, same preference, 4-5 km budget
+    entry, similarity = _lookup(matcher, 43.6541, -79.3832, ["museums"], 4.5)
+    assert entry["route_id"] == "museums-5k"
+    assert 0.75 <= similarity < 1.0
+
+
+def test_dissimilar_requests_fall_through_to_generation():
+    matcher = _matcher()
+    # Too far, no shared preference, tour longer than the budget
+    assert _lookup(matcher, 43.6600, -79.3832, ["museums"], 5.0) is None
+    assert _lookup(matcher, *DOWNTOWN, ["food"], 5.0) is None
+    assert _lookup(matcher, *DOWNTOWN, ["museums"], 2.0) is None
+    assert matcher.get_stats()["generated"] == 3
+
+
+def test_index_is_bounded_and_handles_re_adds():
+    matcher = _matcher(max_tours=2)
+    matcher.add("museums-5k", 43.70, -79.40, ["museums"], 5.0, 4.6)  # moved
+    matcher.add("new", *DOWNTOWN, ["museums"], 5.0, 4.0)  # evicts parks-3k
+    ids = {entry["route_id"] for entry in matcher.candidates(*DOWNTOWN)}
+    assert ids == {"new"}
+    assert matcher.get_stats()["indexed_tours"] == 2
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("MONGO_URI", "")
+    monkeypatch.setenv("GEMINI_API_KEY", "offline")
+    from fastapi.testclient import TestClient
+
+    import main
+
+    install_fake_gemini(FakeGemini({"max_distance_km": 100}))
+    monkeypatch.setattr(main, "route_registry", RouteRegistry())
+    monkeypatch.setattr(main, "tour_matcher", TourMatcher())
+    monkeypatch.setattr(main, "route_store", None)
+    monkeypatch.setattr(
+        main,
+        "osrm_client",
+        OSRMClient(
+            leg_cache=LegCache(str(tmp_path / "legs.sqlite3")),
+            backend=ManhattanBackend(),
+        ),
+    )
+    monkeypatch.setattr(main.tsp_solver, "DEFAULT_TIME_LIMIT_S", 0.2)
+    generator = main.script_generator
+    monkeypatch.setattr(generator, "min_request_interval", 0)
+    monkeypatch.setattr(
+        generator, "script_store", ScriptStore(str(tmp_path / "scripts.sqlite3"))
+    )
+    with OverpassStandIn(per_tag=5) as overpass:
+        monkeypatch.setenv("OVERPASS_URL", overpass.url)
+        monkeypatch.setattr(main, "overpass_client", OverpassClient())
+        yield TestClient(main.app)
+
+
+def _names(body):
+    return [point["name"] for point in body["points"]]
+
+
+def test_reoptimizing_a_walk_leaves_the_shared_tour_intact(client):
+    request = {"input_text": "A walk through toronto"}
+    original = client.post("/generate-route", json={**request, "reuse": False})
+    assert original.status_code == 200, original.text
+    tour = original.json()
+    tour_id = tour["route"]["id"]
+
+    # Someone on the tour re-plans it from the middle of their walk
+    stop = tour["points"][3]
+    replanned = client.post(
+        f"/route/{tour_id}/reoptimize",
+        json={"coordinates": f"{stop['lat']}, {stop['lng']}"},
+    ).json()
+    assert replanned["route"]["id"] != tour_id
+    assert replanned["reoptimized_from"] == tour_id
+    assert _names(replanned)[0] == "Current location"
+
+    # The next user matched to the tour gets the tour, not that walk
+    reused = client.post("/generate-route", json=request).json()
+    assert reused["reused_from"]["route_id"] == tour_id
+    assert _names(reused) == _names(tour)
+    assert _names(client.get(f"/route/{tour_id}").json()) == _names(tour)
@@ -0,0 +1,94 @@
+"""
+Tests for request-scoped tracing
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import tracing
+from tracing import TraceSink
+from tsp_solver import TSPSolver
+
+
+def _names(span):
+    return [child["name"] for child in span.get("children", [])]
+
+
+def test_spans_are_noops_outside_a_trace():
+    with tracing.span("orphan") as span:
+        span.set(ignored=True)
+    tracing.add_span("orphan", 0.0, 1.0)
+    assert tracing.current_trace() is None
+
+
+def test_nested_spans_and_errors():
+    with tracing.start_trace("GET /demo", debug=True) as trace:
+        with tracing.span("outer", step=1) as outer:
+            with tracing.span("inner"):
+                pass
+            outer.set(items=3)
+        with pytest.raises(ValueError):
+            with tracing.span("failing"):
+                raise ValueError("bad input")
+
+    root = trace.to_dict()["root"]
+    assert _names(root) == ["outer", "failing"]
+    outer, failing = root["children"]
+    assert outer["attributes"] == {"step": 1, "items": 3}
+    assert _names(outer) == ["inner"]
+    assert failing["error"] == "ValueError: bad input"
+    assert tracing.current_trace() is None
+    assert "outer;dur=" in trace.server_timing()
+
+
+def test_wrapped_worker_threads_nest_under_the_caller():
+    def work(i):
+        with tracing.span("block", index=i):
+            return i
+
+    with tracing.start_trace("POST /matrix") as trace:
+        with tracing.span("matrix"):
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                list(executor.map(tracing.wrap(work), range(6)))
+
+    matrix = trace.to_dict()["root"]["children"][0]
+    assert _names(matrix) == ["block"] * 6
+
+
+def test_span_cap(monkeypatch):
+    monkeypatch.setattr(tracing, "MAX_SPANS", 3)
+    with tracing.start_trace("GET /many") as trace:
+        for _ in range(5):
+            with tracing.span("step"):
+                pass
+    data = trace.to_dict()
+    assert data["spans"] == 3
+    assert data["dropped_spans"] == 3
+
+
+def test_tsp_search_span_reports_solver_effort():
+    rng = np.random.default_rng(3)
+    points = rng.random((8, 2))
+    distances = np.linalg.norm(points[:, None] - points[None], axis=2)
+    with tracing.start_trace("POST /generate-route") as trace:
+        TSPSolver().solve_tsp(distances, max_distance=100.0, time_limit_s=1)
+
+    search = trace.to_dict()["root"]["children"][0]
+    assert search["name"] == "tsp.search"
+    assert search["attributes"]["nodes"] == 8
+    assert search["attributes"]["solutions"] >= 1
+    assert search["attributes"]["branches"] > 0
+
+
+def test_sink_writes_one_json_line_per_trace(tmp_path):
+    sink = TraceSink(str(tmp_path / "traces" / "trace.jsonl"))
+    for name in ("a", "b"):
+        with tracing.start_trace(name) as trace:
+            pass
+        sink.write(trace)
+
+    lines = (tmp_path / "traces" / "trace.jsonl").read_text().splitlines()
+    assert [json.loads(line)["root"]["name"] for line in lines] == ["a", "b"]
@@ -0,0 +1,71 @@
+"""
+Tests for the reference TSP solutions used by the benchmarks
+"""
+
+import itertools
+
+import numpy as np
+
+from tsp_reference import (
+    best_known_path,
+    held_karp_path,
+    nearest_neighbor_path,
+    path_cost,
+    two_opt_path,
+)
+
+
+def _instance(n, seed=0, asymmetric=False):
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 2))
+    distances = np.abs(points[:, None] - points[None]).sum(axis=2)
+    if asymmetric:
+        distances = distances * rng.uniform(1.0, 1.3, (n, n))
+        np.fill_diagonal(distances, 0)
+    return distances
+
+
+def _brute_force(distances, end=None):
+    n = len(distances)
+    best = None
+    for perm in itertools.permutations(range(1, n)):
+        if end is not None and perm[-1] != end:
+            continue
+        cost = path_cost(distances, (0,) + perm)
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def test_held_karp_matches_brute_force():
+    for seed, asymmetric in ((0, False), (1, True), (2, True)):
+        distances = _instance(7, seed, asymmetric)
+        cost, order = held_karp_path(distances)
+        assert np.isclose(cost, _brute_force(distances))
+        assert np.isclose(path_cost(distances, order), cost)
+        assert order[0] == 0 and sorted(order) == list(range(7))
+
+        cost, order = held_karp_path(distances, end=3)
+        assert order[-1] == 3
+        assert np.isclose(cost, _brute_force(distances, end=3))
+
+
+def test_two_opt_never_worsens_and_keeps_endpoints():
+    distances = _instance(40, seed=3, asymmetric=True)
+    start = nearest_neighbor_path(distances)
+    cost, order = two_opt_path(distances, start, fixed_end=True)
+    assert cost <= path_cost(distances, start) + 1e-9
+    assert order[0] == start[0] and order[-1] == start[-1]
+    assert sorted(order) == list(range(40))
+
+
+def test_best_known_path_uses_the_given_stops():
+    distances = _instance(30, seed=4)
+    stops = [0, 5, 9, 2, 17]
+    cost, path, method = best_known_path(distances, stops)
+    assert method == "exact"
+    assert path[0] == 0 and sorted(path) == sorted(stops)
+    assert cost <= path_cost(distances, stops) + 1e-9
+
+    cost, path, method = best_known_path(distances, list(range(30)))
+    assert method == "2-opt"
+    assert cost <= path_cost(distances, list(range(30))) + 1e-9
@@ -2,18 +2,17 @@
 Text parser using Gemini API to extract route parameters
 """
 
-import os
 from typing import Any, Dict
 
-import google.generativeai as genai
+from context_store import format_context
+from llm_pool import get_llm_pool
 
 
 class TextParser:
     """Parse input text using Gemini API to extract route parameters"""
 
     def __init__(self):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        self.model = get_llm_pool().get_model("gemini-2.0-flash")
 
     def parse_input(self, input_text: str, context: dict = None) -> Dict[str, Any]:
         """
@@ -21,18 +20,13 @@ class TextParser:
 
         Args:
             input_text: User's natural language input
-            context: Optional chat history for Gemini
+            context: Optional chat history (message list or preformatted session context)
 
         Returns:
             Dictionary with extracted parameters, including is_route_request boolean
         """
         # Format context as chat transcript if provided
-        context_str = ""
-        if context:
-            for msg in context:
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                context_str += f"{role.capitalize()}: {content}\n"
+        context_str = format_context(context)
         prompt = f"""
         {context_str}
         Parse the following text and extract route planning parameters. Return a JSON object with these fields:
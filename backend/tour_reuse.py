@@ -0,0 +1,200 @@
+"""
+Nearby-tour reuse: match a route request against tours generated before
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+METERS_PER_DEG_LAT = 111_320.0
+
+# A stored tour may overshoot the requested budget by this much
+BUDGET_SLACK = 1.1
+
+
+class TourMatcher:
+    """
+    Spatial + attribute index of reusable tours
+
+    Tours are bucketed by start point on a grid whose cells are ``radius_m``
+    tall (and as many degrees wide), so a lookup only scores the tours in the
+    few cells around the request.
+
+    A candidate must start within ``radius_m``, share at least one preference
+    and fit the distance budget; its similarity is then
+
+        0.5 * preference Jaccard + 0.3 * budget ratio + 0.2 * start proximity
+
+    and it is reused when that reaches ``threshold`` (TOUR_REUSE_THRESHOLD).
+    """
+
+    def __init__(
+        self,
+        radius_m: Optional[float] = None,
+        threshold: Optional[float] = None,
+        max_tours: int = 5000,
+    ):
+        self.radius_m = (
+            radius_m
+            if radius_m is not None
+            else float(os.getenv("TOUR_REUSE_RADIUS_M", "300"))
+        )
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else float(os.getenv("TOUR_REUSE_THRESHOLD", "0.75"))
+        )
+        self.max_tours = max_tours
+        self._cell_deg = self.radius_m / METERS_PER_DEG_LAT
+        self._tours: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.generated = 0
+
+    def add(
+        self,
+        route_id: str,
+        lat: float,
+        lng: float,
+        preferences: Iterable[str],
+        max_distance_km: float,
+        total_distance_km: float,
+    ) -> None:
+        """
+        Index a tour for reuse
+
+        Args:
+            route_id: Route id (registry / store key)
+            lat: Start latitude
+            lng: Start longitude
+            preferences: Preference categories the tour was generated for
+            max_distance_km: Requested distance budget
+            total_distance_km: Actual tour length
+        """
+        entry = {
+            "route_id": route_id,
+            "lat": lat,
+            "lng": lng,
+            "preferences": sorted({p.lower() for p in preferences}),
+            "max_distance_km": max_distance_km,
+            "total_distance_km": total_distance_km,
+        }
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._tours.pop(route_id, None)
+            if previous is not None:
+                self._discard_from_cell(route_id, previous)
+            self._tours[route_id] = entry
+            self._cells.setdefault(cell, set()).add(route_id)
+            while len(self._tours) > self.max_tours:
+                old_id, old = self._tours.popitem(last=False)
+                self._discard_from_cell(old_id, old)
+
+    def remove(self, route_id: str) -> None:
+        """Forget a tour (e.g. it expired from every store)"""
+        with self._lock:
+            entry = self._tours.pop(route_id, None)
+            if entry is not None:
+                self._discard_from_cell(route_id, entry)
+
+    def candidates(self, lat: float, lng: float) -> List[Dict[str, Any]]:
+        """Indexed tours whose start may be within radius_m of (lat, lng)"""
+        cx, cy = self._cell(lat, lng)
+        # A degree of longitude shrinks with latitude: cover radius_m east-west
+        span = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        with self._lock:
+            return [
+                self._tours[route_id]
+                for dx in (-1, 0, 1)
+                for dy in range(-span, span + 1)
+                for route_id in self._cells.get((cx + dx, cy + dy), ())
+            ]
+
+    def best_match(
+        self,
+        candidates: Iterable[Dict[str, Any]],
+        lat: float,
+        lng: float,
+        preferences: Iterable[str],
+        max_distance_km: float,
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Most similar candidate at or above the threshold
+
+        Returns:
+            (entry, similarity) or None
+        """
+        best: Optional[Tuple[Dict[str, Any], float]] = None
+        wanted = {p.lower() for p in preferences}
+        for entry in candidates:
+            similarity = self.similarity(entry, lat, lng, wanted, max_distance_km)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (entry, similarity)
+        with self._lock:
+            if best is None:
+                self.generated += 1
+            else:
+                self.reused += 1
+        return best
+
+    def similarity(
+        self,
+        entry: Dict[str, Any],
+        lat: float,
+        lng: float,
+        preferences: Set[str],
+        max_distance_km: float,
+    ) -> float:
+        """Similarity in [0, 1] of a stored tour to a request (0 = not usable)"""
+        distance = self._distance_m(lat, lng, entry["lat"], entry["lng"])
+        if distance > self.radius_m:
+            return 0.0
+
+        offered = set(entry["preferences"])
+        union = preferences | offered
+        overlap = len(preferences & offered) / len(union) if union else 1.0
+        if overlap == 0:
+            return 0.0
+
+        total = entry.get("total_distance_km") or 0.0
+        if max_distance_km <= 0 or total > max_distance_km * BUDGET_SLACK:
+            return 0.0
+        budgets = (entry["max_distance_km"], max_distance_km)
+        budget_ratio = min(budgets) / max(budgets) if max(budgets) > 0 else 1.0
+
+        proximity = 1.0 - distance / self.radius_m if self.radius_m > 0 else 1.0
+        return 0.5 * overlap + 0.3 * budget_ratio + 0.2 * proximity
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get matcher statistics"""
+        with self._lock:
+            lookups = self.reused + self.generated
+            return {
+                "indexed_tours": len(self._tours),
+                "reused": self.reused,
+                "generated": self.generated,
+                "reuse_ratio": self.reused / lookups if lookups else 0.0,
+                "radius_m": self.radius_m,
+                "threshold": self.threshold,
+            }
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(lat // self._cell_deg), int(lng // self._cell_deg)
+
+    def _discard_from_cell(self, route_id: str, entry: Dict[str, Any]) -> None:
+        cell = self._cell(entry["lat"], entry["lng"])
+        ids = self._cells.get(cell)
+        if ids is not None:
+            ids.discard(route_id)
+            if not ids:
+                del self._cells[cell]
+
+    @staticmethod
+    def _distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+        """Equirectangular distance, plenty accurate for a few hundred meters"""
+        x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+        y = math.radians(lat2 - lat1)
+        return 6_371_000 * math.hypot(x, y)
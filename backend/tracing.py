@@ -0,0 +1,241 @@
+"""
+Request-scoped tracing: a tree of timed spans per request, no collector needed
+
+A trace is started per request (see ``trace_requests`` in main.py) and held in
+a context variable, so any code running for that request can open nested
+spans without passing anything around:
+
+    with tracing.span("overpass.query", tag=tag) as span:
+        pois = self._query_overpass(...)
+        span.set(pois=len(pois))
+
+Outside a traced request ``span`` is a no-op, so instrumentation can stay in
+the hot paths. Finished traces are returned to the client (debug field and
+``Server-Timing`` header) and/or appended to a JSONL file.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Large routes make hundreds of OSRM / Gemini calls; keep traces bounded
+MAX_SPANS = 2000
+
+
+class Span:
+    """One timed operation with attributes and child spans"""
+
+    __slots__ = ("name", "start", "end", "attributes", "children", "error")
+
+    def __init__(self, name: str, start: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        """Add or overwrite attributes"""
+        self.attributes.update(attributes)
+
+    def duration_ms(self, now: Optional[float] = None) -> float:
+        end = self.end if self.end is not None else (now or time.time())
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float, now: float) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms(now), 3),
+        }
+        if self.end is None:
+            data["in_progress"] = True
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            children = sorted(self.children, key=lambda child: child.start)
+            data["children"] = [child.to_dict(origin, now) for child in children]
+        return data
+
+
+class _NoopSpan:
+    """Stand-in yielded when there is no active trace"""
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    Span tree of one request
+
+    Attributes:
+        trace_id: Random id, returned in the X-Trace-Id header
+        root: Span covering the whole request
+        debug: The client asked for the trace (it goes into the response body)
+    """
+
+    def __init__(self, name: str, debug: bool = False, **attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.root = Span(name, time.time(), attributes)
+        self.debug = debug
+        self.spans = 1
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def attach(self, parent: Span, span: Span) -> bool:
+        """Add a child span (False once MAX_SPANS is reached)"""
+        with self._lock:
+            if self.spans >= MAX_SPANS:
+                self.dropped += 1
+                return False
+            self.spans += 1
+            parent.children.append(span)
+            return True
+
+    def finish(self) -> None:
+        if self.root.end is None:
+            self.root.end = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready span tree (spans still open report their time so far)"""
+        now = time.time()
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "started_at": self.root.start,
+                "spans": self.spans,
+                "dropped_spans": self.dropped,
+                "root": self.root.to_dict(self.root.start, now),
+            }
+
+    def server_timing(self) -> str:
+        """
+        Top-level spans as a Server-Timing header value (shown by browser
+        dev tools); repeated names are summed
+        """
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for child in self.root.children:
+                totals[child.name] = totals.get(child.name, 0.0) + child.duration_ms()
+        entries = [f"{_token(name)};dur={ms:.1f}" for name, ms in totals.items()]
+        entries.append(f"total;dur={self.root.duration_ms():.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """Trace of the request being handled, if it is traced"""
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name: str, debug: bool = False, **attributes) -> Iterator[Trace]:
+    """Trace everything run inside the block (and tasks/threads it hands off to)"""
+    trace = Trace(name, debug=debug, **attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.finish()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """
+    Time the block as a child of the current span
+
+    Yields:
+        The Span (or a no-op stand-in when the request is not traced)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    parent = _current_span.get() or trace.root
+    current = Span(name, time.time(), attributes)
+    trace.attach(parent, current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end = time.time()
+        _current_span.reset(token)
+
+
+def add_span(name: str, start: float, end: float, **attributes) -> None:
+    """Record an already finished operation (time.time() bounds) as a child span"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    finished = Span(name, start, attributes)
+    finished.end = end
+    trace.attach(_current_span.get() or trace.root, finished)
+
+
+def wrap(fn: Callable) -> Callable:
+    """
+    Bind ``fn`` to the caller's context variables (current trace and span, the
+    request deadline) so work it does in a worker thread (ThreadPoolExecutor)
+    nests under the caller and honours its deadline
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        # One copy per call: a Context cannot be entered by two threads at once
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class TraceSink:
+    """Appends finished traces to a JSONL file, one trace per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.written += 1
+
+
+def create_trace_sink() -> Optional[TraceSink]:
+    """TraceSink on TRACE_SINK_PATH, or None when traces are not persisted"""
+    path = os.getenv("TRACE_SINK_PATH")
+    return TraceSink(path) if path else None
+
+
+def _token(name: str) -> str:
+    # Server-Timing metric names are HTTP tokens: no spaces, commas or quotes
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
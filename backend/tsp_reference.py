@@ -0,0 +1,172 @@
+"""
+Reference solutions for open-path TSP instances, used to grade TSPSolver
+
+- held_karp_path: exact dynamic program, for up to EXACT_MAX_NODES nodes
+- two_opt_path: 2-opt local search that never makes a path worse
+- best_known_path: exact when small enough, otherwise the better of the given
+  order and nearest neighbour, each polished with 2-opt
+
+Paths start at a fixed node and may end anywhere (or at a fixed end node),
+matching how the pipeline walks a route without returning to the start.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EXACT_MAX_NODES = 13
+
+
+def path_cost(distances: np.ndarray, order: Sequence[int]) -> float:
+    """Length of the open path visiting ``order``"""
+    if len(order) < 2:
+        return 0.0
+    order = np.asarray(order)
+    return float(distances[order[:-1], order[1:]].sum())
+
+
+def held_karp_path(
+    distances: np.ndarray,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Tuple[float, List[int]]:
+    """
+    Shortest open path from ``start`` through every node (ending at ``end`` if
+    given), by the Held-Karp dynamic program: O(2^n n^2) time, O(2^n n) memory
+
+    Returns:
+        (cost, order)
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    n = len(distances)
+    if n > EXACT_MAX_NODES:
+        raise ValueError(f"held_karp_path is limited to {EXACT_MAX_NODES} nodes")
+    if n == 1:
+        return 0.0, [start]
+
+    others = [i for i in range(n) if i != start]
+    m = len(others)
+    sub = distances[np.ix_(others, others)]
+    from_start = distances[start, others]
+
+    # cost[mask, j]: shortest path from start over the nodes in mask, ending at j
+    cost = np.full((1 << m, m), np.inf)
+    parent = np.full((1 << m, m), -1, dtype=np.int64)
+    for j in range(m):
+        cost[1 << j, j] = from_start[j]
+
+    for mask in range(1, 1 << m):
+        members = [j for j in range(m) if mask >> j & 1]
+        if len(members) < 2:
+            continue
+        for j in members:
+            prev_mask = mask ^ (1 << j)
+            candidates = cost[prev_mask] + sub[:, j]
+            k = int(np.argmin(candidates))
+            cost[mask, j] = candidates[k]
+            parent[mask, j] = k
+
+    full = (1 << m) - 1
+    if end is not None:
+        last = others.index(end)
+    else:
+        last = int(np.argmin(cost[full]))
+    best = float(cost[full, last])
+
+    order = []
+    mask, j = full, last
+    while j != -1:
+        order.append(others[j])
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    order.append(start)
+    return best, order[::-1]
+
+
+def two_opt_path(
+    distances: np.ndarray,
+    order: Sequence[int],
+    fixed_end: bool = False,
+    max_passes: int = 50,
+) -> Tuple[float, List[int]]:
+    """
+    Improve an open path with 2-opt moves (segment reversals)
+
+    The first node never moves; with ``fixed_end`` neither does the last.
+    Candidate moves are scored with the symmetric delta and accepted only if
+    the true path cost drops, so asymmetric matrices are handled safely.
+
+    Returns:
+        (cost, order)
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    path = np.array(order, dtype=np.int64)
+    best = path_cost(distances, path)
+    n = len(path)
+    last_movable = n - 2 if fixed_end else n - 1
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, last_movable):
+            a, b = path[i - 1], path[i]
+            js = np.arange(i + 1, last_movable + 1)
+            c = path[js]
+            delta = distances[a, c] - distances[a, b]
+            has_next = js + 1 < n
+            e = path[np.minimum(js + 1, n - 1)]
+            delta = delta + np.where(has_next, distances[b, e] - distances[c, e], 0.0)
+            for k in np.argsort(delta)[:3]:
+                if delta[k] >= -1e-9:
+                    break
+                j = int(js[k])
+                candidate = path.copy()
+                candidate[i : j + 1] = candidate[i : j + 1][::-1]
+                candidate_cost = path_cost(distances, candidate)
+                if candidate_cost < best - 1e-9:
+                    path, best, improved = candidate, candidate_cost, True
+                    break
+        if not improved:
+            break
+    return best, path.tolist()
+
+
+def nearest_neighbor_path(distances: np.ndarray, start: int = 0) -> List[int]:
+    """Greedy open path from ``start`` over every node"""
+    distances = np.asarray(distances, dtype=np.float64)
+    n = len(distances)
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, distances[order[-1]])
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        visited[nxt] = True
+    return order
+
+
+def best_known_path(
+    distances: np.ndarray,
+    order: Sequence[int],
+) -> Tuple[float, List[int], str]:
+    """
+    Best reference path over the nodes of ``order``, starting at ``order[0]``
+
+    Args:
+        distances: Full distance matrix
+        order: A solver's path; only its node set and start are used
+
+    Returns:
+        (cost, path in original node indices, method: "exact" or "2-opt")
+    """
+    nodes = list(order)
+    sub = np.asarray(distances, dtype=np.float64)[np.ix_(nodes, nodes)]
+    if len(nodes) <= EXACT_MAX_NODES:
+        cost, path = held_karp_path(sub, start=0)
+        return cost, [nodes[i] for i in path], "exact"
+
+    polished = [
+        two_opt_path(sub, list(range(len(nodes)))),
+        two_opt_path(sub, nearest_neighbor_path(sub, 0)),
+    ]
+    cost, path = min(polished, key=lambda result: result[0])
+    return cost, [nodes[i] for i in path], "2-opt"
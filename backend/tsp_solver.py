@@ -1,90 +1,345 @@
 """
 TSP solver using OR-Tools for optimal route optimization
+
+OR-Tools is imported on the first solve rather than with this module, which
+keeps it off the server's cold-start path.
 """
 
-from typing import Any, Dict, List, Tuple
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import tracing
+from route_matrix import RouteMatrix
 
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+MatrixLike = Union[RouteMatrix, np.ndarray, List[List[float]]]
 
 
 class TSPSolver:
     """Traveling Salesman Problem solver using OR-Tools"""
 
-    def __init__(self):
-        self.manager = None
-        self.routing = None
+    # Above this many nodes we pick a subset of stops instead of visiting all
+    LARGE_N_THRESHOLD = 25
+    DEFAULT_TIME_LIMIT_S = 30
+    LARGE_N_TIME_LIMIT_S = 10
+    # Re-optimizing a route while the user walks has to feel instant
+    REOPTIMIZE_TIME_LIMIT_S = 0.5
+    # Search strategies, by name in routing_enums_pb2 (benchmark_tsp.py
+    # overrides them per instance to compare settings)
+    FIRST_SOLUTION_STRATEGY = "PATH_CHEAPEST_ARC"
+    LARGE_N_FIRST_SOLUTION_STRATEGY = "PARALLEL_CHEAPEST_INSERTION"
+    LOCAL_SEARCH_METAHEURISTIC = "GUIDED_LOCAL_SEARCH"
+
+    def warm(self) -> None:
+        """Load OR-Tools (imported on first solve) with a trivial instance"""
+        self.solve_tsp(np.array([[0.0, 1.0], [1.0, 0.0]]), 10.0, time_limit_s=0.1)
 
     def solve_tsp(
-        self, distance_matrix: List[List[float]], max_distance: float
+        self,
+        distance_matrix: MatrixLike,
+        max_distance: float,
+        time_limit_s: Optional[float] = None,
     ) -> List[int]:
         """
         Solve TSP to find optimal route (open path, not returning to start)
 
         Args:
-            distance_matrix: Distance matrix between all points (in km)
+            distance_matrix: RouteMatrix or distance matrix between all points (in km)
             max_distance: Maximum allowed route distance (in km)
-            
+            time_limit_s: Search time budget (defaults depend on problem size)
+
         Returns:
-            List of indices representing optimal route order
+            List of indices representing optimal route order. For large inputs
+            this is a subset of the nodes that fits within max_distance.
         """
-        if not distance_matrix or len(distance_matrix) < 2:
+        distances = self._as_array(distance_matrix)
+        if distances is None or len(distances) < 2:
             return [0]
 
-        # Create routing model for open path (start at 0, end at last node)
-        self.manager = pywrapcp.RoutingIndexManager(
-            len(distance_matrix), 1, [0], [len(distance_matrix) - 1]
+        if len(distances) > self.LARGE_N_THRESHOLD:
+            return self._solve_subset(
+                distances,
+                max_distance,
+                time_limit_s or self.LARGE_N_TIME_LIMIT_S,
+            )
+
+        from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+        # Create routing model for open path (start at 0, end at last node).
+        # The model is local to this call: the solver is shared by request
+        # threads and OR-Tools models must not be touched by two of them.
+        manager = pywrapcp.RoutingIndexManager(
+            len(distances), 1, [0], [len(distances) - 1]
         )
-        self.routing = pywrapcp.RoutingModel(self.manager)
+        routing = pywrapcp.RoutingModel(manager)
+
+        # Convert km to integer meters once, as plain lists for the callback
+        arcs = (distances * 1000).astype(np.int64).tolist()
 
         def distance_callback(from_index, to_index):
             """Returns the distance between the two nodes in meters."""
-            from_node = self.manager.IndexToNode(from_index)
-            to_node = self.manager.IndexToNode(to_index)
-            # Convert km to meters and return as integer
-            return int(distance_matrix[from_node][to_node] * 1000)
+            from_node = manager.IndexToNode(from_index)
+            to_node = manager.IndexToNode(to_index)
+            return arcs[from_node][to_node]
         
-        transit_callback_index = self.routing.RegisterTransitCallback(distance_callback)
-        self.routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
         
         # Add distance constraint (convert km to meters)
         max_distance_meters = int(max_distance * 1000)
-        self.routing.AddDimension(
+        routing.AddDimension(
             transit_callback_index,
             0,  # no slack
             max_distance_meters,  # maximum distance per vehicle (in meters)
             True,  # start cumul to zero
             "Distance",
         )
-        distance_dimension = self.routing.GetDimensionOrDie("Distance")
+        distance_dimension = routing.GetDimensionOrDie("Distance")
         distance_dimension.SetGlobalSpanCostCoefficient(100)
 
         # Setting first solution heuristic
         search_parameters = pywrapcp.DefaultRoutingSearchParameters()
         search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+            getattr(
+                routing_enums_pb2.FirstSolutionStrategy,
+                self.FIRST_SOLUTION_STRATEGY,
+            )
         )
         search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+            getattr(
+                routing_enums_pb2.LocalSearchMetaheuristic,
+                self.LOCAL_SEARCH_METAHEURISTIC,
+            )
+        )
+        search_parameters.time_limit.FromMilliseconds(
+            int((time_limit_s or self.DEFAULT_TIME_LIMIT_S) * 1000)
         )
-        search_parameters.time_limit.seconds = 30
 
         # Solve the problem
-        solution = self.routing.SolveWithParameters(search_parameters)
+        solution = self._search(routing, manager, search_parameters)
 
         if solution:
-            return self._extract_route(solution)
+            return self._extract_route(routing, manager, solution)
         else:
             # Fallback to nearest neighbor if no solution found
-            return self._nearest_neighbor(distance_matrix)
+            return self._nearest_neighbor(distances)
+
+    def reoptimize(
+        self,
+        distance_matrix: MatrixLike,
+        initial_route: List[int],
+        max_distance: float,
+        time_limit_s: Optional[float] = None,
+    ) -> List[int]:
+        """
+        Re-solve a route starting from a previous order
+
+        Node 0 is the user's current position and initial_route the remaining
+        stops in their old order. The search starts from that order and only
+        runs greedy descent, so it converges in milliseconds for the handful of
+        stops left on a walk; stops are dropped only if the cap forces it.
+
+        Args:
+            distance_matrix: RouteMatrix or distance matrix (in km), node 0 first
+            initial_route: Warm-start order, starting with 0
+            max_distance: Maximum allowed route distance (in km)
+            time_limit_s: Search time budget (REOPTIMIZE_TIME_LIMIT_S by default)
+
+        Returns:
+            Ordered node indices starting at 0
+        """
+        distances = self._as_array(distance_matrix)
+        if distances is None or len(distances) < 2:
+            return [0]
+        return self._solve_subset(
+            distances,
+            max_distance,
+            time_limit_s or self.REOPTIMIZE_TIME_LIMIT_S,
+            initial_route=initial_route,
+            guided=False,
+        )
+
+    def _solve_subset(
+        self,
+        distance_matrix: np.ndarray,
+        max_distance: float,
+        time_limit_s: float,
+        initial_route: Optional[List[int]] = None,
+        guided: bool = True,
+    ) -> List[int]:
+        """
+        Select and order a subset of stops for large candidate sets
+
+        Every POI is optional (a disjunction with a penalty that favours
+        higher-ranked candidates, which come first in the matrix) and the
+        walk is capped at max_distance, so OR-Tools maximises the stops it can
+        fit rather than trying to visit hundreds of places. A zero-cost dummy
+        end node lets the path finish anywhere.
+
+        Args:
+            distance_matrix: (N, N) distance matrix (in km), node 0 is the start
+            max_distance: Maximum allowed route distance (in km)
+            time_limit_s: Search time budget
+            initial_route: Warm-start order (the capped greedy tour by default)
+            guided: Use guided local search (otherwise stop at a local optimum)
+
+        Returns:
+            Ordered node indices starting at 0
+        """
+        from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+        matrix = distance_matrix
+        n = len(matrix)
+
+        # Integer meters, plus the dummy end node (row/column of zeros)
+        arcs = np.zeros((n + 1, n + 1), dtype=np.int64)
+        arcs[:n, :n] = np.rint(matrix * 1000).astype(np.int64)
+        arcs_list = arcs.tolist()  # plain lists are much faster in the callback
+
+        manager = pywrapcp.RoutingIndexManager(n + 1, 1, [0], [n])
+        routing = pywrapcp.RoutingModel(manager)
+
+        def distance_callback(from_index, to_index):
+            return arcs_list[manager.IndexToNode(from_index)][
+                manager.IndexToNode(to_index)
+            ]
 
-    def _extract_route(self, solution) -> List[int]:
+        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+        max_distance_meters = int(max_distance * 1000)
+        routing.AddDimension(
+            transit_callback_index, 0, max_distance_meters, True, "Distance"
+        )
+
+        # Dropping a stop must always cost more than any detour to include it
+        base_penalty = max(max_distance_meters, 1) * 10
+        for node in range(1, n):
+            rank_bonus = (n - node) / n
+            routing.AddDisjunction(
+                [manager.NodeToIndex(node)],
+                int(base_penalty * (1 + rank_bonus)),
+            )
+
+        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+        search_parameters.first_solution_strategy = (
+            getattr(
+                routing_enums_pb2.FirstSolutionStrategy,
+                self.LARGE_N_FIRST_SOLUTION_STRATEGY,
+            )
+        )
+        search_parameters.local_search_metaheuristic = (
+            getattr(
+                routing_enums_pb2.LocalSearchMetaheuristic,
+                self.LOCAL_SEARCH_METAHEURISTIC if guided else "GREEDY_DESCENT",
+            )
+        )
+        search_parameters.time_limit.FromMilliseconds(int(time_limit_s * 1000))
+
+        # Warm start from the given order (if it fits the cap) or the capped
+        # greedy tour, so the result is never worse than either
+        greedy = self._nearest_neighbor_capped(matrix, max_distance)
+        initial = None
+        if initial_route:
+            initial = routing.ReadAssignmentFromRoutes([initial_route[1:]], True)
+        if not initial:
+            initial = routing.ReadAssignmentFromRoutes([greedy[1:]], True)
+        solution = self._search(routing, manager, search_parameters, initial or None)
+
+        if solution:
+            return self._extract_route(routing, manager, solution)
+        return greedy
+
+    def _search(self, routing, manager, search_parameters, initial=None):
+        """
+        Run the routing search (from ``initial`` if given)
+
+        When the request is traced, the solve is recorded as a span with the
+        solver's effort: solutions found, when the best one was found,
+        branches, failures.
+        """
+        def solve():
+            if initial is not None:
+                return routing.SolveFromAssignmentWithParameters(
+                    initial, search_parameters
+                )
+            return routing.SolveWithParameters(search_parameters)
+
+        if tracing.current_trace() is None:
+            return solve()
+
+        solutions = [0]
+        best = {"cost": None, "at": None}
+        started = time.perf_counter()
+
+        def on_solution():
+            solutions[0] += 1
+            cost = routing.CostVar().Value()
+            if best["cost"] is None or cost < best["cost"]:
+                best["cost"], best["at"] = cost, time.perf_counter()
+
+        routing.AddAtSolutionCallback(on_solution)
+        with tracing.span(
+            "tsp.search",
+            nodes=manager.GetNumberOfNodes(),
+            warm_start=initial is not None,
+            time_limit_ms=search_parameters.time_limit.ToMilliseconds(),
+        ) as span:
+            solution = solve()
+            solver = routing.solver()
+            span.set(
+                solutions=solutions[0],
+                time_to_best_ms=(
+                    (best["at"] - started) * 1000 if best["at"] is not None else None
+                ),
+                branches=solver.Branches(),
+                failures=solver.Failures(),
+                status=int(routing.status()),
+                objective=solution.ObjectiveValue() if solution else None,
+            )
+        return solution
+
+    def _nearest_neighbor_capped(
+        self, distance_matrix: np.ndarray, max_distance: float
+    ) -> List[int]:
+        """Greedy nearest neighbour that stops once the distance cap is reached"""
+        n = len(distance_matrix)
+        visited = np.zeros(n, dtype=bool)
+        visited[0] = True
+        route = [0]
+        current = 0
+        total = 0.0
+
+        while not visited.all():
+            row = np.where(visited, np.inf, distance_matrix[current])
+            nearest = int(np.argmin(row))
+            if total + row[nearest] > max_distance:
+                break
+            total += row[nearest]
+            visited[nearest] = True
+            route.append(nearest)
+            current = nearest
+
+        return route
+
+    @staticmethod
+    def _as_array(distance_matrix: MatrixLike) -> Optional[np.ndarray]:
+        """Distances (km) as a float64 array, whatever the input container"""
+        if distance_matrix is None:
+            return None
+        if isinstance(distance_matrix, RouteMatrix):
+            return distance_matrix.distances.astype(np.float64)
+        return np.asarray(distance_matrix, dtype=np.float64)
+
+    def _extract_route(self, routing, manager, solution) -> List[int]:
         """Extract route from OR-Tools solution (open path)"""
-        index = self.routing.Start(0)
+        index = routing.Start(0)
         route = []
 
-        while not self.routing.IsEnd(index):
-            route.append(self.manager.IndexToNode(index))
-            index = solution.Value(self.routing.NextVar(index))
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = solution.Value(routing.NextVar(index))
 
         # Do not append the end node again (no return to start)
         return route
@@ -117,14 +372,14 @@ class TSPSolver:
         return route
 
     def get_route_distance(
-        self, route: List[int], distance_matrix: List[List[float]]
+        self, route: List[int], distance_matrix: MatrixLike
     ) -> float:
         """
         Calculate total distance of a route
 
         Args:
             route: List of node indices
-            distance_matrix: Distance matrix
+            distance_matrix: RouteMatrix or distance matrix
 
         Returns:
             Total route distance
@@ -132,6 +387,9 @@ class TSPSolver:
         if len(route) < 2:
             return 0.0
 
+        if isinstance(distance_matrix, RouteMatrix):
+            return distance_matrix.route_distance(route)
+
         total_distance = 0.0
         for i in range(len(route) - 1):
             total_distance += distance_matrix[route[i]][route[i + 1]]